@@ -0,0 +1,122 @@
+"""
+Shared helpers for benchmark scripts
+
+Chạy từ thư mục backend: python -m benchmarks.<tên_script> --help
+"""
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# config.Settings bắt buộc có OPENAI_API_KEY - benchmark không gọi OpenAI nên dùng giá trị giả
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+logger = logging.getLogger("benchmarks")
+
+
+def setup_logging(verbose: bool = False) -> None:
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
+def synthetic_utterance(seconds: float, sample_rate: int = 16000, seed: int = 0) -> np.ndarray:
+    """
+    Tạo audio giả lập giọng nói (harmonics + envelope theo âm tiết + noise nhẹ)
+
+    Đủ để đo latency/throughput; không dùng để đánh giá độ chính xác.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))  # ~4 âm tiết/giây
+    audio = 0.3 * voiced * syllables + 0.01 * rng.standard_normal(n)
+    return audio.astype(np.float32)
+
+
+def synthetic_phrase_items(count: int) -> List[Tuple[str, np.ndarray, str]]:
+    """
+    (tên, audio giả lập, câu mẫu) với câu lấy lần lượt từ models/korean_phrases.json
+
+    Độ dài audio tỉ lệ với số âm tiết của câu (~3 âm tiết/giây).
+    """
+    phrases_path = Path(__file__).parent.parent / "models" / "korean_phrases.json"
+    data = json.loads(phrases_path.read_text(encoding="utf-8"))
+    phrases = [
+        phrase
+        for category in data["categories"].values()
+        for phrase in category["phrases"]
+        if "..." not in phrase
+    ]
+    items = []
+    for i in range(count):
+        text = phrases[i % len(phrases)]
+        seconds = 1.0 + 0.35 * len(text.replace(" ", ""))
+        items.append((f"synthetic-{i}", synthetic_utterance(seconds, seed=i), text))
+    return items
+
+
+def load_pronunciation_stack(random_weights: bool = False) -> bool:
+    """
+    Load Wav2Vec2 + Conformer cho benchmark
+
+    Args:
+        random_weights: Nếu không có models/pronunciation_model.pt, khởi tạo Conformer
+            với weights ngẫu nhiên (chỉ dùng để đo tốc độ)
+    """
+    import torch
+    from services import pronunciation_model_service as pms
+
+    loaded = pms.load_pronunciation_model()
+    if not loaded:
+        if not random_weights:
+            return False
+        logger.warning("Pronunciation model not found - using random Conformer weights")
+        phoneme_to_id = pms.load_phoneme_dictionary()
+        model = pms.ConformerPronunciationModel(
+            input_dim=768,
+            num_phonemes=len(phoneme_to_id)
+        ).eval()
+        pms.install_pronunciation_model(
+            pms.make_pronunciation_model(model, phoneme_to_id, "random", device=torch.device("cpu"))
+        )
+    pms.get_wav2vec2_model()
+    return True
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values), q))
+
+
+def latency_summary(latencies_s: List[float]) -> Dict[str, float]:
+    """Tóm tắt latency (ms)"""
+    ms = [v * 1000 for v in latencies_s]
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(np.mean(ms)), 2) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p90_ms": round(percentile(ms, 90), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+    }
+
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> None:
+    """In report JSON ra stdout, hoặc ghi ra file nếu có --output"""
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Report written to {output}", file=sys.stderr)
+    else:
+        print(text)
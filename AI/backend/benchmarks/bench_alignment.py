@@ -0,0 +1,122 @@
+"""
+Benchmark: Levenshtein DP thuần Python (bản cũ) vs alignment NumPy có backtrace
+
+Sinh cặp (expected, predicted) từ phoneme Hangul ngẫu nhiên với tỷ lệ lỗi cho trước
+(substitution/deletion/insertion chia đều), kiểm tra distance hai bản trùng nhau và đo latency.
+Bản cũ chạy thêm một lần DP cho mỗi từ (như check_pronunciation trước đây).
+
+Usage (từ thư mục backend):
+    python -m benchmarks.bench_alignment --lengths 50,100,200,400 --error-rate 0.15
+    python -m benchmarks.bench_alignment --output alignment.json
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks._common import latency_summary, setup_logging, write_report
+
+
+def legacy_levenshtein(seq1: List, seq2: List) -> int:
+    """DP list-of-lists của levenshtein_distance trước khi chuyển sang alignment_service"""
+    n, m = len(seq1), len(seq2)
+    dp = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n + 1):
+        dp[i][0] = i
+    for j in range(m + 1):
+        dp[0][j] = j
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if seq1[i - 1] == seq2[j - 1]:
+                dp[i][j] = dp[i - 1][j - 1]
+            else:
+                dp[i][j] = min(dp[i - 1][j] + 1, dp[i][j - 1] + 1, dp[i - 1][j - 1] + 1)
+    return dp[n][m]
+
+
+def _legacy_check(expected: List[str], predicted: List[str], words: int) -> int:
+    # Một lần cho cả câu + một lần cho mỗi vùng từ
+    distance = legacy_levenshtein(predicted, expected)
+    per_word = max(1, len(expected) // words)
+    for w in range(words):
+        start, end = w * per_word, (w + 1) * per_word
+        legacy_levenshtein(predicted[start:end], expected[start:end])
+    return distance
+
+
+def _make_pair(length: int, error_rate: float, rng: random.Random) -> Tuple[List[str], List[str]]:
+    from services.pronunciation_model_service import LEADS, TAILS, VOWELS
+
+    inventory = list(LEADS) + list(VOWELS) + [t for t in TAILS if t]
+    expected = [rng.choice(inventory) for _ in range(length)]
+    predicted: List[str] = []
+    for phoneme in expected:
+        if rng.random() >= error_rate:
+            predicted.append(phoneme)
+            continue
+        kind = rng.randrange(3)
+        if kind == 0:
+            predicted.append(rng.choice(inventory))  # substitution
+        elif kind == 2:
+            predicted.extend([phoneme, rng.choice(inventory)])  # insertion
+        # kind == 1: deletion
+    return expected, predicted
+
+
+def _time(fn, repeat: int) -> Dict[str, float]:
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="50,100,200,400", help="Expected phoneme counts")
+    parser.add_argument("--error-rate", type=float, default=0.15)
+    parser.add_argument("--pairs", type=int, default=20, help="Random pairs per length")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per pair")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    from services.alignment_service import align_sequences
+
+    rng = random.Random(0)
+    results: List[Dict[str, Any]] = []
+    for length in (int(n) for n in args.lengths.split(",")):
+        pairs = [_make_pair(length, args.error_rate, rng) for _ in range(args.pairs)]
+        words = max(1, length // 8)  # ~8 phoneme/từ
+
+        mismatches = 0
+        for expected, predicted in pairs:
+            if legacy_levenshtein(predicted, expected) != align_sequences(expected, predicted).distance:
+                mismatches += 1
+
+        legacy = _time(lambda: [_legacy_check(e, p, words) for e, p in pairs], args.repeat)
+        aligned = _time(lambda: [align_sequences(e, p) for e, p in pairs], args.repeat)
+        legacy_ms = legacy["p50_ms"] / len(pairs)
+        aligned_ms = aligned["p50_ms"] / len(pairs)
+        results.append({
+            "expected_phonemes": length,
+            "pairs": len(pairs),
+            "distance_mismatches": mismatches,
+            "legacy_per_sentence_ms": round(legacy_ms, 3),
+            "aligned_per_sentence_ms": round(aligned_ms, 3),
+            "speedup": round(legacy_ms / aligned_ms, 2) if aligned_ms else None,
+        })
+
+    write_report({
+        "benchmark": "alignment",
+        "error_rate": args.error_rate,
+        "repeat": args.repeat,
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Benchmark: toàn bộ pipeline read-aloud, thời gian từng stage + peak RSS + throughput theo concurrency
+
+Mỗi lượt chạy giống request read-aloud:
+    AudioBuffer.from_bytes (decode, resample, vad)
+    → transcribe_with_local_whisper (whisper, nếu có model)
+    → check_pronunciation_from_buffer (wav2vec2, normalize, conformer, ctc_decode, g2p,
+      alignment, forced_alignment - đo qua record_stage_timings)
+    → _build_pronunciation_feedback (feedback_build)
+
+Fixture giả lập: audio 44.1 kHz (để có bước resample) dài 1-20 s, câu mẫu ghép từ
+models/korean_phrases.json cho khớp độ dài. Fixture thật: manifest JSON
+[{"audio": "recordings/001.webm", "text": "안녕하세요"}, ...] (đường dẫn tính từ thư mục manifest).
+
+Cache log-probs luôn tắt. Phần breakdown chạy tuần tự, không micro-batching (forward chạy
+trên thread gọi nên đo được từng stage); phần concurrency dùng --batching nếu muốn đo batcher.
+Report JSON kèm commit git + cấu hình để so sánh giữa các commit.
+
+Usage (từ thư mục backend):
+    python -m benchmarks.bench_pipeline --durations 1,3,5,10,20 --repeat 3 --concurrency 1,4
+    python -m benchmarks.bench_pipeline --manifest data/eval/manifest.json --output pipeline.json
+    python -m benchmarks.bench_pipeline --random-weights --no-whisper --durations 1,5
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks._common import (
+    latency_summary,
+    load_pronunciation_stack,
+    setup_logging,
+    synthetic_utterance,
+    write_report,
+)
+
+FIXTURE_SAMPLE_RATE = 44100
+STAGE_ORDER = (
+    "decode", "resample", "vad", "whisper",
+    "wav2vec2", "normalize", "conformer", "ctc_decode", "g2p", "alignment", "forced_alignment",
+    "feedback_build",
+)
+
+
+@dataclass
+class Fixture:
+    name: str
+    audio_bytes: bytes
+    audio_format: str
+    text: str
+    duration_s: float
+
+
+def _phrase_text(seconds: float) -> str:
+    # Ghép câu mẫu tới ~3 âm tiết/giây
+    phrases_path = Path(__file__).parent.parent / "models" / "korean_phrases.json"
+    data = json.loads(phrases_path.read_text(encoding="utf-8"))
+    phrases = [
+        phrase
+        for category in data["categories"].values()
+        for phrase in category["phrases"]
+        if "..." not in phrase
+    ]
+    words: List[str] = []
+    syllables = 0
+    i = 0
+    while syllables < max(1, int(seconds * 3)):
+        phrase = phrases[i % len(phrases)]
+        words.append(phrase)
+        syllables += len(phrase.replace(" ", ""))
+        i += 1
+    return " ".join(words)
+
+
+def _synthetic_fixtures(durations: List[float]) -> List[Fixture]:
+    import soundfile as sf
+
+    fixtures = []
+    for seconds in durations:
+        buffer = io.BytesIO()
+        audio = synthetic_utterance(seconds, sample_rate=FIXTURE_SAMPLE_RATE, seed=int(seconds * 10))
+        sf.write(buffer, audio, FIXTURE_SAMPLE_RATE, format="WAV", subtype="PCM_16")
+        fixtures.append(Fixture(f"synthetic-{seconds:g}s", buffer.getvalue(), "wav", _phrase_text(seconds), seconds))
+    return fixtures
+
+
+def _manifest_fixtures(manifest_path: str) -> List[Fixture]:
+    from services.audio_service import decode_audio_bytes
+
+    manifest = Path(manifest_path)
+    fixtures = []
+    for entry in json.loads(manifest.read_text(encoding="utf-8")):
+        audio_path = manifest.parent / entry["audio"]
+        audio_bytes = audio_path.read_bytes()
+        duration = len(decode_audio_bytes(audio_bytes, audio_path.suffix[1:])) / 16000
+        fixtures.append(Fixture(entry["audio"], audio_bytes, audio_path.suffix[1:], entry["text"], round(duration, 2)))
+    return fixtures
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss: KB trên Linux, byte trên macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _run_pipeline(fixture: Fixture, whisper: bool) -> Dict[str, float]:
+    """Một lượt read-aloud, trả về thời gian (ms) từng stage + total"""
+    from routers.speaking import _build_pronunciation_feedback
+    from services import pronunciation_model_service as pms
+    from services.audio_service import AudioBuffer
+    from services.stt_service import transcribe_with_local_whisper
+
+    stages: Dict[str, float] = {}
+    started = time.perf_counter()
+    buffer = AudioBuffer.from_bytes(fixture.audio_bytes, fixture.audio_format)
+    stages.update(buffer.timings)
+
+    if whisper:
+        # transcribe_with_local_whisper nhận file - ghi trước, không tính vào stage
+        with tempfile.NamedTemporaryFile(suffix=f".{fixture.audio_format}", delete=False) as f:
+            f.write(fixture.audio_bytes)
+        try:
+            whisper_started = time.perf_counter()
+            asyncio.run(transcribe_with_local_whisper(f.name))
+            stages["whisper"] = (time.perf_counter() - whisper_started) * 1000
+        finally:
+            os.unlink(f.name)
+
+    with pms.record_stage_timings() as inference:
+        result = pms.check_pronunciation_from_buffer(buffer, fixture.text)
+    if result is None:
+        raise RuntimeError(f"Pronunciation check failed for {fixture.name}")
+    stages.update(inference)
+
+    feedback_started = time.perf_counter()
+    _build_pronunciation_feedback(result, fixture.text)
+    stages["feedback_build"] = (time.perf_counter() - feedback_started) * 1000
+
+    stages["total"] = (time.perf_counter() - started) * 1000
+    return stages
+
+
+def _stage_breakdown(fixture: Fixture, repeat: int, whisper: bool) -> Dict[str, Any]:
+    _run_pipeline(fixture, whisper)  # Warm-up
+    runs = [_run_pipeline(fixture, whisper) for _ in range(repeat)]
+    names = [name for name in STAGE_ORDER if any(name in run for run in runs)]
+    stages_ms = {name: round(float(np.mean([run.get(name, 0.0) for run in runs])), 2) for name in names}
+    total = latency_summary([run["total"] / 1000 for run in runs])
+    return {
+        "fixture": fixture.name,
+        "duration_s": fixture.duration_s,
+        "expected_syllables": len(fixture.text.replace(" ", "")),
+        "stages_ms": stages_ms,
+        # Phần còn lại (overhead, pronunciation ngoài các stage đã đo)
+        "unaccounted_ms": round(total["mean_ms"] - sum(stages_ms.values()), 2),
+        "total": total,
+        "real_time_factor": round(total["mean_ms"] / 1000 / fixture.duration_s, 3) if fixture.duration_s else None,
+    }
+
+
+def _throughput(fixtures: List[Fixture], concurrency: int, requests: int, whisper: bool) -> Dict[str, Any]:
+    jobs = [fixtures[i % len(fixtures)] for i in range(requests)]
+
+    def one(fixture: Fixture) -> float:
+        return _run_pipeline(fixture, whisper)["total"] / 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, jobs))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 3),
+        "audio_seconds_per_second": round(sum(f.duration_s for f in jobs) / elapsed, 2),
+        "latency": latency_summary(latencies),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", default="1,3,5,10,20", help="Synthetic fixture lengths in seconds")
+    parser.add_argument("--manifest", help="JSON list of {audio, text} recordings (used instead of synthetic fixtures)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per fixture for the stage breakdown")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels (empty = skip)")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level")
+    parser.add_argument("--batching", action="store_true", help="Enable micro-batching for the concurrency runs")
+    parser.add_argument("--no-whisper", action="store_true", help="Skip the local Whisper stage")
+    parser.add_argument("--random-weights", action="store_true", help="Use random Conformer weights if the model file is missing")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    import torch
+    from config import settings
+    from services import stt_service
+
+    settings.pronunciation_cache_enabled = False
+    settings.pronunciation_batching_enabled = False
+    settings.model_worker_address = ""  # Model trong process benchmark
+
+    if not load_pronunciation_stack(random_weights=args.random_weights):
+        raise SystemExit("Pronunciation model not available (use --random-weights to benchmark speed only)")
+    whisper = not args.no_whisper and stt_service._load_whisper_local()
+    if not args.no_whisper and not whisper:
+        print("Local Whisper not available - skipping whisper stage", file=sys.stderr)
+    rss_after_load = _peak_rss_mb()
+
+    if args.manifest:
+        fixtures = _manifest_fixtures(args.manifest)
+    else:
+        fixtures = _synthetic_fixtures([float(d) for d in args.durations.split(",") if d.strip()])
+
+    breakdown = [_stage_breakdown(fixture, args.repeat, whisper) for fixture in fixtures]
+    rss_after_breakdown = _peak_rss_mb()
+
+    settings.pronunciation_batching_enabled = args.batching
+    concurrency = [
+        _throughput(fixtures, int(c), args.requests, whisper)
+        for c in args.concurrency.split(",") if c.strip()
+    ]
+
+    write_report({
+        "benchmark": "pipeline",
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "cpu_count": os.cpu_count(),
+            "source": args.manifest or "synthetic",
+            "whisper": bool(whisper),
+            "settings": {
+                "pronunciation_quantize_int8": settings.pronunciation_quantize_int8,
+                "pronunciation_use_torchscript": settings.pronunciation_use_torchscript,
+                "pronunciation_forced_alignment": settings.pronunciation_forced_alignment,
+                "pronunciation_chunk_frames": settings.pronunciation_chunk_frames,
+                "audio_vad_trim_enabled": settings.audio_vad_trim_enabled,
+                "batching_in_concurrency_runs": args.batching,
+            },
+        },
+        "repeat": args.repeat,
+        "stages": breakdown,
+        "concurrency": concurrency,
+        "peak_rss_mb": {
+            "after_model_load": rss_after_load,
+            "after_breakdown": rss_after_breakdown,
+            "final": _peak_rss_mb(),
+        },
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: throughput vs latency của pronunciation inference, batch size 1 vs micro-batching
+
+Đo đúng đường chạy production: mỗi client là một coroutine gọi liên tục
+pronunciation_model_service.predict_log_probs_async (Wav2Vec2 + Conformer, không gồm
+G2P/scoring) trên một event loop.
+- "batch1": tắt batching → mỗi request chạy trên pool "model" (inference_workers thread)
+- "batched": bật batching → request chờ micro-batcher ngay trên event loop
+
+Cache log-probs luôn tắt. Số thread của pool "model" chỉnh bằng --workers.
+
+Usage (từ thư mục backend):
+    python -m benchmarks.bench_pronunciation_batching --concurrency 1,4,16 --requests 64
+    python -m benchmarks.bench_pronunciation_batching --window-ms 10,30 --max-batch 8 --random-weights
+    python -m benchmarks.bench_pronunciation_batching --workers 4 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from benchmarks._common import (
+    latency_summary,
+    load_pronunciation_stack,
+    setup_logging,
+    synthetic_utterance,
+    write_report,
+)
+
+
+async def _drive(concurrency: int, audios: List) -> List[float]:
+    from services import pronunciation_model_service as pms
+
+    pending = list(audios)
+    latencies: List[float] = []
+
+    async def client() -> None:
+        while pending:
+            audio = pending.pop()
+            started = time.perf_counter()
+            await pms.predict_log_probs_async(audio)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def _run(mode: str, concurrency: int, audios: List, window_ms: float, max_batch: int) -> Dict[str, Any]:
+    from config import settings
+    from services import pronunciation_model_service as pms
+    from services.inference_executor import get_inference_executor
+
+    settings.pronunciation_batching_enabled = mode == "batched"
+    settings.pronunciation_batch_max_size = max_batch
+    settings.pronunciation_batch_window_ms = window_ms
+    # Batcher mới cho mỗi lượt (cấu hình + thống kê riêng)
+    if pms._pronunciation_batcher is not None:
+        pms._pronunciation_batcher.close()
+        pms._pronunciation_batcher = None
+
+    started = time.perf_counter()
+    latencies = asyncio.run(_drive(concurrency, audios))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "mode": mode,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(audios) / elapsed, 2),
+        "latency": latency_summary(latencies),
+        "model_pool": get_inference_executor().stats(),
+    }
+    if mode == "batched":
+        result["window_ms"] = window_ms
+        result["batcher"] = pms.get_pronunciation_batcher().stats()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=48, help="Requests per run")
+    parser.add_argument("--durations", default="2,3,5", help="Utterance lengths in seconds (cycled)")
+    parser.add_argument("--window-ms", default="20", help="Comma-separated batch windows to test")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--workers", type=int, help="Threads in the \"model\" pool (default: settings.inference_workers)")
+    parser.add_argument("--random-weights", action="store_true", help="Use random Conformer weights if the model file is missing")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    from config import settings
+
+    if args.workers:
+        settings.inference_workers = args.workers
+    # Mọi client đều được nhận (đo latency xếp hàng thay vì 503)
+    settings.inference_max_queue = max(settings.inference_max_queue, args.requests)
+    settings.pronunciation_cache_enabled = False
+    settings.model_worker_address = ""  # Model trong process benchmark
+
+    if not load_pronunciation_stack(random_weights=args.random_weights):
+        raise SystemExit("Pronunciation model not available (use --random-weights to benchmark speed only)")
+
+    durations = [float(d) for d in args.durations.split(",")]
+    audios = [synthetic_utterance(durations[i % len(durations)], seed=i) for i in range(args.requests)]
+
+    # Warm-up để không tính lazy init vào lượt đo đầu tiên
+    from services import pronunciation_model_service as pms
+    pms.predict_log_probs_batch(audios[:2])
+
+    runs = []
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        runs.append(_run("batch1", concurrency, audios, 0.0, 1))
+        for window in (float(w) for w in args.window_ms.split(",")):
+            runs.append(_run("batched", concurrency, audios, window, args.max_batch))
+
+    write_report({
+        "benchmark": "pronunciation_batching",
+        "requests": args.requests,
+        "durations_s": durations,
+        "max_batch": args.max_batch,
+        "inference_workers": settings.inference_workers,
+        "runs": runs,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
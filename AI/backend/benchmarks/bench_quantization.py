@@ -0,0 +1,168 @@
+"""
+Benchmark: parity PER + latency giữa fp32 và int8 (dynamic quantization) của Wav2Vec2 + Conformer
+
+Chạy toàn bộ check_pronunciation_from_array (G2P + scoring) cho từng bản ghi ở cả hai chế độ,
+so sánh PER, chuỗi phoneme dự đoán và latency.
+
+Manifest là file JSON: [{"audio": "recordings/001.wav", "text": "안녕하세요"}, ...]
+(đường dẫn audio tính từ thư mục chứa manifest). Không có manifest thì dùng audio giả lập +
+câu trong models/korean_phrases.json - chỉ đo được độ lệch fp32/int8, không phải độ chính xác.
+
+Usage (từ thư mục backend):
+    python -m benchmarks.bench_quantization --manifest data/eval/manifest.json --repeat 3
+    python -m benchmarks.bench_quantization --random-weights --output quant.json
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks._common import (
+    latency_summary,
+    load_pronunciation_stack,
+    setup_logging,
+    synthetic_phrase_items,
+    write_report,
+)
+
+
+def _load_manifest(manifest_path: str) -> List[Tuple[str, np.ndarray, str]]:
+    from services.audio_service import decode_audio_bytes
+
+    manifest = Path(manifest_path)
+    entries = json.loads(manifest.read_text(encoding="utf-8"))
+    items = []
+    for entry in entries:
+        audio_path = manifest.parent / entry["audio"]
+        samples = decode_audio_bytes(audio_path.read_bytes(), audio_path.suffix[1:])
+        items.append((entry["audio"], samples, entry["text"]))
+    return items
+
+
+def _tensor_bytes(value) -> int:
+    import torch
+
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        # Packed params của DynamicQuantizedLinear: (qweight int8, bias)
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+def _state_dict_size_mb(model) -> float:
+    """Kích thước weights (MB) - int8 weights tính 1 byte/phần tử"""
+    total = sum(_tensor_bytes(v) for v in model.state_dict().values())
+    return round(total / (1024 * 1024), 2)
+
+
+def _run_mode(mode: str, items, repeat: int) -> Dict[str, Any]:
+    from services import pronunciation_model_service as pms
+
+    pms.check_pronunciation_from_array(items[0][1], items[0][2])  # Warm-up
+
+    latencies = []
+    results = {}
+    for name, samples, text in items:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = pms.check_pronunciation_from_array(samples, text)
+            latencies.append(time.perf_counter() - started)
+        results[name] = result
+
+    pers = [r.per for r in results.values() if r is not None]
+    return {
+        "mode": mode,
+        "latency": latency_summary(latencies),
+        "mean_per": round(float(np.mean(pers)), 4) if pers else None,
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", help="JSON list of {audio, text} recordings")
+    parser.add_argument("--synthetic", type=int, default=20, help="Synthetic items when no manifest is given")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per recording")
+    parser.add_argument("--random-weights", action="store_true", help="Use random Conformer weights if the model file is missing")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    import torch
+    from config import settings
+    from services import pronunciation_model_service as pms
+
+    # Load bản fp32 trước, bản int8 được tạo từ chính weights đó
+    settings.pronunciation_quantize_int8 = False
+    if not load_pronunciation_stack(random_weights=args.random_weights):
+        raise SystemExit("Pronunciation model not available (use --random-weights to benchmark speed only)")
+
+    items = _load_manifest(args.manifest) if args.manifest else synthetic_phrase_items(args.synthetic)
+
+    cpu = torch.device("cpu")
+    fp32 = pms.current_model()
+    fp32_models = (pms._wav2vec2_model, fp32.model)
+    int8_models = (
+        pms.quantize_dynamic_int8(fp32_models[0], cpu, "Wav2Vec2"),
+        pms.quantize_dynamic_int8(fp32_models[1], cpu, "Conformer"),
+    )
+
+    runs = {}
+    for mode, (wav2vec2, conformer) in (("fp32", fp32_models), ("int8", int8_models)):
+        # Mỗi chế độ là một phiên bản model riêng → cache log-probs không lẫn giữa fp32 và int8
+        pms._wav2vec2_model = wav2vec2
+        pms.install_pronunciation_model(pms.derive_pronunciation_model(fp32, conformer, f"{fp32.version}-{mode}"))
+        runs[mode] = _run_mode(mode, items, args.repeat)
+        runs[mode]["conformer_size_mb"] = _state_dict_size_mb(conformer)
+        runs[mode]["wav2vec2_size_mb"] = _state_dict_size_mb(wav2vec2)
+
+    # Parity từng bản ghi
+    per_deltas = []
+    identical = 0
+    items_report = []
+    for name, _, text in items:
+        fp32, int8 = runs["fp32"]["results"][name], runs["int8"]["results"][name]
+        if fp32 is None or int8 is None:
+            continue
+        delta = abs(int8.per - fp32.per)
+        per_deltas.append(delta)
+        same = fp32.predicted_phonemes == int8.predicted_phonemes
+        identical += int(same)
+        items_report.append({
+            "item": name,
+            "text": text,
+            "per_fp32": round(fp32.per, 4),
+            "per_int8": round(int8.per, 4),
+            "identical_phonemes": same,
+        })
+
+    for run in runs.values():
+        run.pop("results")
+
+    fp32_p50 = runs["fp32"]["latency"]["p50_ms"]
+    int8_p50 = runs["int8"]["latency"]["p50_ms"]
+    write_report({
+        "benchmark": "quantization",
+        "source": args.manifest or f"synthetic x{len(items)}",
+        "repeat": args.repeat,
+        "torch_threads": torch.get_num_threads(),
+        "runs": list(runs.values()),
+        "parity": {
+            "items": len(per_deltas),
+            "mean_abs_per_delta": round(float(np.mean(per_deltas)), 4) if per_deltas else None,
+            "max_abs_per_delta": round(float(np.max(per_deltas)), 4) if per_deltas else None,
+            "identical_phoneme_sequences": identical,
+            "speedup_p50": round(fp32_p50 / int8_p50, 2) if int8_p50 else None,
+        },
+        "items": items_report,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
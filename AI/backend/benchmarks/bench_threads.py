@@ -0,0 +1,141 @@
+"""
+Benchmark: throughput + p50/p99 của chấm phát âm (read-aloud) theo số thread torch × số worker
+
+Mô phỏng deployment nhiều uvicorn worker trên cùng máy: model được load một lần trong
+process cha (1 thread), rồi fork N worker; mỗi worker áp dụng thread policy
+(services/thread_policy.py) với số thread cần đo, warm-up, chờ barrier để cùng bắt đầu,
+sau đó gọi check_pronunciation_from_array liên tục. Cache log-probs bị tắt để mọi lượt
+đều chạy Wav2Vec2 + Conformer.
+
+Throughput = tổng request / khoảng thời gian từ lúc worker đầu tiên bắt đầu tới lúc worker
+cuối cùng xong. Khi workers × threads vượt số core, p99 thường tăng mạnh (oversubscription).
+
+Usage (từ thư mục backend, chỉ Linux/macOS):
+    python -m benchmarks.bench_threads --threads 1,2,4 --workers 1,2,4 --requests 20
+    python -m benchmarks.bench_threads --random-weights --affinity --output threads.json
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+from benchmarks._common import (
+    latency_summary,
+    load_pronunciation_stack,
+    setup_logging,
+    synthetic_phrase_items,
+    write_report,
+)
+
+
+def _parse_counts(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _worker(worker_index: int, workers: int, threads: int, items, requests: int, barrier, queue) -> None:
+    from services import pronunciation_model_service as pms
+    from services.thread_policy import apply_thread_policy
+
+    policy = apply_thread_policy(worker_index=worker_index, worker_count=workers, num_threads=threads)
+    pms.check_pronunciation_from_array(items[0][1], items[0][2])  # Warm-up
+    barrier.wait()
+
+    latencies = []
+    started = time.time()
+    for i in range(requests):
+        _, samples, text = items[(worker_index + i) % len(items)]
+        request_started = time.perf_counter()
+        pms.check_pronunciation_from_array(samples, text)
+        latencies.append(time.perf_counter() - request_started)
+    queue.put({
+        "worker_index": worker_index,
+        "started": started,
+        "finished": time.time(),
+        "latencies": latencies,
+        "cpu_affinity": policy["cpu_affinity"],
+    })
+
+
+def _run_config(workers: int, threads: int, items, requests: int) -> Dict[str, Any]:
+    ctx = mp.get_context("fork")
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    processes = [
+        ctx.Process(target=_worker, args=(i, workers, threads, items, requests, barrier, queue))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    wall_s = max(r["finished"] for r in results) - min(r["started"] for r in results)
+    return {
+        "workers": workers,
+        "threads_per_worker": threads,
+        "total_threads": workers * threads,
+        "requests": len(latencies),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(latencies) / wall_s, 2) if wall_s else None,
+        "latency": latency_summary(latencies),
+        "cpu_affinity": [r["cpu_affinity"] for r in sorted(results, key=lambda r: r["worker_index"])],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", default="1,2,4", help="Comma-separated torch threads per worker")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--requests", type=int, default=20, help="Scoring requests per worker")
+    parser.add_argument("--synthetic", type=int, default=10, help="Synthetic phrase recordings")
+    parser.add_argument("--affinity", action="store_true", help="Pin each worker to its own CPU slice")
+    parser.add_argument("--random-weights", action="store_true", help="Use random Conformer weights if the model file is missing")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+    if not hasattr(os, "fork"):
+        raise SystemExit("bench_threads requires os.fork (Linux/macOS)")
+
+    import torch
+    from config import settings
+    from services.thread_policy import _available_cpus
+
+    settings.pronunciation_cache_enabled = False
+    settings.cpu_affinity_enabled = args.affinity
+
+    # Process cha chỉ 1 thread (giống prefork master) để worker tự đặt số thread sau fork
+    torch.set_num_threads(1)
+    if not load_pronunciation_stack(random_weights=args.random_weights):
+        raise SystemExit("Pronunciation model not available (use --random-weights to benchmark speed only)")
+    items = synthetic_phrase_items(args.synthetic)
+
+    runs = []
+    for workers in _parse_counts(args.workers):
+        for threads in _parse_counts(args.threads):
+            run = _run_config(workers, threads, items, args.requests)
+            runs.append(run)
+            print(
+                f"workers={workers} threads={threads}: {run['throughput_rps']} req/s, "
+                f"p50 {run['latency']['p50_ms']} ms, p99 {run['latency']['p99_ms']} ms",
+                file=sys.stderr
+            )
+
+    write_report({
+        "benchmark": "threads",
+        "available_cpus": len(_available_cpus()),
+        "affinity": args.affinity,
+        "requests_per_worker": args.requests,
+        "items": len(items),
+        "runs": runs,
+        "best_throughput": max(runs, key=lambda r: r["throughput_rps"] or 0.0) if runs else None,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
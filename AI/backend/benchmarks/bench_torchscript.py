@@ -0,0 +1,105 @@
+"""
+Benchmark: eager vs TorchScript đã freeze cho Conformer (và tuỳ chọn Wav2Vec2 encoder)
+
+Đo predict_log_probs_batch([audio]) - Wav2Vec2 + Conformer, batch 1 - theo từng độ dài utterance.
+Artifact được tạo trong process bằng services.pronunciation_export (không cần file .ts có sẵn).
+
+Usage (từ thư mục backend):
+    python -m benchmarks.bench_torchscript --durations 1,2,3,5,8 --repeat 10
+    python -m benchmarks.bench_torchscript --wav2vec2 --random-weights --output torchscript.json
+"""
+import argparse
+import time
+from typing import Any, Dict, List
+
+from benchmarks._common import (
+    latency_summary,
+    load_pronunciation_stack,
+    setup_logging,
+    synthetic_utterance,
+    write_report,
+)
+
+
+def _time_mode(audio, repeat: int) -> Dict[str, float]:
+    from services import pronunciation_model_service as pms
+
+    pms.predict_log_probs_batch([audio])  # Warm-up (TorchScript profiling chạy ở vài lượt đầu)
+    pms.predict_log_probs_batch([audio])
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pms.predict_log_probs_batch([audio])
+        latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", default="1,2,3,5,8", help="Utterance lengths in seconds (max 10 s = 500 frames)")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per duration and mode")
+    parser.add_argument("--wav2vec2", action="store_true", help="Also benchmark the traced Wav2Vec2 encoder")
+    parser.add_argument("--random-weights", action="store_true", help="Use random Conformer weights if the model file is missing")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    import torch
+    from config import settings
+    from services import pronunciation_model_service as pms
+    from services.pronunciation_export import script_conformer, trace_wav2vec2_encoder
+
+    # Luôn bắt đầu từ eager model, artifact được tạo từ chính weights đó
+    settings.pronunciation_quantize_int8 = False
+    settings.pronunciation_use_torchscript = False
+    if not load_pronunciation_stack(random_weights=args.random_weights):
+        raise SystemExit("Pronunciation model not available (use --random-weights to benchmark speed only)")
+
+    eager = pms.current_model()
+    eager_conformer = eager.model
+    frozen_conformer = script_conformer(eager_conformer)
+    frozen_encoder = trace_wav2vec2_encoder(pms._wav2vec2_model) if args.wav2vec2 else None
+
+    modes = [("eager", eager_conformer, None), ("frozen_conformer", frozen_conformer, None)]
+    if frozen_encoder is not None:
+        modes.append(("frozen_conformer+wav2vec2_encoder", frozen_conformer, frozen_encoder))
+
+    results: List[Dict[str, Any]] = []
+    for seconds in (float(d) for d in args.durations.split(",")):
+        audio = synthetic_utterance(seconds, seed=int(seconds * 10))
+
+        row: Dict[str, Any] = {"duration_s": seconds, "modes": {}}
+        reference = None
+        for name, conformer, encoder in modes:
+            pms.install_pronunciation_model(pms.derive_pronunciation_model(eager, conformer, name))
+            pms._wav2vec2_encoder_ts = encoder
+            row["modes"][name] = _time_mode(audio, args.repeat)
+
+            output = pms.predict_log_probs_batch([audio])[0]
+            if reference is None:
+                reference = output
+            else:
+                row["modes"][name]["max_abs_diff_vs_eager"] = float((output - reference).abs().max())
+
+        eager_p50 = row["modes"]["eager"]["p50_ms"]
+        row["speedup_p50"] = {
+            name: round(eager_p50 / stats["p50_ms"], 2)
+            for name, stats in row["modes"].items()
+            if name != "eager" and stats["p50_ms"]
+        }
+        results.append(row)
+
+    pms.install_pronunciation_model(eager)
+    pms._wav2vec2_encoder_ts = None
+    write_report({
+        "benchmark": "torchscript",
+        "repeat": args.repeat,
+        "torch_threads": torch.get_num_threads(),
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: requests/giây + latency của local Whisper, batch size 1 vs micro-batching
+
+Mỗi client là một thread gửi request liên tục (chỉ Whisper generate, không gồm decode audio).
+Chế độ "batch1" gọi thẳng từng request, chế độ "batched" đi qua MicroBatcher giống
+stt_service.get_whisper_batcher() với max wait cần đo.
+
+Audio giả lập khiến Whisper sinh độ dài output khác nhau (batch chờ câu dài nhất);
+dùng --manifest với bản ghi thật để có số liệu sát production.
+
+Usage (từ thư mục backend):
+    python -m benchmarks.bench_whisper_batching --concurrency 1,4,16 --requests 48
+    python -m benchmarks.bench_whisper_batching --max-wait-ms 10,30,60 --max-batch 16
+    python -m benchmarks.bench_whisper_batching --manifest data/eval/manifest.json --output whisper.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks._common import latency_summary, setup_logging, synthetic_utterance, write_report
+
+
+def _manifest_audios(manifest_path: str) -> List[np.ndarray]:
+    from services.audio_service import decode_audio_bytes
+
+    manifest = Path(manifest_path)
+    audios = []
+    for entry in json.loads(manifest.read_text(encoding="utf-8")):
+        audio_path = manifest.parent / entry["audio"]
+        audios.append(decode_audio_bytes(audio_path.read_bytes(), audio_path.suffix[1:]))
+    return audios
+
+
+def _run(mode: str, concurrency: int, audios: List[np.ndarray], language: str,
+         max_wait_ms: float, max_batch: int) -> Dict[str, Any]:
+    from services import stt_service
+    from services.batching import MicroBatcher
+
+    batcher = None
+    if mode == "batched":
+        batcher = MicroBatcher(
+            stt_service._whisper_generate_batch,
+            max_batch_size=max_batch,
+            max_wait_ms=max_wait_ms,
+            name="bench-whisper-batcher"
+        )
+
+    def one(audio: np.ndarray) -> float:
+        started = time.perf_counter()
+        if batcher is not None:
+            batcher.submit((audio, language)).result()
+        else:
+            stt_service._whisper_generate_batch([(audio, language)])
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, audios))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "mode": mode,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(audios) / elapsed, 2),
+        "latency": latency_summary(latencies),
+    }
+    if batcher is not None:
+        result["max_wait_ms"] = max_wait_ms
+        result["batcher"] = batcher.stats()
+        batcher.close()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=48, help="Requests per run")
+    parser.add_argument("--durations", default="2,3,5", help="Synthetic utterance lengths in seconds (cycled)")
+    parser.add_argument("--manifest", help="JSON list of {audio, ...} recordings (used instead of synthetic audio)")
+    parser.add_argument("--language", default="ko")
+    parser.add_argument("--max-wait-ms", default="30", help="Comma-separated batch max waits to test")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    import torch
+    from services import stt_service
+
+    if not stt_service._load_whisper_local():
+        raise SystemExit("Local Whisper not available (check transformers install / WHISPER_MODEL)")
+
+    if args.manifest:
+        recordings = _manifest_audios(args.manifest)
+        audios = [recordings[i % len(recordings)] for i in range(args.requests)]
+    else:
+        durations = [float(d) for d in args.durations.split(",")]
+        audios = [synthetic_utterance(durations[i % len(durations)], seed=i) for i in range(args.requests)]
+
+    # Warm-up để không tính lazy init vào lượt đo đầu tiên
+    stt_service._whisper_generate_batch([(audios[0], args.language)])
+
+    runs = []
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        runs.append(_run("batch1", concurrency, audios, args.language, 0.0, 1))
+        for max_wait in (float(w) for w in args.max_wait_ms.split(",")):
+            runs.append(_run("batched", concurrency, audios, args.language, max_wait, args.max_batch))
+
+    write_report({
+        "benchmark": "whisper_batching",
+        "model": os.getenv("WHISPER_MODEL", "openai/whisper-tiny"),
+        "torch_threads": torch.get_num_threads(),
+        "source": args.manifest or "synthetic",
+        "requests": args.requests,
+        "max_batch": args.max_batch,
+        "runs": runs,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,126 @@ class Settings(BaseSettings):
     mysql_password: str = ""
     mysql_database: str = "koreanhwa"
 
+    # Pronunciation Model Inference
+    # Dynamic micro-batching: gom các request đồng thời trong một cửa sổ ngắn
+    # rồi chạy một lượt Wav2Vec2 + Conformer cho cả batch
+    pronunciation_batching_enabled: bool = False
+    pronunciation_batch_max_size: int = 8
+    pronunciation_batch_window_ms: float = 20.0
+    # Dynamic int8 quantization cho nn.Linear của Wav2Vec2 + Conformer (chỉ CPU)
+    pronunciation_quantize_int8: bool = False
+    # Ưu tiên artifact TorchScript (python -m services.pronunciation_export) nếu có
+    pronunciation_use_torchscript: bool = True
+    # Audio dài hơn cửa sổ (frame 20 ms, tối đa 500) chạy theo đoạn chồng nhau
+    pronunciation_chunk_frames: int = 400
+    pronunciation_chunk_context_frames: int = 50
+    # CTC forced alignment theo expected text: timestamp + GOP cho từng phoneme
+    pronunciation_forced_alignment: bool = True
+    # Cache log-probs theo hash PCM (LRU trong bộ nhớ, tuỳ chọn spill xuống disk)
+    pronunciation_cache_enabled: bool = True
+    pronunciation_cache_max_entries: int = 256
+    pronunciation_cache_max_mb: float = 64.0
+    pronunciation_cache_spill_dir: str = ""
+    pronunciation_cache_spill_max_mb: float = 512.0
+    # Expected text đã biên dịch (G2P, ID, ranh giới từ) - LRU + biên dịch trước giáo trình khi startup
+    pronunciation_text_cache_size: int = 10000
+    pronunciation_precompile_on_startup: bool = True
+    # Load + chạy thử mọi model (Wav2Vec2, Conformer, Whisper) ở background khi startup; /ready chờ xong
+    model_warmup_enabled: bool = True
+    # Model registry (/api/admin/models): load phiên bản mới ở background, chấm canary rồi hot-swap
+    # Canary: manifest JSON [{"audio": "...", "text": "..."}] (đường dẫn audio tính từ thư mục manifest);
+    # trống = chỉ kiểm tra model chạy được và output hợp lệ
+    model_registry_canary_path: str = ""
+    # Từ chối phiên bản mới nếu PER trung bình trên canary tăng quá mức này so với bản đang chạy
+    model_registry_max_per_increase: float = 0.05
+    # File JSON ghi phiên bản đã active; mọi worker của deployment theo dõi file này và tự load + swap
+    # (trống = models/.registry_state.json của deployment này)
+    model_registry_state_path: str = ""
+    model_registry_poll_seconds: float = 2.0
+    # Header X-Admin-Token cho /api/admin/*; trống = tắt admin endpoint ở mọi môi trường
+    admin_token: str = ""
+
+    # Cache transcript theo (hash PCM, ngôn ngữ, backend STT + phiên bản): người dùng gửi lại
+    # cùng bản ghi / client retry không chạy lại Whisper hay gọi OpenAI thêm lần nữa
+    transcript_cache_enabled: bool = True
+    transcript_cache_max_entries: int = 2048
+    transcript_cache_ttl_seconds: float = 86400.0
+    # Tầng SQLite (dùng chung giữa các worker, giữ qua restart); trống = chỉ cache trong bộ nhớ
+    transcript_cache_sqlite_path: str = ""
+    transcript_cache_sqlite_max_entries: int = 100000
+    # Transcript trả sau của read-aloud (defer_transcript=true): SQLite dùng chung giữa các worker
+    # trên cùng máy; trống = file trong thư mục tạm của hệ thống
+    deferred_transcript_sqlite_path: str = ""
+    deferred_transcript_ttl_seconds: float = 300.0
+
+    # STT router (services/stt_router.py): backend có chi phí ≤ stt_primary_max_cost chọn theo
+    # latency; backend đắt hơn (tới stt_max_cost) chỉ dùng làm fallback. Mức: free / cheap / paid
+    stt_primary_max_cost: Literal["free", "cheap", "paid"] = "free"
+    stt_max_cost: Literal["free", "cheap", "paid"] = "paid"
+    stt_backend_timeout_seconds: float = 30.0
+    stt_latency_window: int = 50
+    # Circuit breaker: số lỗi liên tiếp để bỏ qua backend, và thời gian bỏ qua trước khi thử lại
+    stt_breaker_failure_threshold: int = 3
+    stt_breaker_cooldown_seconds: float = 30.0
+
+    # Local Whisper: gom các request đồng thời (read-aloud, free-speak, check-exercise) thành một
+    # lượt generate - log-mel của mọi request đều pad về 30 s nên ghép batch trực tiếp
+    whisper_batching_enabled: bool = False
+    whisper_batch_max_size: int = 8
+    whisper_batch_max_wait_ms: float = 30.0
+
+    # Live talk streaming (WS /api/live-talk/stream): partial transcript bằng local Whisper sau mỗi
+    # khoảng này (nếu có audio mới); phần chưa chốt dài quá live_talk_commit_seconds thì chốt lại
+    # để mỗi lần decode nằm trong cửa sổ 30 s của Whisper
+    live_talk_partial_interval_seconds: float = 1.0
+    live_talk_commit_seconds: float = 15.0
+    live_talk_stream_max_seconds: float = 120.0
+    # Số stream đồng thời mỗi process (mỗi stream container giữ một process ffmpeg) - hết slot → đóng 1013
+    live_talk_max_streams: int = 8
+    # Không nhận message nào trong khoảng này → đóng stream (giải phóng decoder + slot)
+    live_talk_idle_timeout_seconds: float = 15.0
+
+    # Thread policy cho torch (áp dụng trước khi load model, xem services/thread_policy.py)
+    # 0 = tự chia core khả dụng cho số worker
+    torch_num_threads: int = 0
+    torch_num_interop_threads: int = 1
+    # Số process chia nhau CPU (0 = $WEB_CONCURRENCY hoặc 1)
+    torch_worker_count: int = 0
+    # Ghim mỗi worker vào dải core riêng (cần chế độ --preload để biết vị trí worker)
+    cpu_affinity_enabled: bool = False
+
+    # Chế độ --preload: worker chết được fork lại sau backoff tăng gấp đôi mỗi lần chết sớm
+    # (sống < prefork_min_uptime_seconds); chết sớm liên tiếp quá prefork_max_quick_failures → master dừng
+    prefork_restart_backoff_seconds: float = 1.0
+    prefork_restart_backoff_max_seconds: float = 30.0
+    prefork_min_uptime_seconds: float = 10.0
+    prefork_max_quick_failures: int = 5
+
+    # Cắt khoảng lặng đầu/cuối audio upload trước khi chạy model (energy VAD)
+    audio_vad_trim_enabled: bool = True
+    audio_vad_threshold_db: float = 35.0  # Thấp hơn frame to nhất quá mức này = khoảng lặng
+    audio_vad_margin_seconds: float = 0.2
+
+    # ffmpeg decode webm/mp3/m4a... qua pipe: số process ffmpeg chạy đồng thời (mỗi process)
+    audio_transcoder_max_parallel: int = 4
+    audio_transcoder_timeout_seconds: float = 30.0
+
+    # Worker pool cho model inference (Whisper, Wav2Vec2 + Conformer) chạy ngoài event loop
+    inference_workers: int = 2
+    # Số việc được phép chờ mỗi pool; vượt quá → 503
+    inference_max_queue: int = 32
+    # Thread pool cho API call đồng bộ (OpenAI SDK)
+    inference_remote_workers: int = 8
+    # > 0: decode/resample audio trên process pool riêng
+    inference_process_workers: int = 0
+
+    # Model worker process (python -m services.model_worker) - để trống thì load model trong từng API worker
+    model_worker_address: str = ""  # Unix socket path hoặc host:port (chỉ loopback)
+    # Secret dùng chung giữa API và model worker (≥ 16 ký tự); bắt buộc khi bật model worker
+    model_worker_authkey: str = ""
+    model_worker_pool_size: int = 4
+    model_worker_timeout_seconds: float = 60.0
+
     class Config:
         env_file = ".env"
         case_sensitive = False
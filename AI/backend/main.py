@@ -5,13 +5,28 @@ Main application entry point
 This module sets up the FastAPI application, configures CORS,
 registers routers, and handles startup/shutdown events.
 """
+import asyncio
 import logging
 from typing import Dict, Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
+from services.audio_transcoder import probe_ffmpeg, transcoder_report
+from services.inference_executor import inference_stats, shutdown_inference_executor
+from services.model_worker import get_model_worker_client
+from services.model_registry import active_version, start_version_watcher
+from services.pronunciation_model_service import (
+    compiled_text_cache_stats,
+    log_prob_cache_stats,
+    precompile_curriculum_texts
+)
+from services.process_memory import memory_report
+from services.stt_router import stt_backend_report
+from services.thread_policy import apply_thread_policy, thread_policy_report
+from services.transcript_cache import transcript_cache_stats
+from services.warmup_service import is_warm, warm_up_models, warmup_report
 
 # Configure logging
 logging.basicConfig(
@@ -92,13 +107,43 @@ async def ping() -> Dict[str, str]:
     }
 
 
+@app.get("/ready")
+async def readiness_check(response: Response) -> Dict[str, Any]:
+    """
+    Readiness check cho load balancer
+    
+    Returns:
+        200 khi warm-up model đã xong (503 nếu chưa), kèm trạng thái load và
+        thời gian load / forward đầu tiên của từng model
+    """
+    client = get_model_worker_client()
+    if client is not None:
+        # Model nằm ở model worker: ready khi worker kết nối được và đã warm xong
+        status = await asyncio.to_thread(client.status)
+        report = dict((status or {}).get("warmup") or {"ready": False, "models": {}})
+        report["mode"] = "model_worker"
+        report["worker_reachable"] = status is not None
+    else:
+        report = warmup_report()
+        report["mode"] = "local"
+        if not settings.model_warmup_enabled:
+            report["ready"] = True  # Model load lazy ở request đầu tiên
+    
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
+
 @app.get("/health")
 async def health_check() -> Dict[str, Any]:
     """
     Detailed health check endpoint
     
     Returns:
-        Health status including environment and OpenAI configuration status
+        Health status including environment, OpenAI configuration status
+        inference pool metrics (in-flight, queue wait, rejected), cache hit/miss counters
+        and process memory (RSS/PSS/shared - xem chế độ --preload),
+        STT backend health (latency, error rate, circuit breaker), ffmpeg capabilities + transcoder stats
     """
     return {
         "status": "healthy",
@@ -106,7 +151,19 @@ async def health_check() -> Dict[str, Any]:
         "openai_configured": bool(
             settings.openai_api_key 
             and settings.openai_api_key != "your_openai_api_key_here"
-        )
+        ),
+        "inference": inference_stats(),
+        "pronunciation_model_version": active_version(),
+        "caches": {
+            "pronunciation_log_probs": log_prob_cache_stats(),
+            "compiled_expected_text": compiled_text_cache_stats(),
+            # COUNT(*) trên tầng SQLite - chạy ngoài event loop
+            "transcripts": await asyncio.to_thread(transcript_cache_stats)
+        },
+        "memory": memory_report(),
+        "threads": thread_policy_report(),
+        "stt_backends": stt_backend_report(),
+        "audio": transcoder_report()
     }
 
 
@@ -165,7 +222,7 @@ async def debug_openai_key() -> Dict[str, Any]:
 
 
 # ===== IMPORT ROUTERS =====
-from routers import chat, lesson, tts, media, speaking, live_talk, user_progress, dictionary, topik, vocabulary, exercise, progress, roadmap
+from routers import chat, lesson, tts, media, speaking, live_talk, user_progress, dictionary, topik, vocabulary, exercise, progress, roadmap, admin
 from services.pronunciation_model_service import load_pronunciation_model, is_model_loaded
 
 # Include routers
@@ -182,6 +239,7 @@ app.include_router(vocabulary.router)  # Vocabulary router
 app.include_router(exercise.router)  # Exercise router
 app.include_router(progress.router)  # Progress router
 app.include_router(roadmap.router)  # Roadmap router
+app.include_router(admin.router)  # Admin: model registry
 
 @app.on_event("startup")
 async def startup_event():
@@ -189,6 +247,9 @@ async def startup_event():
     logger.info(f"Environment: {settings.env}")
     logger.info(f"Frontend URL: {settings.frontend_url}")
     
+    # Kiểm tra ffmpeg một lần (kết quả được cache cho mọi lần decode sau)
+    probe_ffmpeg()
+    
     # Log OpenAI API key status (masked)
     api_key = settings.openai_api_key
     if api_key and api_key != "your_openai_api_key_here":
@@ -198,6 +259,42 @@ async def startup_event():
     else:
         logger.warning("⚠️ OpenAI API key not configured!")
     
+    # Model nằm ở process model worker riêng → API worker không load weights
+    # (vẫn biên dịch trước text giáo trình cho phần dựng feedback)
+    if settings.model_worker_address:
+        _schedule_precompile()
+        logger.info(f"Using model worker at {settings.model_worker_address} (models are not loaded in this process)")
+        # Raise ModelWorkerError khi authkey/địa chỉ không an toàn → từ chối khởi động
+        client = get_model_worker_client()
+        # Ping đầu tiên ngoài event loop; sau đó thread nền giữ trạng thái cho is_model_loaded()
+        await asyncio.to_thread(client.status, True)
+        client.cached_status()
+        if is_model_loaded():
+            logger.info("✅ Model worker reachable, pronunciation model ready")
+        else:
+            logger.warning("⚠️ Model worker not reachable yet. Start it with: python -m services.model_worker")
+        return
+
+    # Phiên bản model được swap qua /api/admin/models ở worker khác (hoặc trước khi worker này fork lại)
+    start_version_watcher()
+
+    # Chế độ --preload: model đã load + warm ở master process, worker dùng chung weights (copy-on-write)
+    if is_warm():
+        memory = memory_report()
+        if memory:
+            logger.info(f"📊 Worker memory after preload: RSS {memory['rss_mb']} MB, PSS {memory['pss_mb']} MB, "
+                        f"shared {memory['shared_mb']} MB, private {memory['private_mb']} MB")
+        return
+    
+    # Số thread torch phải đặt trước khi load model
+    apply_thread_policy()
+    
+    # Load + chạy thử Wav2Vec2, Conformer, Whisper ở background; /ready trả 503 tới khi xong
+    if settings.model_warmup_enabled:
+        logger.info("Warming up models in background (GET /ready reports progress)...")
+        _run_in_background(_warm_up_and_precompile, "Model warm-up")
+        return
+    
     # Load pronunciation model
     logger.info("Loading pronunciation model...")
     try:
@@ -209,19 +306,73 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Failed to load pronunciation model: {e}")
         logger.warning("⚠️ Pronunciation checking will use word-level accuracy only.")
+    
+    # Sau khi load model để ID phoneme đã biên dịch khớp từ điển của model
+    _schedule_precompile()
+
+
+# Giữ reference tới task chạy nền để không bị garbage collect giữa chừng
+_background_tasks = set()
+
+
+def _run_in_background(func, description: str) -> None:
+    """Chạy hàm blocking trong thread riêng sau startup (không chặn server nhận request)"""
+    async def _run():
+        try:
+            await asyncio.to_thread(func)
+        except Exception as e:
+            logger.warning(f"⚠️ {description} failed: {e}")
+    
+    task = asyncio.get_running_loop().create_task(_run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _schedule_precompile() -> None:
+    """Biên dịch trước nội dung giáo trình ở background (đọc MySQL có thể chậm)"""
+    if settings.pronunciation_precompile_on_startup:
+        _run_in_background(precompile_curriculum_texts, "Expected text precompile")
+
+
+def _warm_up_and_precompile() -> None:
+    warm_up_models()
+    # Sau khi load model để ID phoneme đã biên dịch khớp từ điển của model
+    if settings.pronunciation_precompile_on_startup:
+        precompile_curriculum_texts()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("👋 Korean Studio API shutting down...")
+    shutdown_inference_executor()
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "main:app",
-        host=settings.backend_host,
-        port=settings.backend_port,
-        reload=(settings.env == "development"),
-        log_level="info"
-    )
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Korean Studio API server")
+    parser.add_argument("--preload", action="store_true",
+                        help="Load models once in a master process, then fork workers sharing them copy-on-write")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (with --preload)")
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="torch intra-op threads per worker (default: TORCH_NUM_THREADS or CPU count / workers)")
+    args = parser.parse_args()
+    
+    if args.preload:
+        from services.prefork_server import serve_preforked
+        serve_preforked(
+            app,
+            host=settings.backend_host,
+            port=settings.backend_port,
+            workers=args.workers,
+            threads_per_worker=args.threads_per_worker or None
+        )
+    else:
+        import uvicorn
+        uvicorn.run(
+            "main:app",
+            host=settings.backend_host,
+            port=settings.backend_port,
+            reload=(settings.env == "development"),
+            log_level="info"
+        )
@@ -166,6 +166,31 @@ class WordFeedback(BaseModel):
     is_correct: bool = Field(..., description="Từ có đúng không")
 
 
+class PhonemeSegment(BaseModel):
+    """Vị trí của một phoneme mong đợi trong audio (CTC forced alignment)"""
+    phoneme: str = Field(..., description="Phoneme mong đợi")
+    expected_index: int = Field(..., description="Vị trí trong expected_phonemes")
+    word_index: int = Field(..., description="Vị trí của từ chứa phoneme")
+    syllable_index: int = Field(..., description="Vị trí của âm tiết chứa phoneme")
+    syllable: str = Field(..., description="Âm tiết Hangul chứa phoneme")
+    start_s: float = Field(..., description="Thời điểm bắt đầu (giây, theo audio gốc)")
+    end_s: float = Field(..., description="Thời điểm kết thúc (giây, theo audio gốc)")
+    gop: float = Field(..., description="Goodness of pronunciation (≤ 0, 0 = tốt nhất)")
+    confidence: float = Field(..., description="Độ tin cậy phát âm đúng (0-1)")
+
+
+class SyllableFeedback(BaseModel):
+    """Phản hồi cho từng âm tiết (từ forced alignment)"""
+    syllable: str = Field(..., description="Âm tiết Hangul")
+    position: int = Field(..., description="Vị trí của âm tiết")
+    word_index: int = Field(..., description="Vị trí của từ chứa âm tiết")
+    start_s: float = Field(..., description="Thời điểm bắt đầu (giây)")
+    end_s: float = Field(..., description="Thời điểm kết thúc (giây)")
+    confidence: float = Field(..., description="Độ tin cậy thấp nhất trong các phoneme của âm tiết (0-1)")
+    weakest_phoneme: str = Field(..., description="Phoneme có độ tin cậy thấp nhất")
+    is_correct: bool = Field(..., description="Âm tiết có đúng không")
+
+
 class PronunciationFeedbackSummary(BaseModel):
     """Tóm tắt pronunciation feedback"""
     total_phonemes: int = Field(..., description="Tổng số phoneme")
@@ -193,6 +218,14 @@ class PronunciationFeedback(BaseModel):
     insertions: int = Field(..., description="Số phoneme thêm vào")
     deletions: int = Field(..., description="Số phoneme bị xóa")
     summary: PronunciationFeedbackSummary = Field(..., description="Tóm tắt lỗi")
+    phoneme_segments: List[PhonemeSegment] = Field(
+        default_factory=list,
+        description="Timestamp + GOP từng phoneme (rỗng nếu tắt forced alignment)"
+    )
+    syllable_feedback: List[SyllableFeedback] = Field(
+        default_factory=list,
+        description="Phản hồi từng âm tiết kèm đoạn audio tương ứng"
+    )
 
 
 class ReadAloudResponse(BaseModel):
@@ -235,6 +268,25 @@ class ReadAloudResponse(BaseModel):
         default=None,
         description="Chi tiết pronunciation feedback từ model (phoneme-level)"
     )
+    transcript_id: Optional[str] = Field(
+        default=None,
+        description="Set when defer_transcript=true: poll GET /api/speaking/read-aloud/transcript/{transcript_id}"
+    )
+    diagnostics: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Audio processing diagnostics (duration, per-stage timings in ms)"
+    )
+
+
+class ReadAloudTranscriptResponse(BaseModel):
+    """Response model for a deferred read-aloud transcript"""
+    transcript_id: str = Field(..., description="ID returned by /speaking/read-aloud")
+    status: Literal["pending", "done"] = Field(..., description="pending while Whisper is still running")
+    transcript: str = Field(default="", description="What the user said (transcribed)")
+    word_accuracy: Optional[float] = Field(
+        default=None,
+        description="Word-level accuracy (0-100), available when status is done"
+    )
 
 
 # ===== LIVE TALK MODELS =====
@@ -286,6 +338,10 @@ class FreeSpeakResponse(BaseModel):
         default=None,
         description="Overall pronunciation accuracy (0-100) from model"
     )
+    diagnostics: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Audio processing diagnostics (duration, per-stage timings in ms)"
+    )
 
 
 class LiveTalkResponse(BaseModel):
@@ -349,3 +405,36 @@ class UserProgress(BaseModel):
     weak_words: List[WeakWord] = Field(default_factory=list, description="Words to practice")
     saved_phrases: List[SavedPhrase] = Field(default_factory=list, description="User's phrase bank")
     session_count: int = Field(default=0, description="Total sessions completed")
+
+
+# ===== ADMIN: MODEL REGISTRY =====
+
+class ModelLoadRequest(BaseModel):
+    """Yêu cầu load một phiên bản model pronunciation mới (đường dẫn nằm trong thư mục models/)"""
+    version: str = Field(..., min_length=1, max_length=64, description="Tên phiên bản (duy nhất)")
+    model_path: Optional[str] = Field(default=None, description="File weights .pt (default: models/pronunciation_model.pt)")
+    p2id_path: Optional[str] = Field(default=None, description="Từ điển phoneme (default: models/p2id.json)")
+    mean_std_path: Optional[str] = Field(default=None, description="Stats chuẩn hoá (default: models/wav2vec2_stats.npy)")
+
+
+class ModelVersionInfo(BaseModel):
+    """Trạng thái một phiên bản model trong registry"""
+    version: str = Field(..., description="Tên phiên bản")
+    state: Literal["loading", "validating", "active", "retired", "rejected", "failed"] = Field(
+        ..., description="Trạng thái hiện tại"
+    )
+    sources: Dict[str, str] = Field(default_factory=dict, description="File model / p2id / stats")
+    requested_at: float = Field(..., description="Thời điểm yêu cầu load (epoch giây)")
+    loaded_at: Optional[float] = Field(default=None, description="Thời điểm load xong")
+    load_ms: Optional[float] = Field(default=None, description="Thời gian load (ms)")
+    validation: Optional[Dict[str, Any]] = Field(default=None, description="Kết quả chấm canary")
+    activated_at: Optional[float] = Field(default=None, description="Thời điểm bắt đầu phục vụ")
+    retired_at: Optional[float] = Field(default=None, description="Thời điểm bị thay thế")
+    error: Optional[str] = Field(default=None, description="Lỗi khi load / lý do bị từ chối")
+
+
+class ModelRegistryResponse(BaseModel):
+    """Danh sách phiên bản model pronunciation"""
+    active_version: Optional[str] = Field(default=None, description="Phiên bản đang phục vụ")
+    loading: bool = Field(..., description="Đang có phiên bản được load / chấm canary")
+    versions: List[ModelVersionInfo] = Field(..., description="Các phiên bản, cũ → mới")
@@ -0,0 +1,89 @@
+"""
+Admin Router - Quản lý phiên bản model pronunciation (hot-swap không cần restart)
+"""
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from config import settings
+from models.schemas import ModelLoadRequest, ModelRegistryResponse, ModelVersionInfo
+from services import model_registry
+from services.model_worker import get_model_worker_client
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """X-Admin-Token phải khớp settings.admin_token (mọi môi trường); chưa cấu hình token thì tắt"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if x_admin_token is None or not hmac.compare_digest(
+        x_admin_token.encode("utf-8"), settings.admin_token.encode("utf-8")
+    ):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)]
+)
+
+
+def _require_local_model() -> None:
+    # Model nằm ở process model worker - registry của API process không phục vụ inference
+    if get_model_worker_client() is not None:
+        raise HTTPException(
+            status_code=409,
+            detail="Pronunciation model runs in the model worker process; swap it there"
+        )
+
+
+@router.get("/models", response_model=ModelRegistryResponse)
+async def list_model_versions():
+    """
+    Danh sách phiên bản model pronunciation trong process này kèm thời gian load,
+    kết quả canary và thời điểm active / bị thay thế
+    """
+    _require_local_model()
+    return ModelRegistryResponse(
+        active_version=model_registry.active_version(),
+        loading=model_registry.is_loading(),
+        versions=model_registry.list_versions()
+    )
+
+
+@router.get("/models/{version}", response_model=ModelVersionInfo)
+async def get_model_version(version: str):
+    """Trạng thái một phiên bản (dùng để theo dõi sau khi POST /models)"""
+    _require_local_model()
+    record = model_registry.get_version(version)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    return record
+
+
+@router.post("/models", response_model=ModelVersionInfo, status_code=202)
+async def load_model_version(request: ModelLoadRequest):
+    """
+    Load phiên bản mới ở background: load → chấm canary → swap atomic → unload bản cũ
+
+    Trả về ngay (202); theo dõi tiến trình qua GET /api/admin/models/{version}.
+    Request đang chạy không bị ảnh hưởng. Các worker khác nhận yêu cầu qua file
+    model_registry_state_path và tự load + swap trong vòng model_registry_poll_seconds
+    (GET chỉ phản ánh worker xử lý request đó).
+    """
+    _require_local_model()
+    try:
+        record = model_registry.start_model_load(
+            request.version,
+            model_path=request.model_path,
+            p2id_path=request.p2id_path,
+            mean_std_path=request.mean_std_path
+        )
+    except model_registry.ModelRegistryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"🔄 Loading pronunciation model version {request.version}")
+    return record
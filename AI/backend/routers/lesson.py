@@ -8,9 +8,11 @@ from services import openai_service, accuracy_service
 from services.tts_service import generate_speech
 from services.error_handlers import handle_openai_error, is_quota_error
 from services.pronunciation_model_service import (
-    check_pronunciation_from_bytes,
+    check_pronunciation_from_buffer_async,
     is_model_loaded
 )
+from services.audio_service import AudioBuffer, AudioDecodeError
+from services.inference_executor import InferenceQueueFullError
 import logging
 from typing import Optional
 from pathlib import Path
@@ -196,10 +198,19 @@ async def check_pronunciation_exercise(
     try:
         logger.info(f"Pronunciation exercise - Lesson: {lesson_id}, Expected: '{expected_text[:50]}...'")
         
+        # Decode audio một lần (16kHz mono) cho pronunciation model
+        audio_buffer = None
+        try:
+            audio_buffer = await AudioBuffer.from_upload(audio)
+        except AudioDecodeError as e:
+            logger.warning(f"Could not decode audio: {e}")
+        
         # Step 1: Transcribe audio using Whisper
         transcript = await openai_service.transcribe_audio(
             file=audio,
-            language="ko"
+            language="ko",
+            audio=audio_buffer,
+            endpoint="check-exercise"
         )
         logger.info(f"Transcript: '{transcript}'")
         
@@ -208,18 +219,12 @@ async def check_pronunciation_exercise(
         phoneme_accuracy = None
         per = None
         
-        if get_model_status():
+        if get_model_status() and audio_buffer is not None:
             try:
-                # Đọc audio bytes
-                audio_bytes = await audio.read()
-                await audio.seek(0)  # Reset file pointer
-                
-                # Check pronunciation với model
-                pronunciation_result = check_pronunciation_from_bytes(
-                    audio_bytes=audio_bytes,
-                    expected_text=expected_text,
-                    sample_rate=16000,
-                    audio_format=Path(audio.filename).suffix[1:] if audio.filename else "wav"
+                # Check pronunciation với model (dùng lại audio đã decode)
+                pronunciation_result = await check_pronunciation_from_buffer_async(
+                    audio=audio_buffer,
+                    expected_text=expected_text
                 )
                 
                 if pronunciation_result:
@@ -236,6 +241,8 @@ async def check_pronunciation_exercise(
                     phoneme_accuracy = pronunciation_result.phoneme_accuracy
                     per = pronunciation_result.per
                     logger.info(f"✅ Model pronunciation check: {phoneme_accuracy:.1f}% accuracy, PER: {per:.4f}")
+            except InferenceQueueFullError:
+                raise
             except Exception as e:
                 logger.error(f"Error in model pronunciation check: {e}. Falling back to word accuracy.")
         
@@ -297,7 +304,8 @@ async def check_pronunciation_exercise(
                 "substitutions": model_result.get("substitutions", details.get("substitutions", 0)) if model_result else details.get("substitutions", 0),
                 "insertions": model_result.get("insertions", details.get("insertions", 0)) if model_result else details.get("insertions", 0),
                 "deletions": model_result.get("deletions", details.get("deletions", 0)) if model_result else details.get("deletions", 0),
-            } if model_result or details else None
+            } if model_result or details else None,
+            "diagnostics": audio_buffer.diagnostics() if audio_buffer else None
         }
         
         return ExerciseCheckResponse(
@@ -310,6 +318,8 @@ async def check_pronunciation_exercise(
             pronunciation_details=pronunciation_details
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in check_pronunciation_exercise: {e}")
         raise HTTPException(
@@ -2,7 +2,7 @@
 Live Talk Router - Free Korean conversation with AI Coach (Ivy/Leo)
 Real-time voice conversation with gentle corrections and natural flow
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect
 from models.schemas import (
     LiveTalkResponse,
     LiveTalkMessage,
@@ -12,7 +12,17 @@ from models.schemas import (
 )
 from services import openai_service
 from services.tts_service import generate_speech
+from services.inference_executor import run_remote_call
+from services.audio_service import AudioDecodeError
+from services.streaming_stt import (
+    StreamBusyError,
+    StreamConfig,
+    StreamConfigError,
+    StreamingTranscriber,
+    StreamLimitError
+)
 from pathlib import Path
+import asyncio
 import logging
 import json
 from typing import Optional, List
@@ -149,7 +159,8 @@ TOPIC_MISSIONS = {
 
 @router.post("/turn", response_model=LiveTalkResponse)
 async def live_talk_turn(
-    audio: UploadFile = File(..., description="User's voice audio"),
+    audio: Optional[UploadFile] = File(default=None, description="User's voice audio"),
+    user_text: Optional[str] = Form(default=None, description="Final transcript from /stream (skips STT)"),
     user_id: str = Form(..., description="User ID"),
     coach_id: str = Form(default="ivy", description="Coach ID (ivy or leo)"),
     topic: Optional[str] = Form(default=None, description="Conversation topic context"),
@@ -159,7 +170,7 @@ async def live_talk_turn(
     Handle one turn of live conversation
 
     Process flow:
-    1. Transcribe user's audio (STT)
+    1. Transcribe user's audio (STT) - bỏ qua nếu client đã có transcript từ WS /stream
     2. Build conversation context with coach persona
     3. Get AI response from ChatGPT
     4. Generate TTS audio for response
@@ -168,6 +179,7 @@ async def live_talk_turn(
 
     Args:
         audio: Audio file from user (webm, mp3, wav)
+        user_text: Transcript "final" của WS /stream cho lượt nói này (không cần gửi audio)
         user_id: User identifier
         coach_id: Coach to talk with (ivy or leo)
         topic: Optional topic context (daily_life, travel, work, hobbies)
@@ -179,11 +191,15 @@ async def live_talk_turn(
     try:
         logger.info(f"Live Talk turn - user: {user_id}, coach: {coach_id}, topic: {topic}")
 
-        # Step 1: Transcribe user audio using Whisper STT
-        user_text = await openai_service.transcribe_audio(
-            file=audio,
-            language="ko"
-        )
+        # Step 1: Transcribe user audio using Whisper STT (đã stream → dùng transcript có sẵn)
+        if user_text is None:
+            if audio is None:
+                raise HTTPException(status_code=400, detail="Either audio or user_text is required")
+            user_text = await openai_service.transcribe_audio(
+                file=audio,
+                language="ko",
+                endpoint="live-talk"
+            )
 
         if not user_text.strip():
             raise HTTPException(
@@ -215,7 +231,8 @@ async def live_talk_turn(
         chat_messages.append({"role": "user", "content": user_text})
 
         # Step 4: Call ChatGPT for coach response
-        response = client.chat.completions.create(
+        response = await run_remote_call(
+            client.chat.completions.create,
             model="gpt-4",
             messages=chat_messages,
             max_tokens=150,  # Keep responses short
@@ -275,6 +292,126 @@ async def live_talk_turn(
         raise handle_openai_error(e, service_name="Live Talk")
 
 
+@router.websocket("/stream")
+async def live_talk_stream(websocket: WebSocket):
+    """
+    Stream audio của một lượt nói, nhận transcript tạm thời trong lúc người dùng đang nói
+
+    Protocol:
+    1. Client → JSON {"format": "webm" | "ogg" | "pcm_s16le" | "pcm_f32le", "sample_rate": 16000,
+       "language": "ko"} (sample_rate chỉ dùng cho PCM thô); server → {"type": "ready", "partials": bool}
+    2. Client → binary chunk audio liên tục (vd MediaRecorder timeslice 250 ms)
+       Server → {"type": "partial", "text", "committed_text", "audio_seconds"} định kỳ
+    3. Client thả mic → JSON {"type": "stop"}; server → {"type": "final", "text", ...} rồi đóng
+       Gửi "text" của final làm user_text cho POST /turn (không cần upload lại audio)
+
+    Lỗi → {"type": "error", "detail": ...} rồi đóng kết nối. Hết slot stream
+    (live_talk_max_streams) → đóng 1013; không nhận message nào trong
+    live_talk_idle_timeout_seconds → đóng 1008.
+    """
+    await websocket.accept()
+    partial_task: Optional[asyncio.Task] = None
+    transcriber: Optional[StreamingTranscriber] = None
+
+    async def send_error(detail: str, code: int = 1003) -> None:
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=code)
+
+    async def receive() -> dict:
+        # Client im lặng quá lâu không được giữ decoder / slot stream (asyncio.TimeoutError)
+        message = await asyncio.wait_for(websocket.receive(), timeout=settings.live_talk_idle_timeout_seconds)
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        return message
+
+    try:
+        try:
+            first = await receive()
+        except asyncio.TimeoutError:
+            await send_error(f"No stream config for {settings.live_talk_idle_timeout_seconds:.0f}s, closing stream", code=1008)
+            return
+        try:
+            # Frame đầu phải là text JSON (receive_json() raise KeyError với frame binary)
+            if first.get("text") is None:
+                raise StreamConfigError("First message must be a JSON text frame")
+            config = StreamConfig.from_message(json.loads(first["text"]))
+        except (StreamConfigError, ValueError) as e:
+            await send_error(f"Invalid stream config: {e}")
+            return
+        try:
+            transcriber = StreamingTranscriber(config)
+        except StreamBusyError as e:
+            await send_error(str(e), code=1013)
+            return
+        await websocket.send_json({"type": "ready", "partials": transcriber.partials_enabled})
+        logger.info(f"Live Talk stream started - format: {config.audio_format}, language: {config.language}")
+
+        async def send_partial() -> None:
+            try:
+                result = await transcriber.partial()
+            except Exception as e:
+                logger.warning(f"⚠️ Live Talk stream partial failed: {e}")
+                return
+            if result is not None:
+                await websocket.send_json({"type": "partial", **result})
+
+        while True:
+            try:
+                message = await receive()
+            except asyncio.TimeoutError:
+                await send_error(f"No audio for {settings.live_talk_idle_timeout_seconds:.0f}s, closing stream", code=1008)
+                return
+            if message.get("bytes") is not None:
+                try:
+                    transcriber.add_chunk(message["bytes"])
+                except StreamLimitError as e:
+                    await send_error(str(e), code=1009)
+                    return
+                # Tối đa một partial chạy cùng lúc; chunk đến trong lúc đó gộp vào lần sau
+                if (partial_task is None or partial_task.done()) and transcriber.partial_due():
+                    partial_task = asyncio.create_task(send_partial())
+                continue
+            try:
+                control = json.loads(message.get("text") or "")
+            except json.JSONDecodeError:
+                control = None
+            if isinstance(control, dict) and control.get("type") == "stop":
+                break
+            await websocket.send_json({"type": "error", "detail": "Expected binary audio or {\"type\": \"stop\"}"})
+
+        # Partial đang chạy là phần việc finalize dùng lại được - chờ xong thay vì huỷ
+        if partial_task is not None:
+            await partial_task
+        try:
+            result = await transcriber.finalize()
+        except AudioDecodeError as e:
+            await send_error(f"Could not decode streamed audio: {e}")
+            return
+        except HTTPException as e:
+            await send_error(str(e.detail), code=1011)
+            return
+        await websocket.send_json({"type": "final", **result})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info("Live Talk stream: client disconnected")
+        if partial_task is not None:
+            partial_task.cancel()
+    except Exception as e:
+        logger.error(f"Error in live_talk_stream: {e}", exc_info=True)
+        if partial_task is not None:
+            partial_task.cancel()
+        try:
+            await send_error("Internal error", code=1011)
+        except Exception:
+            pass
+    finally:
+        if partial_task is not None and not partial_task.done():
+            partial_task.cancel()
+        if transcriber is not None:
+            transcriber.close()
+
+
 @router.get("/mission", response_model=LiveTalkMission)
 async def get_mission(topic: str = "daily_life"):
     """
@@ -375,7 +512,8 @@ Vui lòng cung cấp phân tích hỗ trợ và khuyến khích bằng tiếng V
 Hãy rất khuyến khích và hỗ trợ. Tập trung vào tiến bộ, không phải sự hoàn hảo. Bao gồm Hangul (한글) khi đề cập đến ví dụ tiếng Hàn. Tất cả phản hồi bằng tiếng Việt."""
 
         # Call GPT for analysis
-        response = client.chat.completions.create(
+        response = await run_remote_call(
+            client.chat.completions.create,
             model="gpt-4o-mini",
             messages=[
                 {
@@ -5,23 +5,32 @@ Tích hợp model pronunciation check với GPT để đạt độ chính xác c
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from models.schemas import (
     ReadAloudResponse, 
+    ReadAloudTranscriptResponse,
     AccuracyDetails, 
     FreeSpeakResponse,
     PronunciationFeedback,
     PhonemeDetail,
     WordFeedback,
-    PronunciationFeedbackSummary
+    PronunciationFeedbackSummary,
+    PhonemeSegment,
+    SyllableFeedback
 )
 from services import openai_service, accuracy_service
 from services.tts_service import generate_speech
 from services.stt_service import transcribe_audio_cheap  # Use local Whisper (FREE)
 from services.pronunciation_model_service import (
-    check_pronunciation_from_bytes,
+    check_pronunciation_from_buffer_async,
     is_model_loaded
 )
+from services.audio_service import AudioBuffer, AudioDecodeError
+from services.deferred_transcripts import PENDING, get_deferred_transcript_store
+from services.inference_executor import InferenceQueueFullError
+from services.model_worker import get_model_worker_client
 from services.error_handlers import handle_openai_error
+import asyncio
+import io
 import logging
-from typing import Optional, Dict, Any, Tuple, List
+from typing import Optional, Dict, Any, Set, Tuple, List
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -38,6 +47,63 @@ def get_model_status() -> bool:
     return is_model_loaded()
 
 
+# Task ghi transcript trả sau (defer_transcript=true) đang chạy - giữ tham chiếu để không bị GC
+_deferred_tasks: Set["asyncio.Task[None]"] = set()
+
+
+async def _finish_deferred_transcript(transcript_id: str, transcript_task: "asyncio.Task[str]") -> None:
+    """Chờ Whisper xong rồi ghi transcript vào store dùng chung (worker nào cũng trả được)"""
+    store = get_deferred_transcript_store()
+    try:
+        transcript = await transcript_task
+    except asyncio.CancelledError:
+        await asyncio.to_thread(store.discard, transcript_id)
+        raise
+    await asyncio.to_thread(store.complete, transcript_id, transcript)
+
+
+async def _store_deferred_transcript(task: "asyncio.Task[str]", expected_text: str) -> str:
+    """Tạo entry pending cho task transcript đang chạy, trả về transcript_id để client lấy sau"""
+    transcript_id = await asyncio.to_thread(get_deferred_transcript_store().create, expected_text)
+    writer = asyncio.create_task(_finish_deferred_transcript(transcript_id, task))
+    _deferred_tasks.add(writer)
+    writer.add_done_callback(_deferred_tasks.discard)
+    return transcript_id
+
+
+async def _transcribe_for_display(
+    audio: UploadFile,
+    language: str,
+    audio_buffer: Optional[AudioBuffer]
+) -> str:
+    """Transcribe để hiển thị - lỗi chỉ log lại, trả về chuỗi rỗng"""
+    try:
+        transcript = await transcribe_audio_cheap(
+            file=audio,
+            language=language,
+            audio=audio_buffer,
+            endpoint="read-aloud"
+        )
+        logger.info(f"✅ Transcript (người dùng nói): '{transcript}'")
+        return transcript or ""
+    except Exception as e:
+        logger.warning(f"⚠️ Transcript failed (KHÔNG ảnh hưởng điểm phát âm): {e}")
+        return ""
+
+
+async def _score_pronunciation(audio_buffer: Optional[AudioBuffer], expected_text: str):
+    """Chạy pronunciation model trên inference pool - trả về None nếu model không dùng được"""
+    if not get_model_status() or audio_buffer is None:
+        return None
+    try:
+        return await check_pronunciation_from_buffer_async(audio_buffer, expected_text)
+    except InferenceQueueFullError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in pronunciation model check: {e}. Falling back to word accuracy.", exc_info=True)
+        return None
+
+
 def _classify_phoneme(phoneme: str) -> str:
     """Phân loại phoneme: initial (phụ âm đầu), vowel (nguyên âm), final (phụ âm cuối)"""
     from services.pronunciation_model_service import LEADS, VOWELS, TAILS
@@ -146,85 +212,95 @@ def _generate_local_feedback_vi(
     return feedback_text, tricky_words
 
 
+# Âm tiết có phoneme với confidence (GOP) thấp hơn ngưỡng bị coi là sai
+SYLLABLE_CONFIDENCE_THRESHOLD = 0.5
+
+
+def _build_syllable_feedback(phoneme_segments) -> List[SyllableFeedback]:
+    """Gom phoneme_segments (forced alignment) theo âm tiết"""
+    syllables: Dict[int, list] = {}
+    for segment in phoneme_segments:
+        syllables.setdefault(segment.syllable_index, []).append(segment)
+    
+    feedback = []
+    for position, segments in sorted(syllables.items()):
+        weakest = min(segments, key=lambda seg: seg.confidence)
+        feedback.append(SyllableFeedback(
+            syllable=segments[0].syllable,
+            position=position,
+            word_index=segments[0].word_index,
+            start_s=segments[0].start_s,
+            end_s=segments[-1].end_s,
+            confidence=weakest.confidence,
+            weakest_phoneme=weakest.phoneme,
+            is_correct=weakest.confidence >= SYLLABLE_CONFIDENCE_THRESHOLD
+        ))
+    return feedback
+
+
 def _build_pronunciation_feedback(
     pronunciation_result,
     expected_text: str
 ) -> Optional[PronunciationFeedback]:
     """Tạo pronunciation_feedback chi tiết từ pronunciation_result"""
     try:
-        from services.pronunciation_model_service import LEADS, VOWELS, TAILS
+        from services.pronunciation_model_service import compile_expected_text
         
-        # Tạo phoneme_details
-        phoneme_details = []
         expected_phonemes = pronunciation_result.expected_phonemes
         predicted_phonemes = pronunciation_result.predicted_phonemes
+        # G2P, từ chứa từng phoneme và loại jamo đã biên dịch sẵn (cache theo text)
+        compiled = compile_expected_text(expected_text)
+        word_ids = compiled.word_ids
         
-        # Tạo map của wrong phonemes để dễ tra cứu
-        wrong_phoneme_map = {}
-        for exp, pred in pronunciation_result.wrong_phonemes:
-            # Tìm vị trí của wrong phoneme trong expected_phonemes
-            for idx, exp_phn in enumerate(expected_phonemes):
-                if exp_phn == exp and idx not in wrong_phoneme_map:
-                    wrong_phoneme_map[idx] = pred
-                    break
-        
-        # Xử lý từng phoneme expected
-        max_len = max(len(expected_phonemes), len(predicted_phonemes))
-        for i in range(max_len):
-            exp_phn = expected_phonemes[i] if i < len(expected_phonemes) else None
-            pred_phn = predicted_phonemes[i] if i < len(predicted_phonemes) else None
-            
-            if exp_phn is None:
+        # Tạo phoneme_details theo alignment thật (expected ↔ predicted), gom luôn theo từ
+        # Phoneme thừa được gán cho từ đứng trước nó (giống find_wrong_words)
+        phoneme_details = []
+        phonemes_by_word: List[List[PhonemeDetail]] = [[] for _ in compiled.words]
+        ref_idx = 0
+        current_word = word_ids[0] if word_ids else 0
+        for position, (exp_phn, pred_phn) in enumerate(pronunciation_result.aligned_pairs):
+            if not exp_phn:
                 # Insertion - phoneme thừa
-                phoneme_details.append(PhonemeDetail(
-                    position=i,
+                detail = PhonemeDetail(
+                    position=position,
                     expected="",
                     predicted=pred_phn,
-                    type=_classify_phoneme(pred_phn) if pred_phn else "other",
+                    type=_classify_phoneme(pred_phn),
                     is_correct=False,
                     is_extra=True
-                ))
-            elif pred_phn is None:
-                # Deletion - phoneme thiếu
-                phoneme_details.append(PhonemeDetail(
-                    position=i,
-                    expected=exp_phn,
-                    predicted="",
-                    type=_classify_phoneme(exp_phn),
-                    is_correct=False,
-                    is_missing=True
-                ))
+                )
             else:
-                # So sánh expected vs predicted
-                is_correct = exp_phn == pred_phn
-                # Nếu không đúng, có thể là substitution
-                if not is_correct and i in wrong_phoneme_map:
-                    pred_phn = wrong_phoneme_map[i]
-                
-                phoneme_details.append(PhonemeDetail(
-                    position=i,
-                    expected=exp_phn,
-                    predicted=pred_phn,
-                    type=_classify_phoneme(exp_phn),
-                    is_correct=is_correct
-                ))
+                exp_type = "other"
+                if ref_idx < len(word_ids):
+                    current_word = word_ids[ref_idx]
+                    exp_type = compiled.phoneme_classes[ref_idx]
+                ref_idx += 1
+                if not pred_phn:
+                    # Deletion - phoneme thiếu
+                    detail = PhonemeDetail(
+                        position=position,
+                        expected=exp_phn,
+                        predicted="",
+                        type=exp_type,
+                        is_correct=False,
+                        is_missing=True
+                    )
+                else:
+                    # Match hoặc substitution
+                    detail = PhonemeDetail(
+                        position=position,
+                        expected=exp_phn,
+                        predicted=pred_phn,
+                        type=exp_type,
+                        is_correct=exp_phn == pred_phn
+                    )
+            phoneme_details.append(detail)
+            if phonemes_by_word:
+                phonemes_by_word[current_word].append(detail)
         
-        # Phân tích từng từ với phoneme details
+        # Phân tích từng từ với phoneme details đã căn chỉnh
         word_feedback_list = []
-        words = expected_text.split()
-        
-        # Map phonemes to words (simplified - mỗi từ có ~3 phonemes: initial, vowel, final)
-        phoneme_idx = 0
-        for word_idx, word in enumerate(words):
-            # Ước tính số phoneme trong từ này (mỗi ký tự Hangul = 2-3 phonemes)
-            word_phoneme_count = len(word) * 2  # Ước tính
-            word_phonemes = []
-            
-            for i in range(min(word_phoneme_count, len(phoneme_details) - phoneme_idx)):
-                if phoneme_idx + i < len(phoneme_details):
-                    phn_detail = phoneme_details[phoneme_idx + i]
-                    word_phonemes.append(phn_detail)
-            
+        for word_idx, (word, word_phonemes) in enumerate(zip(compiled.words, phonemes_by_word)):
             # Tính accuracy cho từ này
             if word_phonemes:
                 correct_count = sum(1 for p in word_phonemes if p.is_correct)
@@ -239,8 +315,6 @@ def _build_pronunciation_feedback(
                 accuracy=round(word_accuracy, 1),
                 is_correct=word_accuracy >= 80  # Threshold 80%
             ))
-            
-            phoneme_idx += len(word_phonemes)
         
         # Tạo wrong_phonemes với feedback
         wrong_phonemes_list = []
@@ -279,7 +353,22 @@ def _build_pronunciation_feedback(
             substitutions=pronunciation_result.substitutions,
             insertions=pronunciation_result.insertions,
             deletions=pronunciation_result.deletions,
-            summary=summary
+            summary=summary,
+            phoneme_segments=[
+                PhonemeSegment(
+                    phoneme=seg.phoneme,
+                    expected_index=seg.expected_index,
+                    word_index=seg.word_index,
+                    syllable_index=seg.syllable_index,
+                    syllable=seg.syllable,
+                    start_s=seg.start_s,
+                    end_s=seg.end_s,
+                    gop=seg.gop,
+                    confidence=seg.confidence
+                )
+                for seg in pronunciation_result.phoneme_segments
+            ],
+            syllable_feedback=_build_syllable_feedback(pronunciation_result.phoneme_segments)
         )
     except Exception as e:
         logger.error(f"Error building pronunciation feedback: {e}")
@@ -290,7 +379,11 @@ def _build_pronunciation_feedback(
 async def check_read_aloud(
     audio: UploadFile = File(..., description="Audio file (webm, mp3, wav)"),
     expected_text: str = Form(..., description="The Korean text the user should read"),
-    language: str = Form(default="ko", description="Language code (ko for Korean)")
+    language: str = Form(default="ko", description="Language code (ko for Korean)"),
+    defer_transcript: bool = Form(
+        default=False,
+        description="Return the score without waiting for Whisper; fetch the transcript via transcript_id"
+    )
 ):
     """
     Đánh giá phát âm tiếng Hàn khi đọc to
@@ -319,13 +412,26 @@ async def check_read_aloud(
        - transcript: text người dùng đã nói (optional, chỉ để hiển thị)
     5. Flutter nhận JSON → vẽ giao diện đẹp (highlight lỗi, vòng tròn điểm, animation)
 
+    Whisper (3b) và pronunciation model (3a) chạy song song trên inference pool.
+    Với defer_transcript=true, response trả về ngay khi có điểm (transcript rỗng,
+    kèm transcript_id); client lấy transcript qua GET /speaking/read-aloud/transcript/{id}.
+
     Supported audio formats: webm, mp3, wav, m4a
     """
     try:
         logger.info(f"Read-aloud check - Expected: '{expected_text[:50]}...', Audio: {audio.filename}")
 
         # ============================================
-        # STEP 1: Transcribe audio → Text (OPTIONAL - chỉ để hiển thị)
+        # STEP 0: Decode audio MỘT LẦN → 16kHz mono, dùng chung cho Whisper và pronunciation model
+        # ============================================
+        audio_buffer = None
+        try:
+            audio_buffer = await AudioBuffer.from_upload(audio)
+        except AudioDecodeError as e:
+            logger.warning(f"⚠️ Could not decode audio: {e}")
+
+        # ============================================
+        # STEP 1 + 2: Whisper (transcript) và pronunciation model chạy SONG SONG
         # ============================================
         # ⚠️ QUAN TRỌNG: Transcript KHÔNG được dùng để tính điểm phát âm!
         # 
@@ -337,20 +443,20 @@ async def check_read_aloud(
         # Transcript chỉ để:
         # - Hiển thị cho user biết họ nói gì (UI feedback)
         # - Tính word accuracy (bổ sung, KHÔNG phải điểm chính)
-        transcript = ""
-        try:
-            transcript = await transcribe_audio_cheap(
-                file=audio,
-                language=language
+        #
+        # Hai model độc lập nhau nên chạy đồng thời trên inference pool,
+        # latency ≈ max(whisper, pronunciation) thay vì tổng hai stage.
+        transcript_source = audio
+        if defer_transcript and audio_buffer is not None:
+            # UploadFile bị đóng sau khi response trả về - task chạy nền dùng bản copy trong bộ nhớ
+            transcript_source = UploadFile(
+                file=io.BytesIO(audio_buffer.source_bytes),
+                filename=audio.filename
             )
-            logger.info(f"✅ Transcript (người dùng nói): '{transcript}'")
-        except Exception as e:
-            logger.warning(f"⚠️ Transcript failed (KHÔNG ảnh hưởng điểm phát âm): {e}")
-            # Transcript không bắt buộc, tiếp tục với pronunciation model
+        transcript_task = asyncio.create_task(
+            _transcribe_for_display(transcript_source, language, audio_buffer)
+        )
 
-        # ============================================
-        # STEP 2: Dùng pronunciation_model.pt → Dự đoán phoneme (PHẦN CHÍNH - TÍNH ĐIỂM)
-        # ============================================
         # ⭐ ĐÂY LÀ PHẦN QUAN TRỌNG NHẤT - Tính điểm phát âm:
         # 
         # Flow tính điểm:
@@ -366,48 +472,49 @@ async def check_read_aloud(
         model_result = None
         phoneme_accuracy = None
         per = None
-        pronunciation_result = None
         pronunciation_feedback_obj = None
-        
-        if get_model_status():
-            try:
-                # Đọc audio bytes từ file đã upload
-                audio_bytes = await audio.read()
-                await audio.seek(0)  # Reset file pointer để có thể dùng lại
-                
-                # Gọi pronunciation model để dự đoán phoneme và so sánh
-                pronunciation_result = check_pronunciation_from_bytes(
-                    audio_bytes=audio_bytes,
-                    expected_text=expected_text,  # Text chuẩn để tạo phoneme chuẩn
-                    sample_rate=16000,
-                    audio_format=Path(audio.filename).suffix[1:] if audio.filename else "wav"
-                )
-                
-                if pronunciation_result:
-                    # Lưu kết quả từ model
-                    model_result = {
-                        "phoneme_accuracy": pronunciation_result.phoneme_accuracy,
-                        "per": pronunciation_result.per,
-                        "wrong_phonemes": pronunciation_result.wrong_phonemes,
-                        "wrong_words": pronunciation_result.wrong_words,
-                        "matches": pronunciation_result.matches,
-                        "substitutions": pronunciation_result.substitutions,
-                        "insertions": pronunciation_result.insertions,
-                        "deletions": pronunciation_result.deletions
-                    }
-                    phoneme_accuracy = pronunciation_result.phoneme_accuracy
-                    per = pronunciation_result.per
-                    logger.info(f"✅ Pronunciation model check: {phoneme_accuracy:.1f}% accuracy, PER: {per:.4f}")
-                    
-                    # Tạo pronunciation_feedback chi tiết (từng phoneme, từng từ)
-                    pronunciation_feedback_obj = _build_pronunciation_feedback(
-                        pronunciation_result=pronunciation_result,
-                        expected_text=expected_text
-                    )
-                else:
-                    logger.warning("⚠️ Model check returned None, falling back to word accuracy")
-            except Exception as e:
-                logger.error(f"❌ Error in pronunciation model check: {e}. Falling back to word accuracy.", exc_info=True)
+
+        # (dùng lại audio đã decode ở STEP 0)
+        try:
+            pronunciation_result = await _score_pronunciation(audio_buffer, expected_text)
+        except BaseException:
+            # 503 (pool đầy) hoặc client ngắt kết nối - không để Whisper chạy tiếp vô ích
+            transcript_task.cancel()
+            raise
+
+        transcript = ""
+        transcript_id = None
+        if defer_transcript and pronunciation_result is not None:
+            # Đã có điểm → trả response ngay, transcript lấy sau
+            transcript_id = await _store_deferred_transcript(transcript_task, expected_text)
+            logger.info(f"Transcript deferred (id={transcript_id})")
+        else:
+            # Không có điểm từ model thì overall_score cần word accuracy → phải chờ transcript
+            transcript = await transcript_task
+
+        if pronunciation_result:
+            # Lưu kết quả từ model
+            model_result = {
+                "phoneme_accuracy": pronunciation_result.phoneme_accuracy,
+                "per": pronunciation_result.per,
+                "wrong_phonemes": pronunciation_result.wrong_phonemes,
+                "wrong_words": pronunciation_result.wrong_words,
+                "matches": pronunciation_result.matches,
+                "substitutions": pronunciation_result.substitutions,
+                "insertions": pronunciation_result.insertions,
+                "deletions": pronunciation_result.deletions
+            }
+            phoneme_accuracy = pronunciation_result.phoneme_accuracy
+            per = pronunciation_result.per
+            logger.info(f"✅ Pronunciation model check: {phoneme_accuracy:.1f}% accuracy, PER: {per:.4f}")
+            
+            # Tạo pronunciation_feedback chi tiết (từng phoneme, từng từ)
+            pronunciation_feedback_obj = _build_pronunciation_feedback(
+                pronunciation_result=pronunciation_result,
+                expected_text=expected_text
+            )
+        elif get_model_status():
+            logger.warning("⚠️ Model check returned None, falling back to word accuracy")
         
         # ============================================
         # STEP 3: Tính word-level accuracy (BỔ SUNG - không phải điểm chính)
@@ -506,6 +613,10 @@ async def check_read_aloud(
         # - feedback_vi: feedback bằng tiếng Việt
         ai_feedback_combined = feedback_vi
 
+        diagnostics = audio_buffer.diagnostics() if audio_buffer else None
+        if diagnostics:
+            logger.info(f"Read-aloud stage timings (ms): {diagnostics['timings_ms']}")
+
         logger.info(f"✅ Returning response - Overall score: {overall_score:.1f}%, Phoneme accuracy: {phoneme_accuracy}%")
         return ReadAloudResponse(
             transcript=transcript,
@@ -521,7 +632,9 @@ async def check_read_aloud(
             tts_vi_url=tts_vi_url,
             tricky_words=tricky_words,
             tts_url=None,
-            pronunciation_feedback=pronunciation_feedback_obj  # Chi tiết từng phoneme, từng từ
+            pronunciation_feedback=pronunciation_feedback_obj,  # Chi tiết từng phoneme, từng từ
+            transcript_id=transcript_id,
+            diagnostics=diagnostics
         )
 
     except HTTPException:
@@ -534,6 +647,42 @@ async def check_read_aloud(
         )
 
 
+@router.get("/speaking/read-aloud/transcript/{transcript_id}", response_model=ReadAloudTranscriptResponse)
+async def get_read_aloud_transcript(transcript_id: str):
+    """
+    Lấy transcript của request read-aloud gửi với defer_transcript=true
+    
+    Trả về status="pending" khi Whisper chưa xong. Transcript được giữ
+    deferred_transcript_ttl_seconds giây trong store dùng chung giữa các worker
+    (services/deferred_transcripts.py), nên request poll tới worker nào cũng được.
+    """
+    entry = await asyncio.to_thread(get_deferred_transcript_store().get, transcript_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Transcript not found or expired")
+
+    status, expected_text, transcript = entry
+    if status == PENDING:
+        return ReadAloudTranscriptResponse(transcript_id=transcript_id, status="pending")
+
+    word_accuracy = 0.0
+    if transcript:
+        try:
+            word_accuracy, _ = accuracy_service.calculate_word_accuracy(
+                expected_text=expected_text,
+                spoken_text=transcript,
+                ignore_fillers=True
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Word accuracy calculation failed: {e}")
+
+    return ReadAloudTranscriptResponse(
+        transcript_id=transcript_id,
+        status="done",
+        transcript=transcript,
+        word_accuracy=word_accuracy
+    )
+
+
 @router.get("/speaking/phrases")
 async def get_korean_phrases(
     category: Optional[str] = None,
@@ -630,8 +779,8 @@ async def get_model_status_endpoint():
         model_loaded = get_model_status()
         logger.info(f"Model status check - loaded: {model_loaded}")
         
-        # If not loaded, try to load it
-        if not model_loaded:
+        # If not loaded, try to load it (trừ khi model nằm ở model worker process)
+        if not model_loaded and get_model_worker_client() is None:
             logger.info("Model not loaded, attempting to load...")
             from services.pronunciation_model_service import load_pronunciation_model
             try:
@@ -696,11 +845,20 @@ async def check_free_speaking(
     try:
         logger.info(f"Free-speak request - Audio: {audio.filename}, Language: {language}")
         
+        # Decode audio một lần, dùng chung cho Whisper và pronunciation model
+        audio_buffer = None
+        try:
+            audio_buffer = await AudioBuffer.from_upload(audio)
+        except AudioDecodeError as e:
+            logger.warning(f"Could not decode audio: {e}")
+        
         # Step 1: Transcribe user's speech using LOCAL Whisper (FREE, không tốn quota)
         # Fallback to OpenAI Whisper only if local fails
         transcript = await transcribe_audio_cheap(
             file=audio,
-            language=language
+            language=language,
+            audio=audio_buffer,
+            endpoint="free-speak"
         )
         logger.info(f"User said: '{transcript}'")
 
@@ -731,164 +889,28 @@ async def check_free_speaking(
         pronunciation_feedback = None
         pronunciation_accuracy = None
         
-        if get_model_status():
+        if get_model_status() and audio_buffer is not None:
             try:
-                # Đọc audio bytes
-                audio_bytes = await audio.read()
-                await audio.seek(0)  # Reset file pointer
-                
-                # Check pronunciation với model
-                pronunciation_result = check_pronunciation_from_bytes(
-                    audio_bytes=audio_bytes,
-                    expected_text=transcript,  # So sánh với transcript từ STT
-                    sample_rate=16000,
-                    audio_format=Path(audio.filename).suffix[1:] if audio.filename else "wav"
+                # Check pronunciation với model (dùng lại audio đã decode)
+                pronunciation_result = await check_pronunciation_from_buffer_async(
+                    audio=audio_buffer,
+                    expected_text=transcript  # So sánh với transcript từ STT
                 )
                 
                 if pronunciation_result:
                     pronunciation_accuracy = pronunciation_result.phoneme_accuracy
                     
-                    # Tạo phản hồi chi tiết về từng phoneme (phụ âm, nguyên âm, nguyên âm cuối)
-                    from services.pronunciation_model_service import LEADS, VOWELS, TAILS
-                    
-                    # Phân loại phoneme thành phụ âm, nguyên âm, nguyên âm cuối
-                    def classify_phoneme(phoneme: str) -> str:
-                        """Phân loại phoneme: initial (phụ âm đầu), vowel (nguyên âm), final (phụ âm cuối)"""
-                        if phoneme in LEADS:
-                            return "initial"  # Phụ âm đầu
-                        elif phoneme in VOWELS:
-                            return "vowel"  # Nguyên âm
-                        elif phoneme in TAILS:
-                            return "final"  # Phụ âm cuối
-                        else:
-                            return "other"
-                    
-                    # Tạo danh sách phoneme với thông tin chi tiết
-                    phoneme_details = []
-                    
-                    # Tạo map của wrong phonemes để dễ tra cứu
-                    wrong_phoneme_map = {}
-                    for exp, pred in pronunciation_result.wrong_phonemes:
-                        # Tìm vị trí của wrong phoneme trong expected_phonemes
-                        for idx, exp_phn in enumerate(pronunciation_result.expected_phonemes):
-                            if exp_phn == exp and idx not in wrong_phoneme_map:
-                                wrong_phoneme_map[idx] = pred
-                                break
-                    
-                    # Xử lý từng phoneme expected
-                    max_len = max(len(pronunciation_result.expected_phonemes), len(pronunciation_result.predicted_phonemes))
-                    for i in range(max_len):
-                        exp_phn = pronunciation_result.expected_phonemes[i] if i < len(pronunciation_result.expected_phonemes) else None
-                        pred_phn = pronunciation_result.predicted_phonemes[i] if i < len(pronunciation_result.predicted_phonemes) else None
-                        
-                        if exp_phn is None:
-                            # Insertion - phoneme thừa
-                            phoneme_details.append({
-                                "position": i,
-                                "expected": "",
-                                "predicted": pred_phn,
-                                "type": classify_phoneme(pred_phn) if pred_phn else "other",
-                                "is_correct": False,
-                                "is_extra": True
-                            })
-                        elif pred_phn is None:
-                            # Deletion - phoneme thiếu
-                            phoneme_details.append({
-                                "position": i,
-                                "expected": exp_phn,
-                                "predicted": "",
-                                "type": classify_phoneme(exp_phn),
-                                "is_correct": False,
-                                "is_missing": True
-                            })
-                        else:
-                            # So sánh expected vs predicted
-                            is_correct = exp_phn == pred_phn
-                            # Nếu không đúng, có thể là substitution
-                            if not is_correct and i in wrong_phoneme_map:
-                                pred_phn = wrong_phoneme_map[i]
-                            
-                            phoneme_details.append({
-                                "position": i,
-                                "expected": exp_phn,
-                                "predicted": pred_phn,
-                                "type": classify_phoneme(exp_phn),  # initial, vowel, final
-                                "is_correct": is_correct
-                            })
-                    
-                    # Phân tích từng từ với phoneme details
-                    word_feedback_list = []
-                    words = transcript.split()
-                    
-                    # Map phonemes to words (simplified - mỗi từ có ~3 phonemes: initial, vowel, final)
-                    phoneme_idx = 0
-                    for word_idx, word in enumerate(words):
-                        # Ước tính số phoneme trong từ này (mỗi ký tự Hangul = 2-3 phonemes)
-                        word_phoneme_count = len(word) * 2  # Ước tính
-                        word_phonemes = []
-                        
-                        for i in range(min(word_phoneme_count, len(phoneme_details) - phoneme_idx)):
-                            if phoneme_idx + i < len(phoneme_details):
-                                phn_detail = phoneme_details[phoneme_idx + i]
-                                word_phonemes.append(phn_detail)
-                        
-                        # Tính accuracy cho từ này
-                        if word_phonemes:
-                            correct_count = sum(1 for p in word_phonemes if p.get("is_correct", False))
-                            word_accuracy = (correct_count / len(word_phonemes)) * 100
-                        else:
-                            word_accuracy = 0
-                        
-                        word_feedback_list.append({
-                            "word": word,
-                            "position": word_idx,
-                            "phonemes": word_phonemes,
-                            "accuracy": round(word_accuracy, 1),
-                            "is_correct": word_accuracy >= 80  # Threshold 80%
-                        })
-                        
-                        phoneme_idx += len(word_phonemes)
-                    
-                    # Tạo phản hồi chi tiết với phân tích từng phoneme
-                    pronunciation_feedback = {
-                        "phoneme_accuracy": pronunciation_result.phoneme_accuracy,
-                        "per": pronunciation_result.per,
-                        "phoneme_details": phoneme_details,  # Chi tiết từng phoneme với type (initial/vowel/final)
-                        "word_feedback": word_feedback_list,  # Phản hồi từng từ
-                        "wrong_phonemes": [
-                            {
-                                "expected": exp,
-                                "predicted": pred,
-                                "position": i,
-                                "type": classify_phoneme(exp),  # initial, vowel, final
-                                "is_correct": False,
-                                "feedback": f"Phát âm '{exp}' thành '{pred}'. Cần luyện tập {'phụ âm đầu' if classify_phoneme(exp) == 'initial' else 'nguyên âm' if classify_phoneme(exp) == 'vowel' else 'phụ âm cuối'}."
-                            }
-                            for i, (exp, pred) in enumerate(pronunciation_result.wrong_phonemes)
-                        ],
-                        "expected_phonemes": pronunciation_result.expected_phonemes,
-                        "predicted_phonemes": pronunciation_result.predicted_phonemes,
-                        "wrong_words": pronunciation_result.wrong_words,
-                        "matches": pronunciation_result.matches,
-                        "substitutions": pronunciation_result.substitutions,
-                        "insertions": pronunciation_result.insertions,
-                        "deletions": pronunciation_result.deletions,
-                        "summary": {
-                            "total_phonemes": len(pronunciation_result.expected_phonemes),
-                            "correct_phonemes": pronunciation_result.matches,
-                            "wrong_phonemes": pronunciation_result.substitutions,
-                            "missing_phonemes": pronunciation_result.deletions,
-                            "extra_phonemes": pronunciation_result.insertions,
-                            "initial_errors": sum(1 for p in phoneme_details if p.get("type") == "initial" and not p.get("is_correct", True)),
-                            "vowel_errors": sum(1 for p in phoneme_details if p.get("type") == "vowel" and not p.get("is_correct", True)),
-                            "final_errors": sum(1 for p in phoneme_details if p.get("type") == "final" and not p.get("is_correct", True))
-                        }
-                    }
+                    # Tạo phản hồi chi tiết về từng phoneme theo alignment (giống read-aloud)
+                    feedback_obj = _build_pronunciation_feedback(pronunciation_result, transcript)
+                    if feedback_obj is not None:
+                        pronunciation_feedback = feedback_obj.model_dump(exclude_none=True)
                     
                     logger.info(f"✅ Pronunciation check: {pronunciation_accuracy:.1f}% accuracy, PER: {pronunciation_result.per:.4f}")
                     logger.info(f"   Wrong phonemes: {len(pronunciation_result.wrong_phonemes)}")
                 else:
                     logger.warning("Pronunciation model check returned None")
+            except InferenceQueueFullError:
+                raise
             except Exception as e:
                 logger.error(f"Error in pronunciation check: {e}. Continuing without pronunciation feedback.")
 
@@ -939,7 +961,8 @@ async def check_free_speaking(
             emotion_tag=emotion_tag,
             tts_url=tts_url,
             pronunciation_feedback=pronunciation_feedback,
-            pronunciation_accuracy=pronunciation_accuracy
+            pronunciation_accuracy=pronunciation_accuracy,
+            diagnostics=audio_buffer.diagnostics() if audio_buffer else None
         )
         
         # Log response for debugging
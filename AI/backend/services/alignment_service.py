@@ -0,0 +1,214 @@
+"""
+Alignment Service - Căn chỉnh hai chuỗi phoneme (edit distance có backtrace)
+
+Bảng DP Levenshtein được tính theo từng hàng bằng NumPy: phần substitution/deletion
+vectorized trực tiếp, phần insertion (phụ thuộc trái → phải trong cùng hàng) dùng
+np.minimum.accumulate. Backtrace trả về từng cặp đã căn chỉnh và số S/D/I chính xác.
+
+Quy ước: reference = chuỗi chuẩn (expected), hypothesis = chuỗi dự đoán (predicted)
+- deletion: phoneme của reference không có trong hypothesis (phát âm thiếu)
+- insertion: phoneme thừa trong hypothesis
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Mã thao tác trong AlignmentResult.ops
+MATCH = "M"
+SUBSTITUTION = "S"
+DELETION = "D"
+INSERTION = "I"
+
+
+@dataclass
+class AlignmentResult:
+    """Kết quả căn chỉnh reference ↔ hypothesis"""
+    distance: int
+    # (ref_index, hyp_index) theo thứ tự; None ở phía không có phần tử (D: hyp None, I: ref None)
+    pairs: List[Tuple[Optional[int], Optional[int]]] = field(default_factory=list)
+    ops: List[str] = field(default_factory=list)
+    matches: int = 0
+    substitutions: int = 0
+    deletions: int = 0
+    insertions: int = 0
+
+    def details(self) -> Dict[str, int]:
+        return {
+            "matches": self.matches,
+            "substitutions": self.substitutions,
+            "insertions": self.insertions,
+            "deletions": self.deletions,
+        }
+
+
+def _encode(reference: Sequence[Hashable], hypothesis: Sequence[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+    # Map token → int để so sánh bằng NumPy
+    vocab: Dict[Hashable, int] = {}
+    ref = np.fromiter((vocab.setdefault(t, len(vocab)) for t in reference), dtype=np.int32, count=len(reference))
+    hyp = np.fromiter((vocab.setdefault(t, len(vocab)) for t in hypothesis), dtype=np.int32, count=len(hypothesis))
+    return ref, hyp
+
+
+def edit_distance_table(reference: Sequence[Hashable], hypothesis: Sequence[Hashable]) -> np.ndarray:
+    """
+    Bảng DP (len(reference)+1, len(hypothesis)+1) của Levenshtein distance
+
+    Mỗi hàng i tính từ hàng i-1:
+        tmp[j]  = min(D[i-1, j-1] + (ref[i-1] != hyp[j-1]), D[i-1, j] + 1)
+        D[i, j] = min_k≤j (tmp[k] + j - k)  = minimum.accumulate(tmp - j) + j
+    """
+    ref, hyp = _encode(reference, hypothesis)
+    n, m = len(ref), len(hyp)
+    table = np.empty((n + 1, m + 1), dtype=np.int32)
+    offsets = np.arange(m + 1, dtype=np.int32)
+    table[0] = offsets
+
+    for i in range(1, n + 1):
+        prev = table[i - 1]
+        tmp = np.empty(m + 1, dtype=np.int32)
+        tmp[0] = i
+        np.minimum(prev[:-1] + (hyp != ref[i - 1]), prev[1:] + 1, out=tmp[1:])
+        table[i] = np.minimum.accumulate(tmp - offsets) + offsets
+    return table
+
+
+def align_sequences(reference: Sequence[Hashable], hypothesis: Sequence[Hashable]) -> AlignmentResult:
+    """
+    Căn chỉnh hai chuỗi và đếm chính xác match/S/D/I
+
+    Khi có nhiều đường đi tối ưu, ưu tiên match/substitution, rồi deletion, rồi insertion.
+
+    Returns:
+        AlignmentResult với pairs/ops theo thứ tự từ đầu đến cuối
+    """
+    table = edit_distance_table(reference, hypothesis)
+    i, j = len(reference), len(hypothesis)
+    result = AlignmentResult(distance=int(table[i, j]))
+
+    pairs: List[Tuple[Optional[int], Optional[int]]] = []
+    ops: List[str] = []
+    while i > 0 or j > 0:
+        current = table[i, j]
+        if i > 0 and j > 0:
+            same = reference[i - 1] == hypothesis[j - 1]
+            if current == table[i - 1, j - 1] + (0 if same else 1):
+                i, j = i - 1, j - 1
+                pairs.append((i, j))
+                if same:
+                    ops.append(MATCH)
+                    result.matches += 1
+                else:
+                    ops.append(SUBSTITUTION)
+                    result.substitutions += 1
+                continue
+        if i > 0 and current == table[i - 1, j] + 1:
+            i -= 1
+            pairs.append((i, None))
+            ops.append(DELETION)
+            result.deletions += 1
+        else:
+            j -= 1
+            pairs.append((None, j))
+            ops.append(INSERTION)
+            result.insertions += 1
+
+    pairs.reverse()
+    ops.reverse()
+    result.pairs = pairs
+    result.ops = ops
+    return result
+
+
+# ===== CTC FORCED ALIGNMENT =====
+
+@dataclass
+class CTCSegment:
+    """Đoạn frame của một token trong đường Viterbi CTC"""
+    token_index: int  # Vị trí trong chuỗi targets
+    start_frame: int
+    end_frame: int  # Exclusive, gồm cả blank phía sau (tới token kế tiếp)
+    # GOP: trung bình log P(token) - max_c log P(c) trên các frame của token (≤ 0, 0 = tốt nhất)
+    gop: float
+
+    @property
+    def confidence(self) -> float:
+        return float(np.exp(self.gop))
+
+
+def ctc_forced_align(
+    log_probs: np.ndarray,
+    targets: Sequence[int],
+    blank_id: int = 0
+) -> Optional[List[CTCSegment]]:
+    """
+    Viterbi CTC: đường tốt nhất qua chuỗi targets đã biết
+
+    Chuỗi mở rộng [blank, t1, blank, t2, ..., blank] (2L+1 trạng thái); mỗi frame
+    cập nhật toàn bộ trạng thái bằng NumPy (ở lại / sang trạng thái kế / bỏ qua blank
+    khi hai token liền nhau khác nhau).
+
+    Args:
+        log_probs: (T, C) log-probabilities của một utterance
+        targets: ID token mong đợi (không chứa blank)
+
+    Returns:
+        Một CTCSegment cho mỗi token theo thứ tự, hoặc None nếu audio quá ngắn
+        để chứa chuỗi targets (T < số frame tối thiểu)
+    """
+    log_probs = np.asarray(log_probs, dtype=np.float32)
+    num_frames = log_probs.shape[0]
+    num_tokens = len(targets)
+    if num_tokens == 0 or num_frames == 0:
+        return None
+
+    ext = np.full(2 * num_tokens + 1, blank_id, dtype=np.int64)
+    ext[1::2] = targets
+    num_states = len(ext)
+    # Bỏ qua blank ở giữa chỉ được khi token trước khác token sau
+    can_skip = np.zeros(num_states, dtype=bool)
+    can_skip[3::2] = ext[3::2] != ext[1:-2:2]
+
+    neg_inf = np.float32(-np.inf)
+    emissions = log_probs[:, ext]  # (T, S)
+    backpointers = np.zeros((num_frames, num_states), dtype=np.int8)
+
+    alpha = np.full(num_states, neg_inf, dtype=np.float32)
+    alpha[0] = emissions[0, 0]
+    alpha[1] = emissions[0, 1]
+    candidates = np.empty((3, num_states), dtype=np.float32)
+    for t in range(1, num_frames):
+        candidates[0] = alpha
+        candidates[1, 0] = neg_inf
+        candidates[1, 1:] = alpha[:-1]
+        candidates[2, :2] = neg_inf
+        candidates[2, 2:] = alpha[:-2]
+        candidates[2, ~can_skip] = neg_inf
+        step = candidates.argmax(axis=0)
+        backpointers[t] = step
+        alpha = candidates[step, np.arange(num_states)] + emissions[t]
+
+    # Kết thúc ở token cuối hoặc blank cuối
+    state = num_states - 1 if alpha[-1] >= alpha[-2] else num_states - 2
+    if not np.isfinite(alpha[state]):
+        return None
+
+    path = np.empty(num_frames, dtype=np.int64)
+    for t in range(num_frames - 1, -1, -1):
+        path[t] = state
+        state -= int(backpointers[t, state])
+
+    # Frame của từng token (trạng thái lẻ 2k+1)
+    best = log_probs.max(axis=1)
+    token_frames: List[List[int]] = [[] for _ in range(num_tokens)]
+    for t in np.flatnonzero(path % 2 == 1):
+        token_frames[path[t] // 2].append(int(t))
+
+    segments = []
+    for k, frames in enumerate(token_frames):
+        idx = np.asarray(frames)
+        gop = float(np.mean(log_probs[idx, targets[k]] - best[idx]))
+        segments.append(CTCSegment(token_index=k, start_frame=frames[0], end_frame=frames[-1] + 1, gop=gop))
+    for current, following in zip(segments, segments[1:]):
+        current.end_frame = following.start_frame
+    return segments
@@ -0,0 +1,247 @@
+"""
+Audio Service - Decode audio upload trực tiếp trong bộ nhớ
+
+Nhận bytes từ UploadFile và trả về numpy array float32 mono 16kHz, không ghi file tạm.
+Decoder được chọn theo magic bytes của container (phần mở rộng file chỉ là gợi ý):
+- WAV/FLAC/OGG: soundfile đọc từ BytesIO
+- webm/m4a/mp3/...: ffmpeg qua pipe (services/audio_transcoder.py)
+
+AudioBuffer giữ kết quả decode cho cả request, để Whisper, Wav2Vec2 và các
+stage phân tích khác dùng chung thay vì mỗi stage tự decode + resample lại.
+Khoảng lặng đầu/cuối (người dùng giữ nút mic) được cắt ngay sau khi decode.
+"""
+import io
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from fastapi import UploadFile
+
+from config import settings
+from services.audio_transcoder import TranscodeError, container_for, get_transcoder
+from services.inference_executor import run_cpu_bound
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+
+# Các container libsndfile đọc được trực tiếp
+SOUNDFILE_CONTAINERS = {"wav", "flac", "ogg"}
+
+# Energy VAD: frame dưới ngưỡng này (dBFS) luôn là khoảng lặng
+VAD_FLOOR_DBFS = -55.0
+# Đoạn tiếng nói ngắn hơn thế này → không cắt (tránh cắt nhầm cả câu)
+MIN_SPEECH_SECONDS = 0.1
+
+
+class AudioDecodeError(Exception):
+    """Không decode được audio upload"""
+
+
+@dataclass
+class AudioBuffer:
+    """
+    Audio đã decode của một request (float32 mono 16kHz)
+
+    Decode + resample đúng một lần, sau đó truyền cùng object cho Whisper,
+    Wav2Vec2 và các stage sau. timings ghi lại thời gian (ms) của từng stage.
+    """
+    samples: np.ndarray
+    sample_rate: int = TARGET_SAMPLE_RATE
+    source_bytes: bytes = b""
+    audio_format: str = ""
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Độ dài trước khi cắt khoảng lặng (None = chưa cắt)
+    original_duration_seconds: Optional[float] = None
+    # Vị trí (giây) của samples[0] trong audio gốc - để timestamp khớp bản ghi người dùng
+    trim_offset_seconds: float = 0.0
+
+    @property
+    def duration_seconds(self) -> float:
+        return len(self.samples) / float(self.sample_rate)
+
+    def trim_silence(self) -> "AudioBuffer":
+        """
+        Cắt khoảng lặng đầu/cuối (giữ margin) trước khi chạy model
+
+        Chỉ cắt hai đầu, không cắt khoảng nghỉ giữa câu. Không làm gì nếu
+        audio_vad_trim_enabled tắt hoặc không tìm thấy đoạn có tiếng nói.
+        """
+        if not settings.audio_vad_trim_enabled or self.original_duration_seconds is not None:
+            return self
+        with self.stage("vad"):
+            start, end = detect_speech_bounds(
+                self.samples,
+                self.sample_rate,
+                threshold_db=settings.audio_vad_threshold_db,
+                margin_seconds=settings.audio_vad_margin_seconds
+            )
+            self.original_duration_seconds = self.duration_seconds
+            self.trim_offset_seconds = start / float(self.sample_rate)
+            self.samples = self.samples[start:end]
+        return self
+
+    @classmethod
+    def from_bytes(cls, audio_bytes: bytes, audio_format: Optional[str] = None) -> "AudioBuffer":
+        """Decode bytes thành AudioBuffer (raise AudioDecodeError nếu thất bại)"""
+        timings: Dict[str, float] = {}
+        samples = decode_audio_bytes(audio_bytes, audio_format=audio_format, timings=timings)
+        return cls(
+            samples=samples,
+            source_bytes=audio_bytes,
+            audio_format=(audio_format or "").lower().lstrip("."),
+            timings=timings
+        ).trim_silence()
+
+    @classmethod
+    async def from_bytes_async(cls, audio_bytes: bytes, audio_format: Optional[str] = None) -> "AudioBuffer":
+        """from_bytes cho event loop: decode + resample (CPU-bound) chạy qua run_cpu_bound"""
+        samples, timings = await run_cpu_bound(decode_audio_with_timings, audio_bytes, audio_format)
+        return cls(
+            samples=samples,
+            source_bytes=audio_bytes,
+            audio_format=(audio_format or "").lower().lstrip("."),
+            timings=timings
+        ).trim_silence()
+
+    @classmethod
+    async def from_upload(cls, upload: UploadFile) -> "AudioBuffer":
+        """Đọc UploadFile và decode (file pointer được reset để có thể đọc lại)"""
+        audio_bytes = await upload.read()
+        await upload.seek(0)
+        audio_format = (Path(upload.filename).suffix[1:] if upload.filename else "") or None
+        # Decode + resample là CPU-bound → chạy ngoài event loop
+        return await cls.from_bytes_async(audio_bytes, audio_format)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Đo thời gian một stage xử lý: with buffer.stage("whisper"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed_ms, 2)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Thông tin chẩn đoán trả về trong response"""
+        info: Dict[str, Any] = {"audio_duration_s": round(self.duration_seconds, 3)}
+        if self.original_duration_seconds is not None:
+            info["original_duration_s"] = round(self.original_duration_seconds, 3)
+            info["trimmed_s"] = round(self.original_duration_seconds - self.duration_seconds, 3)
+        info["timings_ms"] = dict(self.timings)
+        return info
+
+
+def detect_speech_bounds(
+    samples: np.ndarray,
+    sample_rate: int = TARGET_SAMPLE_RATE,
+    threshold_db: float = 35.0,
+    margin_seconds: float = 0.2,
+    frame_seconds: float = 0.02
+) -> Tuple[int, int]:
+    """
+    Tìm đoạn có tiếng nói bằng năng lượng (RMS) theo frame
+
+    Frame được coi là tiếng nói nếu năng lượng không thấp hơn frame to nhất quá
+    threshold_db và cao hơn ngưỡng tuyệt đối VAD_FLOOR_DBFS.
+
+    Returns:
+        (start, end) theo sample, đã cộng margin; (0, len) nếu không tìm thấy tiếng nói
+    """
+    n = len(samples)
+    frame = max(1, int(frame_seconds * sample_rate))
+    num_frames = n // frame
+    if num_frames == 0:
+        return 0, n
+
+    frames = samples[:num_frames * frame].reshape(num_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    energy_db = 20.0 * np.log10(rms + 1e-10)
+
+    threshold = max(float(energy_db.max()) - threshold_db, VAD_FLOOR_DBFS)
+    voiced = np.flatnonzero(energy_db > threshold)
+    if len(voiced) == 0:
+        return 0, n
+
+    margin = int(margin_seconds * sample_rate)
+    start = max(0, voiced[0] * frame - margin)
+    end = min(n, (voiced[-1] + 1) * frame + margin)
+    if end - start < int(MIN_SPEECH_SECONDS * sample_rate):
+        return 0, n
+    return int(start), int(end)
+
+
+def decode_audio_bytes(
+    audio_bytes: bytes,
+    audio_format: Optional[str] = None,
+    target_sr: int = TARGET_SAMPLE_RATE,
+    timings: Optional[Dict[str, float]] = None
+) -> np.ndarray:
+    """
+    Decode audio bytes → numpy float32 mono tại target_sr
+
+    Args:
+        audio_bytes: Nội dung file audio
+        audio_format: Phần mở rộng file (wav, webm, m4a, ...) - chỉ là gợi ý
+        target_sr: Sample rate đầu ra
+        timings: Nếu có, ghi thời gian "decode" và "resample" (ms) vào dict này
+
+    Returns:
+        1-D float32 array
+
+    Raises:
+        AudioDecodeError: Nếu mọi decoder đều thất bại
+    """
+    if not audio_bytes:
+        raise AudioDecodeError("Audio is empty")
+
+    container = container_for(audio_bytes, audio_format)
+    timings = timings if timings is not None else {}
+
+    if container is None or container in SOUNDFILE_CONTAINERS:
+        try:
+            return _decode_with_soundfile(audio_bytes, target_sr, timings)
+        except Exception as e:
+            # vd OGG Opus với libsndfile cũ - ffmpeg đọc được
+            logger.debug(f"soundfile could not decode {container or 'unknown'} audio: {e}")
+
+    # ffmpeg decode và resample trong cùng một process
+    started = time.perf_counter()
+    try:
+        audio = get_transcoder().transcode(audio_bytes, container, target_sr)
+    except TranscodeError as e:
+        raise AudioDecodeError(str(e))
+    timings["decode"] = round((time.perf_counter() - started) * 1000, 2)
+    timings["resample"] = 0.0
+    return audio
+
+
+def decode_audio_with_timings(
+    audio_bytes: bytes,
+    audio_format: Optional[str] = None
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """decode_audio_bytes trả kèm timings (dùng được trong process pool)"""
+    timings: Dict[str, float] = {}
+    samples = decode_audio_bytes(audio_bytes, audio_format=audio_format, timings=timings)
+    return samples, timings
+
+
+def _decode_with_soundfile(audio_bytes: bytes, target_sr: int, timings: Dict[str, float]) -> np.ndarray:
+    import soundfile as sf
+
+    started = time.perf_counter()
+    audio, sr = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)  # Mono
+    timings["decode"] = round((time.perf_counter() - started) * 1000, 2)
+
+    started = time.perf_counter()
+    if sr != target_sr:
+        import librosa
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=target_sr)
+    timings["resample"] = round((time.perf_counter() - started) * 1000, 2)
+    return np.ascontiguousarray(audio, dtype=np.float32)
@@ -0,0 +1,325 @@
+"""
+Audio Transcoder - Decode audio nén (webm, mp3, m4a, ...) bằng ffmpeg qua pipe
+
+- probe_ffmpeg(): kiểm tra ffmpeg một lần (gọi lúc startup), kết quả được cache; trước đây
+  mỗi lần convert đều chạy `ffmpeg -version`
+- sniff_container(): nhận diện container theo magic bytes thay vì tin phần mở rộng file,
+  để decode_audio_bytes chọn đúng decoder ngay (soundfile hoặc ffmpeg) không cần thử lần lượt
+- Transcoder: bytes → stdin ffmpeg → PCM float32 từ stdout, không file trung gian.
+  Số process ffmpeg chạy đồng thời bị giới hạn (audio_transcoder_max_parallel); request
+  vượt quá chờ slot. Khi biết container, ffmpeg được chỉ định demuxer (-f) nên bỏ qua bước dò.
+  Ngoại lệ: MP4/M4A có moov atom sau mdat (mặc định của app ghi âm iOS/Android) không demux
+  được từ pipe - mp4_moov_first() kiểm tra thứ tự box một lần và những file đó được ghi ra
+  file tạm seekable ngay, chỉ một process ffmpeg.
+
+Mỗi file vẫn cần một process ffmpeg (ffmpeg không nhận nhiều input nối tiếp qua một pipe),
+nên "pool" ở đây là giới hạn slot chứ không giữ process sống giữa các request.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, FrozenSet, Optional
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Container → demuxer ffmpeg (-f)
+FFMPEG_DEMUXERS = {
+    "wav": "wav",
+    "flac": "flac",
+    "ogg": "ogg",
+    "webm": "matroska",
+    "mp3": "mp3",
+    "aac": "aac",
+    "amr": "amr",
+    "mp4": "mov",
+}
+
+# MP4 có thể đặt moov atom ở cuối file → không demux được từ pipe, cần input seekable
+# (Transcoder kiểm tra bằng mp4_moov_first; stream live talk luôn coi là cần seekable)
+SEEKABLE_ONLY_CONTAINERS = {"mp4"}
+
+# Phần mở rộng → container (khi không nhận diện được magic bytes)
+EXTENSION_CONTAINERS = {
+    "wav": "wav", "wave": "wav",
+    "flac": "flac",
+    "ogg": "ogg", "oga": "ogg", "opus": "ogg",
+    "webm": "webm", "mkv": "webm",
+    "mp3": "mp3",
+    "aac": "aac",
+    "amr": "amr",
+    "m4a": "mp4", "mp4": "mp4", "mov": "mp4", "3gp": "mp4",
+}
+
+
+class TranscodeError(Exception):
+    """ffmpeg không có hoặc không decode được input"""
+    pass
+
+
+def sniff_container(data: bytes) -> Optional[str]:
+    """
+    Nhận diện container audio theo magic bytes
+
+    Returns:
+        "wav", "flac", "ogg", "webm", "mp4", "mp3", "aac", "amr" hoặc None nếu không nhận ra
+    """
+    head = data[:12]
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"\x1a\x45\xdf\xa3":  # EBML (Matroska / WebM)
+        return "webm"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:5] == b"#!AMR":
+        return "amr"
+    if head[:3] == b"ID3":
+        return "mp3"
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # Frame sync MPEG audio: layer = 00 → ADTS (AAC), còn lại → MP3
+        return "aac" if head[1] & 0x06 == 0 else "mp3"
+    return None
+
+
+def mp4_moov_first(data: bytes) -> bool:
+    """
+    True nếu box "moov" cấp cao nhất đứng trước "mdat" (MP4 faststart - đọc được từ pipe)
+
+    Chỉ đọc header các box top-level (size 32-bit, 64-bit khi size == 1, tới hết file khi
+    size == 0). Không tìm thấy moov trước mdat hoặc cấu trúc lỗi → False (dùng input seekable).
+    """
+    offset = 0
+    while offset + 8 <= len(data):
+        size = int.from_bytes(data[offset:offset + 4], "big")
+        box_type = data[offset + 4:offset + 8]
+        if box_type == b"moov":
+            return True
+        if box_type == b"mdat":
+            return False
+        if size == 1:
+            if offset + 16 > len(data):
+                return False
+            size = int.from_bytes(data[offset + 8:offset + 16], "big")
+        elif size == 0:
+            return False
+        if size < 8:
+            return False
+        offset += size
+    return False
+
+
+def container_for(data: bytes, extension: Optional[str] = None) -> Optional[str]:
+    """Container theo magic bytes, nếu không nhận ra thì theo phần mở rộng file"""
+    return sniff_container(data) or EXTENSION_CONTAINERS.get((extension or "").lower().lstrip("."))
+
+
+# ===== FFMPEG PROBE =====
+
+@dataclass(frozen=True)
+class FfmpegCapabilities:
+    available: bool
+    path: Optional[str] = None
+    version: Optional[str] = None
+    demuxers: FrozenSet[str] = field(default_factory=frozenset)
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = asdict(self)
+        report["demuxers"] = sorted(set(FFMPEG_DEMUXERS.values()) & self.demuxers)
+        return report
+
+
+_capabilities: Optional[FfmpegCapabilities] = None
+_probe_lock = threading.Lock()
+
+
+def _run_probe() -> FfmpegCapabilities:
+    path = shutil.which("ffmpeg")
+    if path is None:
+        return FfmpegCapabilities(available=False, error="ffmpeg not found on PATH")
+    try:
+        version = subprocess.run(
+            [path, "-hide_banner", "-version"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.splitlines()[0]
+        demuxer_lines = subprocess.run(
+            [path, "-hide_banner", "-demuxers"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.splitlines()
+    except (OSError, subprocess.SubprocessError, IndexError) as e:
+        return FfmpegCapabilities(available=False, path=path, error=str(e))
+
+    # Dòng dạng " D  matroska,webm   Matroska / WebM"
+    demuxers = set()
+    for line in demuxer_lines:
+        parts = line.split()
+        if len(parts) >= 2 and "D" in parts[0]:
+            demuxers.update(parts[1].split(","))
+    return FfmpegCapabilities(available=True, path=path, version=version, demuxers=frozenset(demuxers))
+
+
+def probe_ffmpeg(refresh: bool = False) -> FfmpegCapabilities:
+    """Khả năng của ffmpeg (có không, phiên bản, demuxer) - chỉ chạy subprocess lần đầu"""
+    global _capabilities
+    if _capabilities is None or refresh:
+        with _probe_lock:
+            if _capabilities is None or refresh:
+                _capabilities = _run_probe()
+                if _capabilities.available:
+                    logger.info(f"✅ {_capabilities.version}")
+                else:
+                    logger.warning(
+                        f"⚠️ ffmpeg not available ({_capabilities.error}) - only WAV/FLAC/OGG uploads can be decoded"
+                    )
+    return _capabilities
+
+
+# ===== TRANSCODER =====
+
+class Transcoder:
+    """
+    Decode audio bằng ffmpeg qua stdin/stdout với số process đồng thời giới hạn
+
+    Args:
+        max_parallel: Số process ffmpeg tối đa chạy cùng lúc
+        timeout_seconds: Thời gian tối đa cho một lần decode
+    """
+
+    def __init__(self, max_parallel: int, timeout_seconds: float):
+        self.max_parallel = max(1, max_parallel)
+        self.timeout_seconds = timeout_seconds
+        self._slots = threading.BoundedSemaphore(self.max_parallel)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def _command(self, source: str, container: Optional[str], target_sr: int) -> list:
+        capabilities = probe_ffmpeg()
+        cmd = [capabilities.path, "-hide_banner", "-loglevel", "error"]
+        if source != "pipe:0":
+            cmd.append("-nostdin")
+        demuxer = FFMPEG_DEMUXERS.get(container or "")
+        if demuxer and demuxer in capabilities.demuxers:
+            cmd += ["-f", demuxer]
+        # -f f32le: PCM float32 little-endian thô, đọc thẳng bằng np.frombuffer
+        return cmd + ["-i", source, "-f", "f32le", "-ac", "1", "-ar", str(target_sr), "pipe:1"]
+
+    def _run(self, cmd: list, data: Optional[bytes]) -> np.ndarray:
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE if data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        try:
+            stdout, stderr = process.communicate(input=data, timeout=self.timeout_seconds)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise TranscodeError(f"ffmpeg decode timeout ({self.timeout_seconds:.0f}s)")
+        if process.returncode != 0 or not stdout:
+            message = stderr.decode("utf-8", errors="replace").strip()
+            raise TranscodeError(f"ffmpeg decode failed: {message[:200]}")
+        return np.frombuffer(stdout, dtype=np.float32).copy()
+
+    def _decode(self, data: bytes, container: Optional[str], target_sr: int) -> np.ndarray:
+        # MP4 không faststart (moov sau mdat - đa số bản ghi từ điện thoại) không demux được
+        # từ pipe → chọn input seekable ngay, không thử pipe trước
+        if container in SEEKABLE_ONLY_CONTAINERS and not mp4_moov_first(data):
+            return self._decode_seekable(data, container, target_sr)
+        return self._run(self._command("pipe:0", container, target_sr), data)
+
+    def _decode_seekable(self, data: bytes, container: Optional[str], target_sr: int) -> np.ndarray:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
+            temp_file.write(data)
+            temp_path = temp_file.name
+        try:
+            return self._run(self._command(temp_path, container, target_sr), None)
+        finally:
+            os.unlink(temp_path)
+
+    def transcode(self, data: bytes, container: Optional[str] = None, target_sr: int = 16000) -> np.ndarray:
+        """
+        Decode bytes → numpy float32 mono tại target_sr
+
+        Args:
+            data: Nội dung file audio
+            container: Kết quả sniff_container/container_for (None = để ffmpeg tự dò)
+            target_sr: Sample rate đầu ra
+
+        Raises:
+            TranscodeError: ffmpeg không có, timeout hoặc decode thất bại
+        """
+        capabilities = probe_ffmpeg()
+        if not capabilities.available:
+            raise TranscodeError("ffmpeg not found. Install ffmpeg for webm/m4a/mp3 support.")
+
+        queued = time.perf_counter()
+        with self._slots:
+            started = time.perf_counter()
+            with self._lock:
+                self._in_flight += 1
+                self._total_wait += started - queued
+            try:
+                audio = self._decode(data, container, target_sr)
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._total_run += time.perf_counter() - started
+        with self._lock:
+            self._completed += 1
+        return audio
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            runs = self._completed + self._failed
+            return {
+                "max_parallel": self.max_parallel,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_ms": round(self._total_wait / runs * 1000, 2) if runs else 0.0,
+                "avg_run_ms": round(self._total_run / runs * 1000, 2) if runs else 0.0,
+            }
+
+
+_transcoder: Optional[Transcoder] = None
+_transcoder_lock = threading.Lock()
+
+
+def get_transcoder() -> Transcoder:
+    """Transcoder dùng chung của process"""
+    global _transcoder
+    if _transcoder is None:
+        with _transcoder_lock:
+            if _transcoder is None:
+                _transcoder = Transcoder(
+                    max_parallel=settings.audio_transcoder_max_parallel,
+                    timeout_seconds=settings.audio_transcoder_timeout_seconds
+                )
+    return _transcoder
+
+
+def transcoder_report() -> Dict[str, Any]:
+    """ffmpeg capabilities + thống kê transcoder (cho /health)"""
+    return {
+        "ffmpeg": probe_ffmpeg().to_dict(),
+        "transcoder": _transcoder.stats() if _transcoder is not None else None,
+    }
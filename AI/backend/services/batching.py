@@ -0,0 +1,162 @@
+"""
+Batching Service - Dynamic micro-batching cho model inference
+
+Gom các request đến đồng thời trong một cửa sổ thời gian ngắn (vd: 10-30 ms)
+thành một batch, chạy một lượt forward duy nhất, rồi trả kết quả về đúng caller.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Scheduler gom request thành batch và chạy trên một worker thread riêng
+
+    Worker thread chỉ được tạo ở lần submit() đầu tiên, nên có thể tạo
+    instance ở module level mà không tốn tài nguyên khi không dùng.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[T]], List[R]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        name: str = "batcher"
+    ):
+        """
+        Args:
+            process_batch: Hàm xử lý một list item, trả về list kết quả cùng thứ tự
+            max_batch_size: Số item tối đa trong một batch
+            max_wait_ms: Thời gian tối đa chờ gom thêm item sau item đầu tiên
+            name: Tên dùng cho thread và log
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.name = name
+
+        self._queue: "queue.Queue[Tuple[T, Future, float]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._total_queue_wait = 0.0
+
+    def submit(self, item: T) -> Future:
+        """
+        Đưa một item vào hàng đợi
+
+        Returns:
+            concurrent.futures.Future - gọi .result() để chờ kết quả,
+            hoặc asyncio.wrap_future() trong code async
+        """
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def pending(self) -> int:
+        """Số item đang chờ gom batch (chưa chạy)"""
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """Dừng worker thread (các item đang chờ vẫn được xử lý xong)"""
+        self._closed = True
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            self._queue.put(None)  # type: ignore[arg-type]
+            worker.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê batch để theo dõi hiệu quả gom batch"""
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "max_batch_seen": self._max_batch_seen,
+            "avg_queue_wait_ms": round(self._total_queue_wait / self._items * 1000, 2) if self._items else 0.0,
+            "pending": self._queue.qsize(),
+        }
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name=f"{self.name}-worker",
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self, first) -> List[Tuple[T, Future, float]]:
+        """Gom thêm item cho đến khi đủ max_batch_size hoặc hết cửa sổ chờ"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # close() được gọi - xử lý nốt batch hiện tại rồi dừng
+                self._queue.put(None)  # type: ignore[arg-type]
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            # Bỏ qua các future đã bị huỷ bởi caller
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: process_batch returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                logger.error(f"{self.name}: batch of {len(items)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, enqueued), result in zip(batch, results):
+                self._total_queue_wait += started - enqueued
+                future.set_result(result)
+
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
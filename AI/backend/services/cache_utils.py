@@ -0,0 +1,213 @@
+"""
+Cache Utils - LRU cache giới hạn theo số entry / dung lượng, có thống kê hit/miss
+
+Dùng cho các kết quả tính toán đắt có thể tái sử dụng giữa các request
+(ví dụ log-probs của cùng một bản ghi được chấm lại với expected_text khác).
+
+Với giá trị numpy array có thể bật tầng disk: entry bị đẩy khỏi bộ nhớ được
+ghi ra spill_dir (.npy) và nạp lại khi được hỏi tới, cũng theo LRU với
+giới hạn dung lượng riêng.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+def pcm_hash(samples: np.ndarray, sample_rate: int = 16000) -> str:
+    """Hash nội dung PCM đã decode (float32) - cùng bản ghi cho cùng key dù upload lại"""
+    data = np.ascontiguousarray(samples, dtype=np.float32)
+    digest = hashlib.blake2b(data.tobytes(), digest_size=16)
+    digest.update(str(sample_rate).encode("ascii"))
+    return digest.hexdigest()
+
+
+def _default_sizeof(value: Any) -> int:
+    return int(getattr(value, "nbytes", 0)) or 1
+
+
+class LRUCache(Generic[V]):
+    """
+    LRU thread-safe, giới hạn theo max_entries và/hoặc max_bytes
+
+    Args:
+        name: Tên hiển thị trong stats
+        max_entries: Số entry tối đa trong bộ nhớ (0 = không giới hạn)
+        max_bytes: Dung lượng tối đa trong bộ nhớ (0 = không giới hạn)
+        sizeof: Hàm tính kích thước một giá trị (mặc định .nbytes)
+        spill_dir: Thư mục tầng disk (chỉ dùng cho giá trị np.ndarray), None = tắt
+        spill_max_bytes: Dung lượng tối đa của tầng disk
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        sizeof: Callable[[Any], int] = _default_sizeof,
+        spill_dir: Optional[str] = None,
+        spill_max_bytes: int = 0
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, V]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.spill_max_bytes = spill_max_bytes
+        self._spilled: "OrderedDict[Hashable, int]" = OrderedDict()  # key → bytes trên disk
+        self._spill_bytes = 0
+        self.spill_dir: Optional[Path] = None
+        if spill_dir:
+            # Thư mục riêng cho mỗi process (nhiều uvicorn worker dùng chung spill_dir), xoá khi thoát
+            Path(spill_dir).mkdir(parents=True, exist_ok=True)
+            self.spill_dir = Path(tempfile.mkdtemp(prefix=f"{name}-", dir=spill_dir))
+            atexit.register(shutil.rmtree, self.spill_dir, True)
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._spills = 0
+
+    # ----- Tầng disk -----
+
+    def _spill_path(self, key: Hashable) -> Path:
+        name = hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).hexdigest()
+        return self.spill_dir / f"{name}.npy"
+
+    def _spill(self, key: Hashable, value: V) -> None:
+        # Gọi khi đang giữ lock; lỗi ghi disk chỉ làm mất entry, không ảnh hưởng request
+        if self.spill_dir is None or not isinstance(value, np.ndarray):
+            return
+        try:
+            path = self._spill_path(key)
+            np.save(path, value, allow_pickle=False)
+            size = path.stat().st_size
+        except OSError as e:
+            logger.warning(f"⚠️ Cache {self.name}: cannot spill entry to disk: {e}")
+            return
+        self._spilled[key] = size
+        self._spill_bytes += size
+        self._spills += 1
+        while self._spilled and self.spill_max_bytes and self._spill_bytes > self.spill_max_bytes:
+            old_key, old_size = self._spilled.popitem(last=False)
+            self._spill_bytes -= old_size
+            self._unlink(old_key)
+
+    def _unlink(self, key: Hashable) -> None:
+        try:
+            os.unlink(self._spill_path(key))
+        except OSError:
+            pass
+
+    def _load_spilled(self, key: Hashable) -> Optional[V]:
+        size = self._spilled.pop(key, None)
+        if size is None:
+            return None
+        self._spill_bytes -= size
+        path = self._spill_path(key)
+        try:
+            value = np.load(path, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Cache {self.name}: cannot read spilled entry: {e}")
+            value = None
+        self._unlink(key)
+        return value
+
+    # ----- Bộ nhớ -----
+
+    def _evict(self) -> None:
+        while self._entries and (
+            (self.max_entries and len(self._entries) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            key, value = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self._evictions += 1
+            self._spill(key, value)
+
+    def _insert(self, key: Hashable, value: V) -> None:
+        if key in self._entries:
+            self._bytes -= self._sizes.pop(key)
+            del self._entries[key]
+        size = self.sizeof(value)
+        self._entries[key] = value
+        self._sizes[key] = size
+        self._bytes += size
+        self._evict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Giá trị đã cache (đưa lên đầu LRU), None nếu không có"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key]
+            if key in self._spilled:
+                value = self._load_spilled(key)
+                if value is not None:
+                    self._disk_hits += 1
+                    self._insert(key, value)
+                    return value
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, value: V) -> None:
+        with self._lock:
+            self._insert(key, value)
+
+    def discard(self, key: Hashable) -> None:
+        """Xoá một entry (bộ nhớ và disk) nếu có"""
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            size = self._spilled.pop(key, None)
+            if size is not None:
+                self._spill_bytes -= size
+                self._unlink(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            for key in list(self._spilled):
+                self._unlink(key)
+            self._spilled.clear()
+            self._spill_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê: số entry, dung lượng, hit/miss (disk hit tính riêng), eviction"""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "spill_entries": len(self._spilled),
+                "spill_bytes": self._spill_bytes,
+                "spills": self._spills,
+            }
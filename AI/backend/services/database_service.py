@@ -90,6 +90,40 @@ def get_vocabulary_by_lesson(lesson_id: int) -> List[Dict[str, Any]]:
         raise
 
 
+def get_curriculum_vocabulary_texts() -> List[str]:
+    """
+    Toàn bộ từ vựng và câu ví dụ tiếng Hàn trong giáo trình (dùng để biên dịch trước cho chấm phát âm)
+    
+    Returns:
+        List of distinct Korean texts (korean + example)
+    """
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            query = """
+                SELECT DISTINCT korean, example
+                FROM curriculum_vocabulary
+            """
+            cursor.execute(query)
+            results = cursor.fetchall()
+            
+            texts = []
+            for row in results:
+                for value in (row['korean'], row['example']):
+                    if value and value.strip():
+                        texts.append(value.strip())
+            
+            logger.info(f"Fetched {len(texts)} curriculum vocabulary texts")
+            return texts
+            
+    except Exception as e:
+        logger.error(f"Error fetching curriculum vocabulary texts: {e}")
+        raise
+    finally:
+        if 'conn' in locals() and conn:
+            conn.close()
+
+
 def get_lesson_by_book_and_lesson_number(book_number: int, lesson_number: int) -> Optional[Dict[str, Any]]:
     """
     Get curriculum lesson by book number and lesson number
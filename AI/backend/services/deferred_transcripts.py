@@ -0,0 +1,127 @@
+"""
+Deferred Transcripts - Transcript trả sau của read-aloud (defer_transcript=true)
+
+Worker nhận POST /speaking/read-aloud trả điểm ngay và chạy Whisper ở background; client
+poll GET /speaking/read-aloud/transcript/{id}. Với nhiều worker (uvicorn --workers,
+prefork), lần poll có thể tới worker khác, nên trạng thái không nằm trong bộ nhớ process
+mà trong bảng SQLite dùng chung giữa các worker trên cùng máy
+(deferred_transcript_sqlite_path, mặc định file trong thư mục tạm của hệ thống).
+
+Entry quá deferred_transcript_ttl_seconds bị xoá. Mọi hàm đều là SQLite đồng bộ - code async
+gọi qua asyncio.to_thread.
+"""
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+
+# Dọn entry hết hạn sau mỗi ngần này lần tạo
+PURGE_EVERY = 50
+
+DEFAULT_SQLITE_FILE = "korean-studio-deferred-transcripts.db"
+
+
+class DeferredTranscriptStore:
+    """
+    Bảng deferred_transcripts(id, expected_text, status, transcript, created_at)
+
+    Args:
+        path: File SQLite (":memory:" = chỉ trong process)
+        ttl_seconds: Thời gian giữ một entry
+    """
+
+    def __init__(self, path: str, ttl_seconds: float):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._creates = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        with self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS deferred_transcripts ("
+                "id TEXT PRIMARY KEY, expected_text TEXT NOT NULL, status TEXT NOT NULL, "
+                "transcript TEXT NOT NULL DEFAULT '', created_at REAL NOT NULL)"
+            )
+
+    def create(self, expected_text: str) -> str:
+        """Thêm entry pending, trả về transcript_id"""
+        transcript_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO deferred_transcripts (id, expected_text, status, created_at) VALUES (?, ?, ?, ?)",
+                (transcript_id, expected_text, PENDING, time.time())
+            )
+            self._creates += 1
+            if self._creates % PURGE_EVERY == 0:
+                self._conn.execute(
+                    "DELETE FROM deferred_transcripts WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+        return transcript_id
+
+    def complete(self, transcript_id: str, transcript: str) -> None:
+        """Ghi transcript (rỗng nếu Whisper lỗi) và chuyển entry sang done"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE deferred_transcripts SET status = ?, transcript = ? WHERE id = ?",
+                    (DONE, transcript, transcript_id)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Deferred transcript {transcript_id}: SQLite write failed: {e}")
+
+    def discard(self, transcript_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM deferred_transcripts WHERE id = ?", (transcript_id,))
+
+    def get(self, transcript_id: str) -> Optional[Tuple[str, str, str]]:
+        """
+        Returns:
+            (status, expected_text, transcript), hoặc None nếu không có / đã hết hạn
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, expected_text, transcript, created_at FROM deferred_transcripts WHERE id = ?",
+                (transcript_id,)
+            ).fetchone()
+        if row is None or time.time() - row[3] > self.ttl_seconds:
+            return None
+        return row[0], row[1], row[2]
+
+
+_store: Optional[DeferredTranscriptStore] = None
+_store_lock = threading.Lock()
+
+
+def get_deferred_transcript_store() -> DeferredTranscriptStore:
+    """Store dùng chung; SQLite không mở được thì chỉ giữ trong process (kèm cảnh báo)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = settings.deferred_transcript_sqlite_path or str(
+                    Path(tempfile.gettempdir()) / DEFAULT_SQLITE_FILE
+                )
+                try:
+                    _store = DeferredTranscriptStore(path, settings.deferred_transcript_ttl_seconds)
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(
+                        f"⚠️ Deferred transcripts: SQLite unavailable ({path}): {e} - "
+                        f"falling back to per-process memory (polls must reach the same worker)"
+                    )
+                    _store = DeferredTranscriptStore(":memory:", settings.deferred_transcript_ttl_seconds)
+    return _store
@@ -0,0 +1,254 @@
+"""
+Inference Executor - Chạy model inference (blocking) trên worker pool giới hạn
+
+Torch/Whisper inference, librosa resample và các SDK client đồng bộ (OpenAI) đều
+là code blocking; gọi trực tiếp trong async handler sẽ chặn event loop của cả
+uvicorn worker (kể cả /ping). Module này đẩy các việc đó sang pool riêng:
+
+- "model":   thread pool cho torch (Wav2Vec2, Conformer, Whisper) - số worker nhỏ,
+             torch tự dùng nhiều thread bên trong mỗi lượt forward
+- "remote":  thread pool cho API call đồng bộ (OpenAI SDK) - chủ yếu chờ network
+- "process": process pool (tuỳ chọn) cho hàm CPU-bound thuần Python/numpy có thể pickle
+
+Mỗi pool có giới hạn độ sâu hàng đợi: khi đầy, request bị từ chối ngay với 503
+thay vì xếp hàng vô hạn. Thống kê queue wait được expose qua /health.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+
+class InferenceQueueFullError(HTTPException):
+    """Hàng đợi inference đã đầy - server đang quá tải"""
+
+    def __init__(self, pool_name: str):
+        super().__init__(
+            status_code=503,
+            detail=f"Server is busy ({pool_name} queue is full). Please try again shortly."
+        )
+
+
+def _timed_call(func: Callable[..., R], args: tuple, kwargs: dict) -> Tuple[R, float, float]:
+    # Chạy trong worker (thread hoặc process) - trả về thời điểm bắt đầu/kết thúc.
+    # Dùng time.time() để so sánh được giữa các process.
+    started = time.time()
+    result = func(*args, **kwargs)
+    return result, started, time.time()
+
+
+class InferenceExecutor:
+    """
+    Pool có giới hạn hàng đợi + metrics
+
+    max_queue là số việc được phép chờ ngoài số việc đang chạy;
+    tổng số việc nhận cùng lúc = max_workers + max_queue.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, use_processes: bool = False):
+        """
+        Args:
+            name: Tên pool (dùng cho log, thread name và metrics)
+            max_workers: Số worker chạy đồng thời
+            max_queue: Số việc tối đa được chờ trong hàng đợi
+            use_processes: True → ProcessPoolExecutor (func và args phải pickle được)
+        """
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.use_processes = use_processes
+
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._max_in_flight = 0
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+        self._total_run = 0.0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.use_processes:
+                        self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                    else:
+                        self._pool = ThreadPoolExecutor(
+                            max_workers=self.max_workers,
+                            thread_name_prefix=f"inference-{self.name}"
+                        )
+                    logger.info(f"Inference pool '{self.name}' started with {self.max_workers} workers")
+        return self._pool
+
+    def _acquire_slot(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                logger.warning(f"⚠️ Inference pool '{self.name}' is full ({self._in_flight} in flight), rejecting request")
+                raise InferenceQueueFullError(self.name)
+            self._in_flight += 1
+            self._submitted += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+    def _release_slot(self, future: Future, enqueued: float) -> None:
+        # Done-callback của future trong pool: chạy khi worker thật sự xong (hoặc việc bị huỷ
+        # trước khi bắt đầu), kể cả khi coroutine await nó đã bị huỷ (asyncio.wait_for timeout)
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                self._in_flight -= 1
+                self._failed += 1
+            return
+
+        _, started, finished = future.result()
+        queue_wait = max(0.0, started - enqueued)
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._total_queue_wait += queue_wait
+            self._max_queue_wait = max(self._max_queue_wait, queue_wait)
+            self._total_run += finished - started
+
+    async def run(self, func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        """
+        Chạy func(*args, **kwargs) trên pool và await kết quả
+
+        Slot chỉ được trả khi worker chạy xong: huỷ coroutine (timeout) chỉ bỏ được việc
+        chưa bắt đầu, việc đang chạy vẫn tính vào in_flight tới khi kết thúc.
+
+        Raises:
+            InferenceQueueFullError: Nếu hàng đợi đã đầy (HTTP 503)
+        """
+        self._acquire_slot()
+        enqueued = time.time()
+        try:
+            future = self._get_pool().submit(_timed_call, func, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+                self._failed += 1
+            raise
+        future.add_done_callback(functools.partial(self._release_slot, enqueued=enqueued))
+
+        result, _, _ = await asyncio.wrap_future(future)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê pool: số việc đang chạy/chờ, queue wait trung bình và tối đa"""
+        with self._lock:
+            in_flight = self._in_flight
+            completed = self._completed
+            return {
+                "kind": "process" if self.use_processes else "thread",
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": in_flight,
+                "queued": max(0, in_flight - self.max_workers),
+                "max_in_flight": self._max_in_flight,
+                "submitted": self._submitted,
+                "completed": completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_queue_wait_ms": round(self._total_queue_wait / completed * 1000, 2) if completed else 0.0,
+                "max_queue_wait_ms": round(self._max_queue_wait * 1000, 2),
+                "avg_run_ms": round(self._total_run / completed * 1000, 2) if completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+_executors: Dict[str, InferenceExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(name: str) -> Optional[InferenceExecutor]:
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+
+    with _executors_lock:
+        if name not in _executors:
+            if name == "model":
+                _executors[name] = InferenceExecutor(
+                    "model", settings.inference_workers, settings.inference_max_queue
+                )
+            elif name == "remote":
+                _executors[name] = InferenceExecutor(
+                    "remote", settings.inference_remote_workers, settings.inference_max_queue
+                )
+            elif name == "process" and settings.inference_process_workers > 0:
+                _executors[name] = InferenceExecutor(
+                    "process", settings.inference_process_workers, settings.inference_max_queue,
+                    use_processes=True
+                )
+        return _executors.get(name)
+
+
+def get_inference_executor() -> InferenceExecutor:
+    """Pool dùng chung cho torch model inference"""
+    return _get_executor("model")
+
+
+async def run_inference(func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """
+    Chạy model inference (torch) trên "model" pool
+
+    Example:
+        result = await run_inference(check_pronunciation_from_buffer, audio_buffer, expected_text)
+    """
+    return await _get_executor("model").run(func, *args, **kwargs)
+
+
+async def run_cpu_bound(func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """
+    Chạy hàm CPU-bound (decode/resample audio, ...) trên process pool nếu được bật
+    (inference_process_workers > 0), nếu không thì dùng "model" pool
+
+    func và args phải pickle được (hàm module-level, bytes, numpy array).
+    """
+    executor = _get_executor("process") or _get_executor("model")
+    return await executor.run(func, *args, **kwargs)
+
+
+async def run_remote_call(func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """
+    Chạy API call đồng bộ (vd: OpenAI SDK client) trên "remote" pool
+
+    Example:
+        response = await run_remote_call(client.chat.completions.create, model=..., messages=...)
+    """
+    return await _get_executor("remote").run(func, *args, **kwargs)
+
+
+def inference_stats() -> Dict[str, Any]:
+    """Metrics của tất cả pool đã được tạo (cho /health)"""
+    return {name: executor.stats() for name, executor in list(_executors.items())}
+
+
+def shutdown_inference_executor() -> None:
+    """Dừng tất cả pool khi shutdown app"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown()
@@ -0,0 +1,421 @@
+"""
+Model Registry - Load phiên bản model pronunciation mới ở background và thay nóng (hot-swap)
+
+Trước đây thay models/pronunciation_model.pt, p2id.json hoặc wav2vec2_stats.npy phải restart
+mọi worker (mất request đang chạy + load lại từ đầu). Registry làm theo thứ tự:
+
+1. Load phiên bản mới (build_pronunciation_model) trên thread riêng - traffic vẫn chạy bản cũ
+2. Chấm bộ canary bằng bản mới và bản đang chạy; từ chối nếu lỗi, log-probs không hợp lệ,
+   hoặc PER trung bình tăng quá model_registry_max_per_increase
+3. Biên dịch trước text giáo trình cho bản mới, rồi thay atomic (install_pronunciation_model):
+   request mới dùng bản mới, request đang chạy hoàn tất trên bản cũ
+4. Bỏ tham chiếu tới bản cũ - bộ nhớ được giải phóng khi request cuối cùng dùng nó kết thúc
+
+Với nhiều uvicorn worker (--workers, --preload), mỗi process giữ model riêng. Worker nhận
+POST, sau khi phiên bản qua canary và thành active, ghi nó vào file JSON dùng chung
+(model_registry_state_path); mỗi worker chạy start_version_watcher() và tự load + canary
++ swap khi file đổi. Phiên bản bị canary từ chối không bao giờ được ghi. Worker mới
+fork lại (hoặc restart) cũng load phiên bản trong file thay vì bản lúc khởi động.
+Với model worker (model_worker_address), swap phải làm trong process đó.
+"""
+import gc
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from config import settings
+from services import pronunciation_model_service as pms
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+# File state mặc định nằm cạnh model của chính deployment này (không dùng thư mục tạm chung
+# của máy - instance khác trên cùng host sẽ ghi đè phiên bản của nhau)
+DEFAULT_STATE_FILE = MODELS_DIR / ".registry_state.json"
+
+# Trạng thái một phiên bản
+LOADING = "loading"
+VALIDATING = "validating"
+ACTIVE = "active"
+RETIRED = "retired"  # Đã bị thay thế và unload
+REJECTED = "rejected"  # Không qua canary, đã unload
+FAILED = "failed"  # Lỗi khi load
+
+
+class ModelRegistryError(Exception):
+    """Yêu cầu load không hợp lệ (trùng tên, đường dẫn ngoài models/, đang load bản khác)"""
+    pass
+
+
+@dataclass
+class ModelVersionRecord:
+    version: str
+    state: str
+    sources: Dict[str, str] = field(default_factory=dict)
+    requested_at: float = field(default_factory=time.time)
+    loaded_at: Optional[float] = None
+    load_ms: Optional[float] = None
+    validation: Optional[Dict[str, Any]] = None
+    activated_at: Optional[float] = None
+    retired_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+_records: Dict[str, ModelVersionRecord] = {}
+_records_lock = threading.Lock()
+_load_thread: Optional[threading.Thread] = None
+_watcher_thread: Optional[threading.Thread] = None
+# requested_at của yêu cầu trong file state mà process này đã xử lý
+_applied_request: Optional[float] = None
+
+
+def _track_active_model() -> None:
+    # Model load lúc startup (load_pronunciation_model) chưa có record → ghi nhận là active
+    active = pms.current_model()
+    if active is None or active.version in _records:
+        return
+    _records[active.version] = ModelVersionRecord(
+        version=active.version,
+        state=ACTIVE,
+        sources=dict(active.sources),
+        requested_at=active.loaded_at,
+        loaded_at=active.loaded_at,
+        load_ms=active.load_ms,
+        activated_at=active.loaded_at
+    )
+
+
+def list_versions() -> List[Dict[str, Any]]:
+    """Mọi phiên bản đã biết trong process này, cũ → mới"""
+    with _records_lock:
+        _track_active_model()
+        return [record.to_dict() for record in _records.values()]
+
+
+def get_version(version: str) -> Optional[Dict[str, Any]]:
+    with _records_lock:
+        _track_active_model()
+        record = _records.get(version)
+        return record.to_dict() if record is not None else None
+
+
+def active_version() -> Optional[str]:
+    active = pms.current_model()
+    return active.version if active is not None else None
+
+
+def is_loading() -> bool:
+    return _load_thread is not None and _load_thread.is_alive()
+
+
+def _resolve_in_models_dir(path: Optional[str]) -> Optional[str]:
+    # Chỉ cho phép file trong models/ (torch.load unpickle nội dung file)
+    if path is None:
+        return None
+    resolved = Path(path)
+    if not resolved.is_absolute():
+        resolved = MODELS_DIR.parent / resolved
+    resolved = resolved.resolve()
+    if MODELS_DIR.resolve() not in resolved.parents:
+        raise ModelRegistryError(f"{path} is outside the models directory")
+    if not resolved.exists():
+        raise ModelRegistryError(f"{path} does not exist")
+    return str(resolved)
+
+
+# ===== CANARY =====
+
+def _load_canary_set() -> Tuple[List[Tuple[str, np.ndarray, Optional[str]]], str]:
+    """
+    (tên, audio 16kHz, expected_text) từ model_registry_canary_path
+
+    Không có manifest → một đoạn audio giả, chỉ kiểm tra model chạy được (không so PER).
+    """
+    manifest_path = settings.model_registry_canary_path
+    if manifest_path:
+        from services.audio_service import decode_audio_bytes
+
+        manifest = Path(manifest_path)
+        entries = json.loads(manifest.read_text(encoding="utf-8"))
+        items = []
+        for entry in entries:
+            audio_path = manifest.parent / entry["audio"]
+            samples = decode_audio_bytes(audio_path.read_bytes(), audio_path.suffix[1:])
+            items.append((entry["audio"], samples, entry.get("text")))
+        return items, manifest.name
+
+    rng = np.random.default_rng(0)
+    return [("synthetic", (0.01 * rng.standard_normal(32000)).astype(np.float32), None)], "synthetic"
+
+
+def _mean_per(
+    items: List[Tuple[str, np.ndarray, Optional[str]]],
+    model: pms.LoadedPronunciationModel
+) -> Optional[float]:
+    pers = []
+    for name, samples, text in items:
+        if not text:
+            continue
+        result = pms.check_pronunciation_from_array(samples, text, forced_alignment=False, model=model)
+        if result is None:
+            raise RuntimeError(f"scoring failed on canary item {name}")
+        pers.append(result.per)
+    return round(float(np.mean(pers)), 4) if pers else None
+
+
+def validate_on_canary(
+    candidate: pms.LoadedPronunciationModel,
+    baseline: Optional[pms.LoadedPronunciationModel] = None
+) -> Dict[str, Any]:
+    """
+    Chấm bộ canary bằng candidate (và baseline nếu có) mà không thay model đang chạy
+
+    Returns:
+        Dict: passed, reason, items, mean_per, baseline_mean_per, per_delta, duration_ms
+    """
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"passed": False, "reason": None}
+    try:
+        items, source = _load_canary_set()
+        report.update(source=source, items=len(items))
+
+        # Log-probs phải đúng số phoneme của từ điển mới và không có NaN/inf
+        for name, samples, _ in items:
+            log_probs = pms.predict_log_probs(samples, candidate)
+            if log_probs.ndim != 2 or log_probs.shape[1] != candidate.num_phonemes:
+                report["reason"] = (
+                    f"{name}: output shape {tuple(log_probs.shape)} does not match "
+                    f"{candidate.num_phonemes} phonemes"
+                )
+                return report
+            if not torch.isfinite(log_probs).all():
+                report["reason"] = f"{name}: non-finite log-probs"
+                return report
+
+        report["mean_per"] = _mean_per(items, candidate)
+        report["baseline_mean_per"] = _mean_per(items, baseline) if baseline is not None else None
+        if report["mean_per"] is not None and report["baseline_mean_per"] is not None:
+            report["per_delta"] = round(report["mean_per"] - report["baseline_mean_per"], 4)
+            if report["per_delta"] > settings.model_registry_max_per_increase:
+                report["reason"] = (
+                    f"mean PER {report['mean_per']} is {report['per_delta']} above active model "
+                    f"(max increase {settings.model_registry_max_per_increase})"
+                )
+                return report
+
+        report["passed"] = True
+        return report
+    except Exception as e:
+        report["reason"] = f"canary error: {e}"
+        return report
+    finally:
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+# ===== LOAD + SWAP =====
+
+def _update(version: str, **values: Any) -> None:
+    with _records_lock:
+        record = _records[version]
+        for key, value in values.items():
+            setattr(record, key, value)
+
+
+def _load_and_swap(version: str, kwargs: Dict[str, Optional[str]], publish: bool = False) -> None:
+    global _applied_request
+    try:
+        candidate = pms.build_pronunciation_model(version=version, **kwargs)
+    except Exception as e:
+        _update(version, state=FAILED, error=str(e))
+        logger.error(f"❌ Model {version} failed to load: {e}")
+        return
+
+    _update(
+        version,
+        state=VALIDATING,
+        sources=dict(candidate.sources),
+        loaded_at=candidate.loaded_at,
+        load_ms=candidate.load_ms
+    )
+    logger.info(f"🔎 Model {version} loaded in {candidate.load_ms:.0f} ms, running canary...")
+
+    baseline = pms.current_model()
+    validation = validate_on_canary(candidate, baseline)
+    if not validation["passed"]:
+        _update(version, state=REJECTED, validation=validation, error=validation["reason"])
+        logger.warning(f"⚠️ Model {version} rejected: {validation['reason']}")
+        return
+
+    # ID phoneme của text giáo trình theo từ điển mới - request đầu tiên sau swap không phải biên dịch
+    if settings.pronunciation_precompile_on_startup:
+        pms.precompile_curriculum_texts(candidate)
+
+    previous = pms.install_pronunciation_model(candidate)
+    now = time.time()
+    with _records_lock:
+        _records[version].state = ACTIVE
+        _records[version].validation = validation
+        _records[version].activated_at = now
+        if previous is not None:
+            _track_previous(previous, now)
+    logger.info(
+        f"✅ Model {version} is now active"
+        + (f" (replaced {previous.version})" if previous is not None else "")
+    )
+    # Chỉ phiên bản đã active mới được chuyển cho các worker khác (watcher của process này
+    # bỏ qua vì đang trong lượt load)
+    if publish:
+        _applied_request = _publish_request(version, kwargs)
+
+    # Request đang chạy vẫn giữ bản cũ; khi chúng xong, bản cũ được thu hồi
+    del previous, baseline
+    gc.collect()
+
+
+def _track_previous(previous: pms.LoadedPronunciationModel, retired_at: float) -> None:
+    # Gọi khi đang giữ _records_lock
+    record = _records.get(previous.version)
+    if record is None:
+        record = ModelVersionRecord(
+            version=previous.version,
+            state=RETIRED,
+            sources=dict(previous.sources),
+            requested_at=previous.loaded_at,
+            loaded_at=previous.loaded_at,
+            load_ms=previous.load_ms
+        )
+        _records[previous.version] = record
+    record.state = RETIRED
+    record.retired_at = retired_at
+
+
+def start_model_load(
+    version: str,
+    model_path: Optional[str] = None,
+    p2id_path: Optional[str] = None,
+    mean_std_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Bắt đầu load + canary + swap một phiên bản mới trên thread nền (mỗi lúc một phiên bản)
+
+    Args:
+        version: Tên phiên bản, không trùng với phiên bản đã load thành công
+        model_path, p2id_path, mean_std_path: File trong models/ (default: file mặc định)
+
+    Phiên bản chỉ được ghi vào file state (cho các worker khác) sau khi thành active.
+
+    Returns:
+        Record của phiên bản (state "loading")
+
+    Raises:
+        ModelRegistryError: Đang load bản khác, trùng tên, hoặc đường dẫn không hợp lệ
+    """
+    kwargs = {
+        "model_path": _resolve_in_models_dir(model_path),
+        "p2id_path": _resolve_in_models_dir(p2id_path),
+        "mean_std_path": _resolve_in_models_dir(mean_std_path),
+    }
+    return _start_load(version, kwargs, publish=True)
+
+
+def _start_load(version: str, kwargs: Dict[str, Optional[str]], publish: bool = False) -> Dict[str, Any]:
+    global _load_thread
+    with _records_lock:
+        _track_active_model()
+        if is_loading():
+            raise ModelRegistryError("another model version is being loaded")
+        existing = _records.get(version)
+        if existing is not None and existing.state not in (FAILED, REJECTED):
+            raise ModelRegistryError(f"version {version} already exists ({existing.state})")
+
+        record = ModelVersionRecord(version=version, state=LOADING)
+        _records.pop(version, None)
+        _records[version] = record
+        _load_thread = threading.Thread(
+            target=_load_and_swap, args=(version, kwargs, publish), name=f"model-load-{version}", daemon=True
+        )
+        _load_thread.start()
+        return record.to_dict()
+
+
+# ===== ĐỒNG BỘ GIỮA CÁC WORKER =====
+
+def _state_path() -> Path:
+    return Path(settings.model_registry_state_path) if settings.model_registry_state_path else DEFAULT_STATE_FILE
+
+
+def _publish_request(version: str, kwargs: Dict[str, Optional[str]]) -> Optional[float]:
+    """Ghi yêu cầu vào file state (atomic) cho các worker khác, trả về requested_at"""
+    path = _state_path()
+    requested_at = time.time()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"version": version, "requested_at": requested_at, **kwargs}), encoding="utf-8")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"⚠️ Model registry: cannot write {path}, other workers keep their model: {e}")
+        return None
+    return requested_at
+
+
+def _read_request() -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(_state_path().read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Model registry: cannot read {_state_path()}: {e}")
+        return None
+
+
+def _apply_published_request() -> None:
+    global _applied_request
+    # Chờ model khởi động load xong và không có lượt load nào đang chạy
+    if pms.current_model() is None or is_loading():
+        return
+    request = _read_request()
+    if request is None or request.get("requested_at") == _applied_request:
+        return
+    _applied_request = request.get("requested_at")
+
+    version = request.get("version")
+    if not version or version == active_version():
+        return
+    try:
+        # Đường dẫn được kiểm tra lại: file state nằm ngoài models/
+        kwargs = {key: _resolve_in_models_dir(request.get(key)) for key in ("model_path", "p2id_path", "mean_std_path")}
+        _start_load(version, kwargs)
+    except ModelRegistryError as e:
+        logger.warning(f"⚠️ Model registry: ignoring requested version {version}: {e}")
+        return
+    logger.info(f"🔄 Loading pronunciation model version {version} (requested by another worker)")
+
+
+def _watch_requests() -> None:
+    while True:
+        try:
+            _apply_published_request()
+        except Exception as e:
+            logger.error(f"❌ Model registry watcher error: {e}")
+        time.sleep(settings.model_registry_poll_seconds)
+
+
+def start_version_watcher() -> None:
+    """Theo dõi file state trên thread nền (mỗi process một thread; gọi sau fork)"""
+    global _watcher_thread
+    if _watcher_thread is not None and _watcher_thread.is_alive():
+        return
+    _watcher_thread = threading.Thread(target=_watch_requests, name="model-registry-watcher", daemon=True)
+    _watcher_thread.start()
@@ -0,0 +1,344 @@
+"""
+Model Worker - Process riêng giữ Wav2Vec2 + Conformer + Whisper, API worker gọi qua IPC
+
+Khi chạy nhiều uvicorn worker, mỗi worker tự load một bản model (~4× RSS với 4 worker).
+Bật model worker để chỉ một process giữ weights; API worker gửi audio đã decode
+(numpy float32 16kHz) qua Unix socket (multiprocessing.connection, có authkey).
+
+multiprocessing.connection unpickle mọi message, nên ai kết nối được với authkey đúng là
+chạy được code trên máy worker. Vì vậy cả worker lẫn API đều từ chối khởi động khi:
+- model_worker_authkey trống hoặc ngắn hơn MIN_AUTHKEY_LENGTH ký tự
+- địa chỉ là TCP nhưng không phải loopback (chỉ cho phép Unix socket, 127.0.0.0/8, localhost)
+
+Chạy worker (từ thư mục backend):
+    python -m services.model_worker
+    python -m services.model_worker --address /tmp/korean-studio-models.sock --threads 4
+
+Bật phía API (.env, cùng secret cho cả hai process):
+    MODEL_WORKER_ADDRESS=/tmp/korean-studio-models.sock
+    MODEL_WORKER_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+"""
+import argparse
+import ipaddress
+import logging
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Kết quả ping được cache ngắn để is_model_loaded() không round-trip mỗi request
+STATUS_CACHE_SECONDS = 5.0
+
+MIN_AUTHKEY_LENGTH = 16
+# Giá trị mặc định cũ (công khai trong repo) - không bao giờ chấp nhận làm secret
+LEGACY_PUBLIC_AUTHKEY = "korean-studio-model-worker"
+LOOPBACK_HOSTS = {"localhost"}
+
+
+class ModelWorkerError(Exception):
+    """Model worker không kết nối được hoặc trả về lỗi"""
+
+
+def parse_address(address: str) -> Tuple[Union[str, Tuple[str, int]], str]:
+    """
+    "host:port" → (("host", port), "AF_INET"), còn lại là đường dẫn Unix socket
+
+    Returns:
+        (address, family) cho Listener/Client
+    """
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return (host, int(port)), "AF_INET"
+    return address, "AF_UNIX"
+
+
+def _is_loopback(host: str) -> bool:
+    if host.lower() in LOOPBACK_HOSTS:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def validate_ipc_config(address: str, authkey: str) -> None:
+    """
+    Kiểm tra cấu hình IPC trước khi mở listener / kết nối
+
+    Raises:
+        ModelWorkerError: authkey trống/quá ngắn, hoặc địa chỉ TCP không phải loopback
+    """
+    if len(authkey or "") < MIN_AUTHKEY_LENGTH or authkey == LEGACY_PUBLIC_AUTHKEY:
+        raise ModelWorkerError(
+            f"MODEL_WORKER_AUTHKEY must be a secret of at least {MIN_AUTHKEY_LENGTH} characters "
+            f"(e.g. python -c \"import secrets; print(secrets.token_hex(32))\")"
+        )
+    listen_address, family = parse_address(address)
+    if family != "AF_UNIX" and not _is_loopback(listen_address[0]):
+        raise ModelWorkerError(
+            f"Model worker address {address} is not a Unix socket or loopback address - "
+            f"the IPC protocol unpickles messages and must not be reachable from other hosts"
+        )
+
+
+# ===== CLIENT (API worker) =====
+
+class ModelWorkerClient:
+    """
+    Client có connection pool tới model worker
+
+    Mỗi connection chỉ phục vụ một request tại một thời điểm; các thread
+    inference của API worker lấy connection từ pool, tạo mới khi pool trống
+    (tối đa pool_size connection giữ lại để dùng lại).
+    """
+
+    def __init__(self, address: str, authkey: str, pool_size: int = 4, timeout: float = 60.0):
+        validate_ipc_config(address, authkey)
+        self.address, self.family = parse_address(address)
+        self.authkey = authkey.encode("utf-8")
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue(maxsize=max(1, pool_size))
+        self._status: Optional[Dict[str, Any]] = None
+        self._status_checked = 0.0
+        self._pinger: Optional[threading.Thread] = None
+        self._pinger_lock = threading.Lock()
+
+    def _connect(self) -> Connection:
+        try:
+            return Client(self.address, family=self.family, authkey=self.authkey)
+        except (OSError, EOFError) as e:
+            raise ModelWorkerError(f"Cannot connect to model worker at {self.address}: {e}")
+
+    def _acquire(self) -> Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _release(self, conn: Connection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def call(self, op: str, **payload: Any) -> Any:
+        """
+        Gửi một request tới worker và chờ kết quả (blocking - gọi từ inference pool)
+
+        Connection cũ bị đóng (worker restart) được thay bằng connection mới một lần.
+
+        Raises:
+            ModelWorkerError: Không kết nối được, timeout, hoặc worker báo lỗi
+        """
+        payload["op"] = op
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.send(payload)
+                if not conn.poll(self.timeout):
+                    conn.close()
+                    raise ModelWorkerError(f"Model worker timeout after {self.timeout:.0f}s ({op})")
+                response = conn.recv()
+            except (OSError, EOFError) as e:
+                conn.close()
+                if attempt == 0:
+                    logger.warning(f"⚠️ Model worker connection lost, reconnecting: {e}")
+                    continue
+                raise ModelWorkerError(f"Model worker connection failed: {e}")
+
+            self._release(conn)
+            if not response.get("ok"):
+                raise ModelWorkerError(response.get("error", "unknown model worker error"))
+            return response.get("result")
+
+        raise ModelWorkerError("Model worker connection failed")
+
+    def status(self, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Trạng thái model trong worker (cache STATUS_CACHE_SECONDS), None nếu không kết nối được
+
+        Có thể round-trip IPC (blocking) - trên event loop dùng cached_status()
+        """
+        now = time.monotonic()
+        if refresh or now - self._status_checked > STATUS_CACHE_SECONDS:
+            try:
+                status = self.call("ping")
+            except ModelWorkerError as e:
+                # Chỉ log khi vừa mất kết nối (pinger nền gọi lại mỗi STATUS_CACHE_SECONDS)
+                if self._status is not None or not self._status_checked:
+                    logger.warning(f"⚠️ Model worker unavailable: {e}")
+                status = None
+            self._status, self._status_checked = status, now
+        return self._status
+
+    def cached_status(self) -> Optional[Dict[str, Any]]:
+        """
+        Trạng thái gần nhất, không bao giờ chặn (an toàn trên event loop)
+
+        Ping chạy trên thread nền mỗi STATUS_CACHE_SECONDS; lần gọi đầu tiên khởi động thread
+        đó và trả None cho tới khi có kết quả ping đầu tiên.
+        """
+        self._ensure_pinger()
+        return self._status
+
+    def _ensure_pinger(self) -> None:
+        # is_alive(): sau fork (prefork) thread của master không tồn tại trong worker
+        if self._pinger is not None and self._pinger.is_alive():
+            return
+        with self._pinger_lock:
+            if self._pinger is None or not self._pinger.is_alive():
+                self._pinger = threading.Thread(target=self._ping_loop, name="model-worker-ping", daemon=True)
+                self._pinger.start()
+
+    def _ping_loop(self) -> None:
+        while True:
+            self.status(refresh=True)
+            time.sleep(STATUS_CACHE_SECONDS)
+
+    def check_pronunciation(self, samples: np.ndarray, expected_text: str, time_offset: float = 0.0):
+        """PronunciationCheckResult từ worker (hoặc None)"""
+        return self.call("pronunciation", samples=samples, expected_text=expected_text, time_offset=time_offset)
+
+    def transcribe(self, samples: np.ndarray, language: str) -> Optional[str]:
+        """Transcript local Whisper từ worker (hoặc None)"""
+        return self.call("transcribe", samples=samples, language=language)
+
+
+_client: Optional[ModelWorkerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_model_worker_client() -> Optional[ModelWorkerClient]:
+    """
+    Client dùng chung, None nếu chưa cấu hình model_worker_address
+
+    Raises:
+        ModelWorkerError: Cấu hình IPC không an toàn - gọi lúc startup để API từ chối khởi động
+    """
+    global _client
+    if not settings.model_worker_address:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ModelWorkerClient(
+                    settings.model_worker_address,
+                    settings.model_worker_authkey,
+                    pool_size=settings.model_worker_pool_size,
+                    timeout=settings.model_worker_timeout_seconds
+                )
+    return _client
+
+
+# ===== SERVER (model worker process) =====
+
+def _handle_request(request: Dict[str, Any]) -> Any:
+    from services import pronunciation_model_service, stt_service
+
+    op = request.get("op")
+    if op == "ping":
+        from services.warmup_service import warmup_report
+        return {
+            "pid": os.getpid(),
+            "pronunciation_model": pronunciation_model_service.is_local_model_loaded(),
+            "whisper": stt_service._whisper_model is not None,
+            "warmup": warmup_report(),
+        }
+    if op == "pronunciation":
+        return pronunciation_model_service.check_pronunciation_from_array(
+            request["samples"], request["expected_text"], time_offset=request.get("time_offset", 0.0)
+        )
+    if op == "transcribe":
+        return stt_service._transcribe_array_blocking(request["samples"], request.get("language", "ko"))
+    raise ValueError(f"Unknown op: {op}")
+
+
+def _serve_connection(conn: Connection) -> None:
+    # Mỗi connection một thread; nhiều connection đồng thời vẫn được gom batch
+    # nếu pronunciation_batching_enabled
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                response = {"ok": True, "result": _handle_request(request)}
+            except Exception as e:
+                logger.error(f"❌ Model worker request failed ({request.get('op')}): {e}", exc_info=True)
+                response = {"ok": False, "error": str(e)}
+            try:
+                conn.send(response)
+            except (EOFError, OSError):
+                return
+
+
+def serve(address: str, authkey: str, threads: int = 0, preload_whisper: bool = True) -> None:
+    """
+    Load model một lần rồi phục vụ request từ các API worker
+
+    Raises:
+        ModelWorkerError: Cấu hình IPC không an toàn (xem validate_ipc_config)
+    """
+    validate_ipc_config(address, authkey)
+
+    from services import pronunciation_model_service
+    from services.thread_policy import apply_thread_policy
+
+    # Trước khi load model; --threads ghi đè TORCH_NUM_THREADS
+    policy = apply_thread_policy(num_threads=threads or None)
+    logger.info(f"Model worker (pid {os.getpid()}) using {policy['intra_op_threads']} torch threads")
+
+    from services.warmup_service import warm_up_models
+
+    # Load + chạy thử trước khi mở socket: API worker chỉ thấy worker khi model đã warm
+    states = warm_up_models(include_whisper=preload_whisper)
+    if states["conformer"]["state"] != "ready":
+        logger.warning("⚠️ Pronunciation model not available in model worker")
+    if settings.pronunciation_precompile_on_startup:
+        pronunciation_model_service.precompile_curriculum_texts()
+
+    listen_address, family = parse_address(address)
+    if family == "AF_UNIX" and os.path.exists(listen_address):
+        os.unlink(listen_address)  # Socket cũ từ lần chạy trước
+
+    with Listener(listen_address, family=family, authkey=authkey.encode("utf-8")) as listener:
+        logger.info(f"🚀 Model worker listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Sai authkey hoặc client ngắt giữa chừng - không dừng worker
+                logger.warning(f"⚠️ Rejected model worker connection: {e}")
+                continue
+            threading.Thread(target=_serve_connection, args=(conn,), daemon=True).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Korean Studio model worker")
+    parser.add_argument("--address", default=settings.model_worker_address or "/tmp/korean-studio-models.sock",
+                        help="Unix socket path or host:port")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = thread policy from settings)")
+    parser.add_argument("--no-whisper", action="store_true", help="Do not preload local Whisper")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    try:
+        serve(args.address, settings.model_worker_authkey, threads=args.threads, preload_whisper=not args.no_whisper)
+    except ModelWorkerError as e:
+        raise SystemExit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
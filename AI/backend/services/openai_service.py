@@ -12,8 +12,6 @@ This module provides services for:
 import logging
 import hashlib
 import json
-import os
-import tempfile
 from pathlib import Path
 from typing import Literal, Optional, Tuple, List, Dict, Any
 
@@ -22,12 +20,19 @@ from openai import OpenAI
 from openai import APIError, RateLimitError
 
 from config import settings
+from services.audio_service import AudioBuffer
+from services.inference_executor import run_remote_call
+from services.transcript_cache import audio_fingerprint, get_transcript_cache
 
 logger = logging.getLogger(__name__)
 
 # Initialize OpenAI client
 client = OpenAI(api_key=settings.openai_api_key)
 
+# Model OpenAI Whisper (và key backend trong transcript cache)
+OPENAI_WHISPER_MODEL = "whisper-1"
+OPENAI_WHISPER_BACKEND = f"openai/{OPENAI_WHISPER_MODEL}"
+
 # ===== COACH IVY SYSTEM PROMPTS =====
 
 COACH_IVY_BASE_PROMPT = """Bạn là "Coach Ivy", một giáo viên tiếng Hàn cá nhân cho người Việt học tiếng Hàn.
@@ -137,7 +142,8 @@ async def chat_with_coach(
             system_prompt += "\n\nQUAN TRỌNG: Bạn PHẢI phản hồi bằng TIẾNG HÀN (한국어), không phải tiếng Việt. Hãy phản hồi như một cuộc hội thoại thực sự - trả lời, đáp lại, hoặc tiếp tục cuộc trò chuyện một cách tự nhiên bằng tiếng Hàn. Đừng chỉ lặp lại hoặc echo lại câu nói của người dùng."
 
         # Call ChatGPT
-        response = client.chat.completions.create(
+        response = await run_remote_call(
+            client.chat.completions.create,
             model=settings.openai_model_name,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -219,7 +225,8 @@ async def chat_with_coach_ivy(
         })
         
         # Call ChatGPT
-        response = client.chat.completions.create(
+        response = await run_remote_call(
+            client.chat.completions.create,
             model=settings.openai_model_name,
             messages=messages,
             temperature=0.7,  # Lower temperature for more consistent responses
@@ -294,7 +301,8 @@ Cung cấp phản hồi ngắn gọn bằng tiếng Việt (2-3 câu):
 - Nếu sai: nhẹ nhàng giải thích lỗi và cung cấp đáp án đúng kèm lý do
 - Bao gồm Hangul (한글) khi giải thích từ/cụm từ tiếng Hàn"""
 
-        response = client.chat.completions.create(
+        response = await run_remote_call(
+            client.chat.completions.create,
             model=settings.openai_model_name,
             messages=[
                 {"role": "system", "content": get_system_prompt("explain")},
@@ -342,43 +350,56 @@ from services.tts_service import generate_speech
 
 async def transcribe_audio(
     file: UploadFile,
-    language: str = "ko"
+    language: str = "ko",
+    audio: Optional[AudioBuffer] = None,
+    endpoint: str = "openai",
+    check_cache: bool = True
 ) -> str:
     """
     Transcribe audio file to text using OpenAI Whisper
 
+    Kết quả được cache theo (fingerprint audio, language) - gửi lại cùng bản ghi không gọi API lần nữa.
+
     Args:
         file: Audio file (webm, mp3, wav, etc.)
         language: Language code (default: "ko" for Korean)
+        audio: AudioBuffer đã decode (nếu có, key cache theo hash PCM thay vì bytes upload)
+        endpoint: Tên endpoint gọi (thống kê hit rate của transcript cache)
+        check_cache: False khi caller đã tra cache (vd fallback của transcribe_audio_cheap);
+            transcript vẫn được lưu vào cache
 
     Returns:
         str: Transcribed text
     """
-    temp_file_path = None
     try:
-        # Create temp file with appropriate extension
-        file_extension = Path(file.filename).suffix or ".webm"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            temp_file_path = temp_file.name
-
-            # Write uploaded file to temp location
-            content = await file.read()
-            temp_file.write(content)
-            temp_file.flush()
+        # Gửi bytes trực tiếp lên API - không ghi file tạm
+        file_name = Path(file.filename or "").name or "audio.webm"
+        if not Path(file_name).suffix:
+            file_name += ".webm"
+        content = await file.read()
+
+        cache = get_transcript_cache()
+        fingerprint = audio_fingerprint(audio.samples if audio is not None else None, content)
+        if cache is not None and check_cache:
+            transcript = await cache.get_async(fingerprint, language, [OPENAI_WHISPER_BACKEND], endpoint)
+            if transcript is not None:
+                return transcript
 
         logger.info(f"Transcribing audio file: {file.filename} ({len(content)} bytes)")
 
         # Call Whisper API
-        with open(temp_file_path, "rb") as audio_file:
-            response = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=language,
-                response_format="text"
-            )
+        response = await run_remote_call(
+            client.audio.transcriptions.create,
+            model=OPENAI_WHISPER_MODEL,
+            file=(file_name, content),
+            language=language,
+            response_format="text"
+        )
 
         transcript = response.strip() if isinstance(response, str) else response.text.strip()
         logger.info(f"Transcription complete: {transcript[:100]}...")
+        if cache is not None:
+            await cache.put_async(fingerprint, language, OPENAI_WHISPER_BACKEND, transcript)
 
         return transcript
 
@@ -402,15 +423,6 @@ async def transcribe_audio(
         logger.error(f"Error in transcribe_audio: {e}")
         raise
 
-    finally:
-        # Cleanup temp file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logger.debug(f"Cleaned up temp file: {temp_file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to delete temp file: {e}")
-
 
 # ===== BILINGUAL FEEDBACK FUNCTIONS =====
 
@@ -502,7 +514,8 @@ Output ONLY valid JSON in this exact format:
 
         prompt = "\n".join(prompt_parts)
 
-        response = client.chat.completions.create(
+        response = await run_remote_call(
+            client.chat.completions.create,
             model=settings.openai_model_name,
             messages=[
                 {"role": "system", "content": get_system_prompt("speaking_feedback")},
@@ -0,0 +1,193 @@
+"""
+Prefork Server - Load model một lần ở master process rồi fork N uvicorn worker
+
+Với `uvicorn --workers N`, mỗi worker import app và load model riêng (RSS tăng
+tuyến tính theo số worker). Ở chế độ này master load + warm toàn bộ model,
+biên dịch trước text giáo trình, gc.freeze(), rồi fork worker: các trang chứa
+weights được chia sẻ copy-on-write (chỉ đọc khi inference nên không bị copy).
+
+Master warm-up với torch 1 thread: fork sau khi OpenMP đã mở thread pool có thể
+làm worker bị treo ở lượt forward đầu tiên. Mỗi worker áp dụng thread policy
+(services/thread_policy.py, kể cả CPU affinity theo vị trí worker) sau fork.
+
+Chạy (từ thư mục backend, chỉ Linux/macOS):
+    python main.py --preload --workers 4
+    python main.py --preload --workers 4 --threads-per-worker 2
+"""
+import gc
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Chờ worker khởi động xong trước khi in báo cáo bộ nhớ
+MEMORY_REPORT_DELAY_SECONDS = 10.0
+
+
+def preload_models() -> None:
+    """Load + warm model và biên dịch trước text trong master (trước khi fork)"""
+    import torch
+    from services.audio_transcoder import probe_ffmpeg
+    from services.pronunciation_model_service import precompile_curriculum_texts
+    from services.warmup_service import warm_up_models
+
+    torch.set_num_threads(1)
+    probe_ffmpeg()  # Worker thừa hưởng kết quả probe
+    warm_up_models()
+    if settings.pronunciation_precompile_on_startup:
+        precompile_curriculum_texts()
+
+
+def _run_worker(config, sock, slot: int, workers: int, threads: Optional[int]) -> None:
+    # Trong process con: áp dụng thread policy rồi chạy uvicorn trên socket dùng chung
+    import uvicorn
+    from services.thread_policy import apply_thread_policy
+
+    apply_thread_policy(worker_index=slot, worker_count=workers, num_threads=threads)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def _log_memory(workers: Dict[int, int]) -> None:
+    from services.process_memory import memory_report, summarize_workers
+
+    master = memory_report()
+    summary = summarize_workers(list(workers))
+    if master is None or not summary["workers"]:
+        logger.info("Memory report not available (/proc/<pid>/smaps_rollup missing)")
+        return
+    logger.info(f"📊 Master (pid {os.getpid()}): RSS {master['rss_mb']} MB, PSS {master['pss_mb']} MB")
+    for report in summary["workers"]:
+        logger.info(
+            f"📊 Worker pid {report['pid']}: RSS {report['rss_mb']} MB, PSS {report['pss_mb']} MB, "
+            f"shared {report['shared_mb']} MB, private {report['private_mb']} MB"
+        )
+    logger.info(
+        f"📊 Workers total: RSS {summary['total_rss_mb']} MB vs PSS {summary['total_pss_mb']} MB "
+        f"(sharing ratio {summary['sharing_ratio']})"
+    )
+
+
+def serve_preforked(app, host: str, port: int, workers: int, threads_per_worker: Optional[int] = None) -> None:
+    """
+    Preload model trong master, fork `workers` uvicorn worker dùng chung socket
+
+    Worker chết bất thường được fork lại (vẫn từ master đã có model) sau backoff lũy thừa;
+    một slot chết sớm liên tiếp nhiều hơn prefork_max_quick_failures lần (lỗi khởi động, OOM...) thì
+    master dừng mọi worker và thoát với mã lỗi thay vì fork lại liên tục.
+    SIGINT/SIGTERM được chuyển cho các worker rồi master thoát.
+    """
+    import uvicorn
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("--preload requires os.fork (Linux/macOS)")
+
+    logger.info(f"🚀 Preloading models in master process (pid {os.getpid()})...")
+    started = time.perf_counter()
+    preload_models()
+    logger.info(f"✅ Models preloaded in {time.perf_counter() - started:.1f}s, forking {workers} workers")
+
+    config = uvicorn.Config(app, host=host, port=port, log_level="info")
+    sock = config.bind_socket()
+
+    # Object tạo trước khi fork không bị GC quét lại → ít trang bị ghi (copy) trong worker
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}  # pid → slot
+    started_at: Dict[int, float] = {}  # slot → thời điểm fork
+    quick_failures: Dict[int, int] = {}  # slot → số lần chết sớm liên tiếp
+    respawn_at: Dict[int, float] = {}  # slot → thời điểm fork lại
+    stopping = False
+    exit_code = 0
+
+    def _spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock, slot, workers, threads_per_worker)
+        children[pid] = slot
+        started_at[slot] = time.monotonic()
+        logger.info(f"Worker {slot} started (pid {pid})")
+
+    def _stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        respawn_at.clear()
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _schedule_respawn(slot: int, pid: int, status: int) -> None:
+        nonlocal exit_code
+        uptime = time.monotonic() - started_at.get(slot, 0.0)
+        if uptime >= settings.prefork_min_uptime_seconds:
+            # Worker đã chạy ổn định rồi mới chết: không tính là chết sớm, fork lại sau backoff tối thiểu
+            quick_failures[slot] = 0
+            delay = settings.prefork_restart_backoff_seconds
+        else:
+            quick_failures[slot] = quick_failures.get(slot, 0) + 1
+            failures = quick_failures[slot]
+            if failures > settings.prefork_max_quick_failures:
+                logger.error(
+                    f"❌ Worker {slot} (pid {pid}) exited with status {status} after {uptime:.1f}s - "
+                    f"{failures} quick failures in a row, stopping all workers"
+                )
+                exit_code = 1
+                _stop(signal.SIGTERM, None)
+                return
+            delay = min(
+                settings.prefork_restart_backoff_seconds * 2 ** (failures - 1),
+                settings.prefork_restart_backoff_max_seconds
+            )
+
+        logger.warning(
+            f"⚠️ Worker {slot} (pid {pid}) exited with status {status} after {uptime:.1f}s, "
+            f"restarting in {delay:.1f}s"
+        )
+        respawn_at[slot] = time.monotonic() + delay
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    for slot in range(workers):
+        _spawn(slot)
+
+    report_at = time.monotonic() + MEMORY_REPORT_DELAY_SECONDS
+    while children or respawn_at:
+        now = time.monotonic()
+        if report_at and now >= report_at:
+            _log_memory(children)
+            report_at = 0.0
+        for slot, due in list(respawn_at.items()):
+            if now >= due:
+                del respawn_at[slot]
+                _spawn(slot)
+        if not children:
+            time.sleep(0.5)
+            continue
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            _schedule_respawn(slot, pid, status)
+
+    sock.close()
+    logger.info("👋 All workers stopped")
+    sys.exit(exit_code)
@@ -0,0 +1,57 @@
+"""
+Process Memory - Báo cáo bộ nhớ của process từ /proc/<pid>/smaps_rollup (Linux)
+
+Rss tính cả trang dùng chung nên cộng Rss của nhiều worker sẽ đếm trùng weights;
+Pss chia trang dùng chung cho số process cùng map nó. Khi preload-then-fork hoạt động,
+Shared_* của mỗi worker lớn (weights model) và tổng Pss nhỏ hơn nhiều so với tổng Rss.
+"""
+import logging
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def memory_report(pid: Union[int, str] = "self") -> Optional[Dict[str, float]]:
+    """
+    Bộ nhớ (MB) của một process: rss, pss, shared, private, swap
+
+    Returns:
+        Dict hoặc None nếu không đọc được (không phải Linux, process đã thoát)
+    """
+    values: Dict[str, float] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(":") in _FIELDS:
+                    values[parts[0].rstrip(":")] = int(parts[1]) / 1024.0  # kB → MB
+    except OSError:
+        return None
+
+    return {
+        "pid": pid,
+        "rss_mb": round(values.get("Rss", 0.0), 1),
+        "pss_mb": round(values.get("Pss", 0.0), 1),
+        "shared_mb": round(values.get("Shared_Clean", 0.0) + values.get("Shared_Dirty", 0.0), 1),
+        "private_mb": round(values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0), 1),
+        "swap_mb": round(values.get("Swap", 0.0), 1),
+    }
+
+
+def summarize_workers(pids: List[int]) -> Dict[str, object]:
+    """
+    Báo cáo bộ nhớ của nhiều worker + tổng Rss vs tổng Pss
+
+    sharing_ratio = tổng Rss / tổng Pss (≈ số worker khi gần như mọi trang được chia sẻ, 1 khi không chia sẻ)
+    """
+    reports = [r for r in (memory_report(pid) for pid in pids) if r is not None]
+    total_rss = sum(r["rss_mb"] for r in reports)
+    total_pss = sum(r["pss_mb"] for r in reports)
+    return {
+        "workers": reports,
+        "total_rss_mb": round(total_rss, 1),
+        "total_pss_mb": round(total_pss, 1),
+        "sharing_ratio": round(total_rss / total_pss, 2) if total_pss else None,
+    }
@@ -0,0 +1,180 @@
+"""
+Pronunciation Export - Xuất Conformer (và tuỳ chọn Wav2Vec2 encoder) sang TorchScript đã freeze
+
+Artifact được load_pronunciation_model() / get_wav2vec2_model() ưu tiên dùng khi có,
+bỏ qua bước dựng lại model Python + load state_dict và chạy graph đã tối ưu thay vì eager.
+
+Usage (từ thư mục backend):
+    python -m services.pronunciation_export
+    python -m services.pronunciation_export --wav2vec2
+    python -m services.pronunciation_export --model-path models/pronunciation_model.pt --output models/pronunciation_model.ts
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import warnings
+from pathlib import Path
+from typing import Optional
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).parent.parent
+DEFAULT_CONFORMER_ARTIFACT = BACKEND_DIR / "models" / "pronunciation_model.ts"
+DEFAULT_WAV2VEC2_ARTIFACT = BACKEND_DIR / "models" / "wav2vec2_encoder.ts"
+
+# Sai số tối đa cho phép giữa eager và artifact khi verify
+PARITY_TOLERANCE = 1e-3
+
+
+class Wav2Vec2EncoderWrapper(nn.Module):
+    """Transformer encoder của Wav2Vec2: (hidden_states, attention_mask) → last_hidden_state"""
+
+    def __init__(self, encoder: nn.Module):
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(self, hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.encoder(hidden_states, attention_mask=attention_mask)[0]
+
+
+def _example_mask(batch: int, frames: int, padded_from: int) -> torch.Tensor:
+    # True = frame padding (quy ước key_padding_mask của Conformer)
+    mask = torch.zeros(batch, frames, dtype=torch.bool)
+    mask[-1, padded_from:] = True
+    return mask
+
+
+def script_conformer(model: nn.Module) -> torch.jit.ScriptModule:
+    """torch.jit.script → freeze → optimize_for_inference (model phải ở eval mode)"""
+    model.eval()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        scripted = torch.jit.script(model)
+        frozen = torch.jit.freeze(scripted)
+        return torch.jit.optimize_for_inference(frozen)
+
+
+def trace_wav2vec2_encoder(model: nn.Module, input_dim: int = 768) -> torch.jit.ScriptModule:
+    """
+    Trace Transformer encoder của Wav2Vec2Model rồi freeze
+
+    HF model không script được nên dùng trace; CNN front-end vẫn chạy eager
+    (chạy riêng từng utterance, xem extract_wav2vec2_features_batch).
+    """
+    wrapper = Wav2Vec2EncoderWrapper(model.encoder).eval()
+    hidden_states = torch.randn(2, 120, input_dim)
+    attention_mask = ~_example_mask(2, 120, 80)  # HF: True = frame thật
+    with warnings.catch_warnings(), torch.no_grad():
+        warnings.simplefilter("ignore")
+        traced = torch.jit.trace(wrapper, (hidden_states, attention_mask), strict=False)
+        return torch.jit.freeze(traced)
+
+
+def _max_diff(a: torch.Tensor, b: torch.Tensor) -> float:
+    return float((a - b).abs().max())
+
+
+def verify_conformer(eager: nn.Module, artifact: torch.jit.ScriptModule, input_dim: int = 768) -> float:
+    """So sánh output eager vs artifact (có và không có padding mask) với độ dài khác lúc export"""
+    features = torch.randn(3, 173, input_dim)
+    mask = _example_mask(3, 173, 101)
+    with torch.no_grad():
+        diff = max(
+            _max_diff(eager(features[:1]), artifact(features[:1])),
+            _max_diff(eager(features, mask), artifact(features, mask)),
+        )
+    if diff > PARITY_TOLERANCE:
+        raise RuntimeError(f"Conformer artifact differs from eager model (max diff {diff:.2e})")
+    return diff
+
+
+def verify_wav2vec2_encoder(eager: nn.Module, artifact: torch.jit.ScriptModule, input_dim: int = 768) -> float:
+    wrapper = Wav2Vec2EncoderWrapper(eager.encoder).eval()
+    hidden_states = torch.randn(3, 173, input_dim)
+    attention_mask = ~_example_mask(3, 173, 101)
+    with torch.no_grad():
+        diff = _max_diff(wrapper(hidden_states, attention_mask), artifact(hidden_states, attention_mask))
+    if diff > PARITY_TOLERANCE:
+        raise RuntimeError(f"Wav2Vec2 encoder artifact differs from eager model (max diff {diff:.2e})")
+    return diff
+
+
+def export_conformer(output: Path, model_path: Optional[str] = None) -> bool:
+    """
+    Load Conformer từ state_dict và lưu bản TorchScript đã freeze
+
+    Metadata (số phoneme, mtime của file .pt nguồn) được lưu kèm để loader
+    phát hiện artifact cũ hơn weights.
+    """
+    from services import pronunciation_model_service as pms
+
+    # Export từ weights fp32 gốc, không dùng artifact cũ
+    if not pms.load_pronunciation_model(model_path=model_path, quantize_int8=False, use_torchscript=False):
+        logger.error("❌ Could not load pronunciation model for export")
+        return False
+
+    eager = pms._pronunciation_model
+    artifact = script_conformer(eager)
+    diff = verify_conformer(eager, artifact)
+
+    source = Path(model_path) if model_path else BACKEND_DIR / "models" / "pronunciation_model.pt"
+    if not source.is_absolute():
+        source = BACKEND_DIR / source
+    metadata = {
+        "num_phonemes": len(pms._phoneme_to_id),
+        "source": source.name,
+        "source_mtime": os.path.getmtime(source) if source.exists() else None,
+        "torch_version": torch.__version__,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(artifact, str(output), _extra_files={"metadata.json": json.dumps(metadata)})
+    logger.info(f"✅ Conformer exported to {output} (max diff vs eager {diff:.2e})")
+    return True
+
+
+def export_wav2vec2_encoder(output: Path) -> bool:
+    """Trace + freeze Wav2Vec2 encoder và lưu ra file"""
+    from services import pronunciation_model_service as pms
+
+    model, _, _ = pms.get_wav2vec2_model(use_torchscript=False)
+    artifact = trace_wav2vec2_encoder(model)
+    diff = verify_wav2vec2_encoder(model, artifact)
+
+    metadata = {
+        "model": pms.WAV2VEC2_MODEL_NAME,
+        "torch_version": torch.__version__,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(artifact, str(output), _extra_files={"metadata.json": json.dumps(metadata)})
+    logger.info(f"✅ Wav2Vec2 encoder exported to {output} (max diff vs eager {diff:.2e})")
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export pronunciation models to frozen TorchScript")
+    parser.add_argument("--model-path", help="Conformer state_dict (default: models/pronunciation_model.pt)")
+    parser.add_argument("--output", default=str(DEFAULT_CONFORMER_ARTIFACT), help="Conformer artifact path")
+    parser.add_argument("--wav2vec2", action="store_true", help="Also export the Wav2Vec2 Transformer encoder")
+    parser.add_argument("--wav2vec2-output", default=str(DEFAULT_WAV2VEC2_ARTIFACT))
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    ok = export_conformer(Path(args.output), args.model_path)
+    if args.wav2vec2:
+        ok = export_wav2vec2_encoder(Path(args.wav2vec2_output)) and ok
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
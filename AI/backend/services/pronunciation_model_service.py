@@ -2,6 +2,7 @@
 Pronunciation Model Service - Sử dụng Wav2Vec2 + Conformer model để check phát âm tiếng Hàn
 Tích hợp model pronunciation check từ notebook
 """
+import asyncio
 import logging
 import torch
 import torch.nn as nn
@@ -10,14 +11,67 @@ import numpy as np
 import librosa
 import soundfile as sf
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from contextvars import ContextVar
+import itertools
 import json
-import tempfile
-import os
+import threading
+import time
+
+from config import settings
+from services.alignment_service import (
+    MATCH,
+    SUBSTITUTION,
+    AlignmentResult,
+    align_sequences,
+    ctc_forced_align,
+)
+from services.audio_service import AudioBuffer, AudioDecodeError, decode_audio_bytes
+from services.batching import MicroBatcher
+from services.cache_utils import LRUCache, pcm_hash
+from services.inference_executor import InferenceQueueFullError, run_inference
+from services.model_worker import get_model_worker_client
 
 logger = logging.getLogger(__name__)
 
+# ===== STAGE TIMINGS =====
+
+# Dict nhận thời gian từng stage (ms) của context hiện tại, None = không đo
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("pronunciation_stage_timings", default=None)
+
+
+@contextmanager
+def record_stage_timings() -> Iterator[Dict[str, float]]:
+    """
+    Ghi thời gian (ms) các stage inference chạy trong block (wav2vec2, normalize, conformer,
+    ctc_decode, g2p, alignment, forced_alignment), cộng dồn nếu một stage chạy nhiều lần
+    
+    Chỉ đo phần chạy trên thread hiện tại - với micro-batching, forward chạy trên thread
+    của batcher nên wav2vec2/normalize/conformer không được ghi.
+    """
+    timings: Dict[str, float] = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+@contextmanager
+def _stage(name: str) -> Iterator[None]:
+    timings = _stage_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(timings.get(name, 0.0) + (time.perf_counter() - started) * 1000, 3)
+
+
 # ===== KOREAN G2P (Grapheme-to-Phoneme) =====
 # Từ notebook: hangul_g2p function
 
@@ -63,6 +117,12 @@ def hangul_g2p(text: str) -> List[str]:
 
 # ===== MODEL ARCHITECTURE (từ notebook) =====
 
+# Độ dài tối đa (frame) của pos_emb trong ConformerPronunciationModel
+MAX_CONFORMER_FRAMES = 500
+# Wav2Vec2 CNN: mỗi frame 20 ms (stride 320 mẫu), receptive field 400 mẫu tại 16kHz
+WAV2VEC2_FRAME_STRIDE = 320
+WAV2VEC2_RECEPTIVE_FIELD = 400
+
 class ConformerBlock(nn.Module):
     def __init__(self, dim=512, heads=8, ff_mult=4, kernel_size=15, dropout=0.2):
         super().__init__()
@@ -84,7 +144,8 @@ class ConformerBlock(nn.Module):
         self.ln_final = nn.LayerNorm(dim)
         self.dropout_rate = dropout
 
-    def forward(self, x):
+    def forward(self, x, key_padding_mask: Optional[torch.Tensor] = None):
+        # key_padding_mask: (B, T), True tại các frame padding (khi chạy batch)
         residual = x
         x = self.ff1(x)
         x = F.gelu(x)
@@ -93,12 +154,16 @@ class ConformerBlock(nn.Module):
         x = self.ln1(x + residual)
 
         residual = x
-        x = self.mhsa(x, x, x)[0]
+        x = self.mhsa(x, x, x, key_padding_mask=key_padding_mask)[0]
         x = self.ln2(x + residual)
 
         residual = x
         x = x.transpose(1, 2)
-        x = self.conv(x)
+        for i, layer in enumerate(self.conv):
+            x = layer(x)
+            if i == 1 and key_padding_mask is not None:
+                # Sau GLU: không để frame padding lọt vào depthwise conv của frame thật
+                x = x.masked_fill(key_padding_mask.unsqueeze(1), 0.0)
         x = x.transpose(1, 2)
         x = self.ln3(x + residual)
 
@@ -109,7 +174,7 @@ class ConformerPronunciationModel(nn.Module):
     def __init__(self, input_dim=768, num_phonemes=55, dim=256, heads=4, depth=3, dropout=0.2):
         super().__init__()
         self.proj = nn.Linear(input_dim, dim)
-        self.pos_emb = nn.Parameter(torch.zeros(1, 500, dim))
+        self.pos_emb = nn.Parameter(torch.zeros(1, MAX_CONFORMER_FRAMES, dim))
         self.blocks = nn.ModuleList([
             ConformerBlock(dim, heads, dropout=dropout)
             for _ in range(depth)
@@ -117,36 +182,115 @@ class ConformerPronunciationModel(nn.Module):
         self.fc = nn.Linear(dim, num_phonemes)
         self.dropout_rate = dropout
 
-    def forward(self, x):
+    def forward(self, x, key_padding_mask: Optional[torch.Tensor] = None):
         x = self.proj(x)
         B, T, D = x.shape
         pos = self.pos_emb[:, :T, :]
         x = x + pos
         x = F.dropout(x, self.dropout_rate, training=self.training)
         for block in self.blocks:
-            x = block(x)
+            x = block(x, key_padding_mask)
         return self.fc(x)
 
 
+# ===== INT8 QUANTIZATION =====
+
+def quantize_dynamic_int8(model: nn.Module, device: torch.device, name: str = "model") -> nn.Module:
+    """
+    Dynamic int8 quantization cho các lớp nn.Linear (weights int8, activation quantize lúc chạy)
+
+    Chỉ hỗ trợ CPU - trên GPU trả về model gốc. Conv front-end của Wav2Vec2
+    và in_proj của MultiheadAttention giữ nguyên fp32.
+
+    Returns:
+        Bản copy đã quantize (model gốc không bị sửa)
+    """
+    if device.type != "cpu":
+        logger.warning(f"⚠️ int8 dynamic quantization is CPU-only, keeping {name} in fp32 on {device}")
+        return model
+
+    import warnings
+    with warnings.catch_warnings():
+        # torch.ao.quantization báo deprecated trên torch mới nhưng vẫn hoạt động
+        warnings.simplefilter("ignore")
+        quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    quantized.eval()
+    logger.info(f"✅ {name} quantized to int8 (dynamic, nn.Linear)")
+    return quantized
+
+
+# ===== TORCHSCRIPT ARTIFACTS =====
+
+def _load_torchscript_artifact(
+    artifact_path: Path,
+    device: torch.device,
+    source_path: Optional[Path] = None,
+    num_phonemes: Optional[int] = None
+):
+    """
+    Load artifact TorchScript (tạo bằng python -m services.pronunciation_export)
+
+    Bỏ qua artifact (trả về None → dùng eager model) nếu không tồn tại, cũ hơn
+    file weights nguồn, hoặc số phoneme không khớp p2id.json.
+    """
+    if not artifact_path.exists():
+        return None
+    try:
+        extra_files = {"metadata.json": ""}
+        artifact = torch.jit.load(str(artifact_path), map_location=device, _extra_files=extra_files)
+        metadata = json.loads(extra_files["metadata.json"] or "{}")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load TorchScript artifact {artifact_path}: {e}")
+        return None
+
+    if source_path is not None and source_path.exists():
+        source_mtime = metadata.get("source_mtime")
+        if source_mtime is None or source_path.stat().st_mtime > source_mtime:
+            logger.warning(f"⚠️ {artifact_path.name} is older than {source_path.name}, using eager model. Re-run the export.")
+            return None
+    if num_phonemes is not None and metadata.get("num_phonemes") not in (None, num_phonemes):
+        logger.warning(f"⚠️ {artifact_path.name} has {metadata.get('num_phonemes')} phonemes, expected {num_phonemes}. Using eager model.")
+        return None
+
+    logger.info(f"✅ Using TorchScript artifact {artifact_path.name} (exported {metadata.get('exported_at', '?')})")
+    return artifact
+
+
 # ===== WAV2VEC2 FEATURE EXTRACTION =====
 
+WAV2VEC2_MODEL_NAME = "facebook/wav2vec2-base"
+
 _wav2vec2_model = None
 _wav2vec2_processor = None
 _wav2vec2_device = None
+_wav2vec2_encoder_ts = None  # Transformer encoder đã trace (models/wav2vec2_encoder.ts)
 
 
-def get_wav2vec2_model():
-    """Lazy load Wav2Vec2 model"""
-    global _wav2vec2_model, _wav2vec2_processor, _wav2vec2_device
+def get_wav2vec2_model(use_torchscript: Optional[bool] = None):
+    """
+    Lazy load Wav2Vec2 model
+    
+    Args:
+        use_torchscript: Dùng encoder đã export (models/wav2vec2_encoder.ts) nếu có
+            (default: settings.pronunciation_use_torchscript; chỉ có tác dụng ở lần load đầu)
+    """
+    global _wav2vec2_model, _wav2vec2_processor, _wav2vec2_device, _wav2vec2_encoder_ts
     if _wav2vec2_model is None:
         try:
             from transformers import Wav2Vec2Processor, Wav2Vec2Model
-            logger.info("Loading Wav2Vec2 model: facebook/wav2vec2-base")
-            _wav2vec2_processor = Wav2Vec2Processor.from_pretrained("facebook/wav2vec2-base")
-            _wav2vec2_model = Wav2Vec2Model.from_pretrained("facebook/wav2vec2-base")
+            logger.info(f"Loading Wav2Vec2 model: {WAV2VEC2_MODEL_NAME}")
+            _wav2vec2_processor = Wav2Vec2Processor.from_pretrained(WAV2VEC2_MODEL_NAME)
+            _wav2vec2_model = Wav2Vec2Model.from_pretrained(WAV2VEC2_MODEL_NAME)
             _wav2vec2_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
             _wav2vec2_model.to(_wav2vec2_device)
             _wav2vec2_model.eval()
+            if use_torchscript is None:
+                use_torchscript = settings.pronunciation_use_torchscript
+            if settings.pronunciation_quantize_int8:
+                _wav2vec2_model = quantize_dynamic_int8(_wav2vec2_model, _wav2vec2_device, "Wav2Vec2")
+            elif use_torchscript:
+                artifact_path = Path(__file__).parent.parent / "models" / "wav2vec2_encoder.ts"
+                _wav2vec2_encoder_ts = _load_torchscript_artifact(artifact_path, _wav2vec2_device)
             logger.info(f"✅ Wav2Vec2 loaded on {_wav2vec2_device}")
         except ImportError:
             logger.error("transformers library not installed. Install with: pip install transformers")
@@ -187,34 +331,129 @@ def extract_wav2vec2_features(audio: np.ndarray, sr: int = 16000) -> np.ndarray:
     return features
 
 
+def extract_wav2vec2_features_batch(audios: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Extract Wav2Vec2 features cho nhiều audio 16kHz trong một lượt forward
+
+    CNN feature encoder chạy riêng từng audio (wav2vec2-base dùng GroupNorm theo
+    trục thời gian, pad chung sẽ làm lệch thống kê), còn Transformer encoder -
+    phần tốn nhất - chạy một lần cho cả batch với attention mask.
+
+    Returns:
+        List features (T_i, 768), cùng thứ tự với audios
+    """
+    model, processor, model_device = get_wav2vec2_model()
+
+    with torch.no_grad():
+        projected = []
+        for audio in audios:
+            input_values = processor(
+                np.asarray(audio).squeeze(), sampling_rate=16000, return_tensors="pt"
+            ).input_values.to(model_device)
+            extract_features = model.feature_extractor(input_values).transpose(1, 2)
+            hidden_states, _ = model.feature_projection(extract_features)
+            projected.append(hidden_states[0])
+
+        lengths = [h.shape[0] for h in projected]
+        hidden_states = nn.utils.rnn.pad_sequence(projected, batch_first=True)  # (batch, max_frames, 768)
+        attention_mask = torch.zeros(hidden_states.shape[:2], dtype=torch.bool, device=model_device)
+        for i, n in enumerate(lengths):
+            attention_mask[i, :n] = True
+
+        if _wav2vec2_encoder_ts is not None:
+            hidden_states = _wav2vec2_encoder_ts(hidden_states, attention_mask)
+        else:
+            hidden_states = model.encoder(hidden_states, attention_mask=attention_mask)[0]
+
+    return [hidden_states[i, :n].cpu().numpy() for i, n in enumerate(lengths)]
+
+
 # ===== CTC DECODING =====
 
-def ctc_greedy_decode(log_probs: torch.Tensor, blank_id: int = 0) -> List[List[int]]:
+def collapse_ctc_ids(
+    preds: np.ndarray,
+    blank_id: int = 0,
+    lengths: Optional[Sequence[int]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    CTC Greedy Decode
-    Input: (B, T, C) - log probabilities
-    Output: List[List[int]] - decoded sequences
+    Bước collapse của CTC greedy decode cho cả batch argmax (B, T), không lặp Python theo frame
+    
+    Giữ frame khác blank và khác frame liền trước - tương đương unique_consecutive theo
+    từng hàng rồi bỏ blank, nhưng chạy được trên batch đã pad.
+    
+    Args:
+        preds: Argmax theo frame (B, T)
+        blank_id: ID của blank
+        lengths: Số frame thật của từng hàng (phần pad phía sau bị bỏ qua)
+    
+    Returns:
+        (ids, counts): ids nối liền của mọi hàng (int64), counts[i] = số ID của hàng i
+    """
+    keep = preds != blank_id
+    keep[:, 1:] &= preds[:, 1:] != preds[:, :-1]
+    if lengths is not None:
+        keep &= np.arange(preds.shape[1]) < np.asarray(lengths)[:, None]
+    # Boolean indexing lấy theo thứ tự hàng → ID của từng hàng nằm liền nhau
+    return preds[keep], keep.sum(axis=1)
+
+
+def ctc_greedy_decode_flat(
+    log_probs: torch.Tensor,
+    blank_id: int = 0,
+    lengths: Optional[Sequence[int]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    CTC greedy decode cho log-probs (B, T, C) hoặc (T, C): argmax trên torch rồi collapse_ctc_ids
+    
+    Returns:
+        (ids, counts) như collapse_ctc_ids
     """
     if log_probs.dim() == 2:
         log_probs = log_probs.unsqueeze(0)
+    preds = torch.argmax(log_probs, dim=-1).cpu().numpy()  # (B, T)
+    return collapse_ctc_ids(preds, blank_id=blank_id, lengths=lengths)
+
+
+def ctc_greedy_decode(
+    log_probs: torch.Tensor,
+    blank_id: int = 0,
+    lengths: Optional[Sequence[int]] = None
+) -> List[List[int]]:
+    """
+    CTC Greedy Decode
+    Input: (B, T, C) - log probabilities (lengths: số frame thật nếu batch đã pad)
+    Output: List[List[int]] - decoded sequences
+    """
+    ids, counts = ctc_greedy_decode_flat(log_probs, blank_id=blank_id, lengths=lengths)
+    return [row.tolist() for row in np.split(ids, np.cumsum(counts)[:-1])]
+
+
+def decode_phonemes_batch(
+    log_probs: List[torch.Tensor],
+    model: Optional["LoadedPronunciationModel"] = None
+) -> List[List[str]]:
+    """
+    Log-probs (T_i, C) của N utterance → chuỗi phoneme dự đoán (đã bỏ <sp>, <blank>)
     
-    # Argmax theo dimension cuối
-    preds = torch.argmax(log_probs, dim=-1)  # (B, T)
-    
-    batch_results = []
-    for seq in preds:
-        decoded = []
-        prev = None
-        
-        for token_id in seq.tolist():
-            # Loại bỏ blank và duplicate liên tiếp
-            if token_id != blank_id and token_id != prev:
-                decoded.append(token_id)
-            prev = token_id
-        
-        batch_results.append(decoded)
+    Argmax từng utterance, collapse cả batch một lượt (collapse_ctc_ids), rồi tra ID → phoneme
+    qua bảng NumPy của model - không lặp Python theo frame hay theo phoneme.
+    """
+    model = model or current_model()
+    lengths = [lp.shape[0] for lp in log_probs]
+    # Argmax từng utterance rồi pad ma trận ID (B, T) - nhỏ hơn nhiều so với pad log-probs (B, T, C)
+    preds = np.zeros((len(log_probs), max(lengths, default=0)), dtype=np.int64)
+    for i, lp in enumerate(log_probs):
+        preds[i, :lengths[i]] = torch.argmax(lp, dim=-1).cpu().numpy()
+    blank_id = model.phoneme_to_id.get("<blank>", 0)
+    ids, counts = collapse_ctc_ids(preds, blank_id=blank_id, lengths=lengths)
     
-    return batch_results
+    # ID ngoài từ điển → ô cuối của bảng ("?")
+    ids = np.minimum(ids, len(model.phoneme_table) - 1)
+    keep = ~model.skip_table[ids]
+    rows = np.repeat(np.arange(len(log_probs)), counts)[keep]
+    phonemes = model.phoneme_table[ids[keep]]
+    counts = np.bincount(rows, minlength=len(log_probs))
+    return [row.tolist() for row in np.split(phonemes, np.cumsum(counts)[:-1])]
 
 
 # ===== LEVENSHTEIN DISTANCE =====
@@ -222,45 +461,218 @@ def ctc_greedy_decode(log_probs: torch.Tensor, blank_id: int = 0) -> List[List[i
 def levenshtein_distance(seq1: List, seq2: List) -> Tuple[int, Dict]:
     """
     Tính Levenshtein distance (edit distance) giữa 2 sequences
+    seq1 là chuỗi chuẩn: deletions = phần tử của seq1 bị thiếu, insertions = phần tử thừa trong seq2
     Returns: (distance, details_dict)
     """
-    n, m = len(seq1), len(seq2)
-    dp = [[0] * (m + 1) for _ in range(n + 1)]
-    
-    # Initialize
-    for i in range(n + 1):
-        dp[i][0] = i
-    for j in range(m + 1):
-        dp[0][j] = j
+    alignment = align_sequences(seq1, seq2)
+    return alignment.distance, alignment.details()
+
+
+# ===== COMPILED EXPECTED TEXT =====
+
+@dataclass(frozen=True)
+class CompiledText:
+    """
+    Dạng đã biên dịch của một expected_text (dùng lại giữa các lần chấm)
     
-    # Fill DP table
-    for i in range(1, n + 1):
-        for j in range(1, m + 1):
-            if seq1[i-1] == seq2[j-1]:
-                dp[i][j] = dp[i-1][j-1]
-            else:
-                dp[i][j] = min(
-                    dp[i-1][j] + 1,      # deletion
-                    dp[i][j-1] + 1,      # insertion
-                    dp[i-1][j-1] + 1     # substitution
+    Mọi tuple theo phoneme có cùng độ dài với phonemes (không gồm <sp>).
+    """
+    text: str
+    words: Tuple[str, ...]
+    phonemes: Tuple[str, ...]
+    word_ids: Tuple[int, ...]  # Từ chứa từng phoneme
+    word_spans: Tuple[Tuple[int, int], ...]  # Từ → [start, end) trong phonemes
+    syllable_ids: Tuple[int, ...]  # Âm tiết chứa từng phoneme
+    syllables: Tuple[str, ...]
+    phoneme_classes: Tuple[str, ...]  # initial / vowel / final / other theo vị trí trong âm tiết
+    target_indices: np.ndarray  # Vị trí các phoneme có trong từ điển model
+    target_ids: np.ndarray  # ID model tương ứng (cho CTC forced alignment)
+
+
+_compiled_text_cache: Optional[LRUCache] = None
+_compiled_text_lock = threading.Lock()
+
+
+def _get_compiled_text_cache() -> LRUCache:
+    global _compiled_text_cache
+    if _compiled_text_cache is None:
+        with _compiled_text_lock:
+            if _compiled_text_cache is None:
+                _compiled_text_cache = LRUCache(
+                    "compiled-expected-text",
+                    max_entries=settings.pronunciation_text_cache_size
                 )
+    return _compiled_text_cache
+
+
+def _compile_expected_text(text: str, phoneme_to_id: Optional[Dict[str, int]]) -> CompiledText:
+    words = tuple(text.split())
+    phonemes: List[str] = []
+    word_ids: List[int] = []
+    word_spans: List[Tuple[int, int]] = []
+    syllable_ids: List[int] = []
+    syllables: List[str] = []
+    classes: List[str] = []
+    for word_idx, word in enumerate(words):
+        start = len(phonemes)
+        for char in word:
+            char_phonemes = hangul_g2p(char)
+            if 0xAC00 <= ord(char) <= 0xD7A3:
+                classes.extend(["initial", "vowel", "final"][:len(char_phonemes)])
+            else:
+                classes.extend(["other"] * len(char_phonemes))
+            phonemes.extend(char_phonemes)
+            word_ids.extend([word_idx] * len(char_phonemes))
+            syllable_ids.extend([len(syllables)] * len(char_phonemes))
+            syllables.append(char)
+        word_spans.append((start, len(phonemes)))
+    
+    # ID theo từ điển của model (cache theo generation của model)
+    vocab = phoneme_to_id or {}
+    target_indices = np.array([i for i, p in enumerate(phonemes) if p in vocab], dtype=np.int64)
+    target_ids = np.array([vocab[phonemes[i]] for i in target_indices], dtype=np.int64)
     
-    # Calculate detailed metrics
-    matches = sum(1 for i in range(min(n, m)) if seq1[i] == seq2[i])
-    substitutions = dp[n][m] - abs(n - m)  # Approximate
-    insertions = max(0, m - n)
-    deletions = max(0, n - m)
+    return CompiledText(
+        text=text,
+        words=words,
+        phonemes=tuple(phonemes),
+        word_ids=tuple(word_ids),
+        word_spans=tuple(word_spans),
+        syllable_ids=tuple(syllable_ids),
+        syllables=tuple(syllables),
+        phoneme_classes=tuple(classes),
+        target_indices=target_indices,
+        target_ids=target_ids
+    )
+
+
+def compile_expected_text(
+    expected_text: str,
+    model: Optional["LoadedPronunciationModel"] = None
+) -> CompiledText:
+    """
+    G2P + ranh giới từ/âm tiết + ID phoneme của expected_text, cache LRU theo text đã chuẩn hoá
+    
+    ID phoneme theo từ điển của model (default: current_model(); rỗng nếu chưa load model).
     
-    return dp[n][m], {
-        "matches": matches,
-        "substitutions": substitutions,
-        "insertions": insertions,
-        "deletions": deletions
-    }
+    Ví dụ: "안녕 하세요" → phonemes ("ㅇ", "ㅏ", "ㄴ", "ㄴ", "ㅕ", "ㅇ", "ㅎ", "ㅏ", ...),
+    word_spans ((0, 6), (6, 12))
+    """
+    model = model or current_model()
+    text = " ".join(expected_text.split())
+    key = (model.generation if model is not None else 0, text)
+    cache = _get_compiled_text_cache()
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = _compile_expected_text(text, model.phoneme_to_id if model is not None else None)
+        cache.put(key, compiled)
+    return compiled
+
+
+def clear_compiled_text_cache() -> None:
+    if _compiled_text_cache is not None:
+        _compiled_text_cache.clear()
+
+
+def compiled_text_cache_stats() -> Dict:
+    return _get_compiled_text_cache().stats()
+
+
+def precompile_expected_texts(
+    texts: Iterable[str],
+    model: Optional["LoadedPronunciationModel"] = None
+) -> int:
+    """Biên dịch trước danh sách text (phrase, từ vựng giáo trình) cho model, trả về số text"""
+    count = 0
+    for text in texts:
+        if text and text.strip():
+            compile_expected_text(text, model)
+            count += 1
+    return count
+
+
+def collect_curriculum_texts() -> List[str]:
+    """
+    Toàn bộ text luyện phát âm có sẵn: models/korean_phrases.json +
+    từ vựng/ví dụ trong bảng curriculum_vocabulary (bỏ qua nếu không kết nối được MySQL)
+    """
+    texts: List[str] = []
+    phrases_path = Path(__file__).parent.parent / "models" / "korean_phrases.json"
+    try:
+        with open(phrases_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for category in data.get("categories", {}).values():
+            texts.extend(p for p in category.get("phrases", []) if "..." not in p)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Cannot read {phrases_path.name}: {e}")
+    
+    try:
+        from services.database_service import get_curriculum_vocabulary_texts
+        texts.extend(get_curriculum_vocabulary_texts())
+    except Exception as e:
+        logger.warning(f"⚠️ Curriculum vocabulary not available for precompile: {e}")
+    
+    return list(dict.fromkeys(texts))
+
+
+def precompile_curriculum_texts(model: Optional["LoadedPronunciationModel"] = None) -> int:
+    """Biên dịch trước toàn bộ nội dung giáo trình (gọi khi startup sau khi load model, hoặc trước khi swap model)"""
+    started = time.perf_counter()
+    count = precompile_expected_texts(collect_curriculum_texts(), model)
+    logger.info(f"✅ Precompiled {count} expected texts in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return count
+
+
+def find_wrong_words(
+    alignment: AlignmentResult,
+    word_ids: Sequence[int],
+    words: Sequence[str],
+    threshold: float = 0.2
+) -> List[str]:
+    """
+    Các từ có tỷ lệ lỗi phoneme > threshold, tính trên alignment thật
+    
+    S/D tính cho từ chứa phoneme chuẩn đó; phoneme thừa (I) tính cho từ
+    đứng trước nó (hoặc từ đầu tiên nếu thừa ở đầu câu).
+    """
+    if not words:
+        return []
+    errors = [0] * len(words)
+    sizes = [0] * len(words)
+    for word_idx in word_ids:
+        sizes[word_idx] += 1
+
+    last_word = word_ids[0] if word_ids else 0
+    for (ref_idx, _), op in zip(alignment.pairs, alignment.ops):
+        if ref_idx is not None:
+            last_word = word_ids[ref_idx]
+        if op != MATCH:
+            errors[last_word] += 1
+
+    return [
+        word for word, error_count, size in zip(words, errors, sizes)
+        if size > 0 and error_count / size > threshold
+    ]
 
 
 # ===== PRONUNCIATION CHECK RESULT =====
 
+@dataclass
+class PhonemeSegment:
+    """Vị trí của một phoneme mong đợi trong audio (CTC forced alignment)"""
+    phoneme: str
+    expected_index: int  # Vị trí trong expected_phonemes
+    word_index: int
+    syllable_index: int
+    syllable: str
+    start_frame: int
+    end_frame: int
+    start_s: float  # Tính theo audio gốc (trước khi cắt khoảng lặng)
+    end_s: float
+    gop: float  # Goodness of pronunciation (≤ 0, 0 = model chắc chắn nhất)
+    confidence: float  # exp(gop), 0-1
+
+
 @dataclass
 class PronunciationCheckResult:
     """Kết quả check pronunciation từ model"""
@@ -275,10 +687,59 @@ class PronunciationCheckResult:
     insertions: int
     deletions: int
     overall_score: float  # 0-100
+    # Alignment đầy đủ theo thứ tự: (expected, predicted), "" ở phía bị thiếu/thừa
+    aligned_pairs: List[Tuple[str, str]] = field(default_factory=list)
+    # CTC forced alignment: timestamp + GOP của từng phoneme mong đợi
+    phoneme_segments: List[PhonemeSegment] = field(default_factory=list)
 
 
 # ===== PRONUNCIATION MODEL SERVICE =====
 
+@dataclass(frozen=True)
+class LoadedPronunciationModel:
+    """
+    Một phiên bản model pronunciation đã load: Conformer + từ điển phoneme + stats chuẩn hoá
+    
+    Mỗi request lấy một tham chiếu (current_model()) và dùng nó từ đầu tới cuối, nên khi
+    model được thay (services/model_registry.py) request đang chạy vẫn dùng trọn phiên bản cũ.
+    generation tăng dần theo mỗi lần load và là key của các cache phụ thuộc model.
+    """
+    version: str
+    generation: int
+    model: Any  # ConformerPronunciationModel, bản int8 hoặc artifact TorchScript
+    phoneme_to_id: Dict[str, int]
+    id_to_phoneme: Dict[int, str]
+    device: torch.device
+    mean: float
+    std: float
+    sources: Dict[str, str] = field(default_factory=dict)
+    load_ms: float = 0.0
+    loaded_at: float = field(default_factory=time.time)
+    phoneme_table: np.ndarray = field(default=None, repr=False)  # ID → phoneme ("?" nếu không có)
+    skip_table: np.ndarray = field(default=None, repr=False)  # ID → bỏ khỏi chuỗi dự đoán (<sp>, <blank>)
+    
+    def __post_init__(self):
+        # Bảng tra cho decode_phonemes_batch; ô cuối dành cho ID ngoài từ điển
+        if self.phoneme_table is None:
+            size = max(self.id_to_phoneme, default=-1) + 2
+            table = np.full(size, "?", dtype=object)
+            skip = np.zeros(size, dtype=bool)
+            for idx, phoneme in self.id_to_phoneme.items():
+                table[idx] = phoneme
+                skip[idx] = phoneme in ("<sp>", "<blank>")
+            object.__setattr__(self, "phoneme_table", table)
+            object.__setattr__(self, "skip_table", skip)
+    
+    @property
+    def num_phonemes(self) -> int:
+        return len(self.phoneme_to_id)
+
+
+_active_model: Optional[LoadedPronunciationModel] = None
+_model_swap_lock = threading.Lock()
+_model_generations = itertools.count(1)
+
+# Bản sao chỉ đọc của _active_model (export, code cũ); inference dùng current_model()
 _pronunciation_model = None
 _phoneme_to_id = None
 _id_to_phoneme = None
@@ -286,11 +747,212 @@ _model_device = None
 _model_mean = None
 _model_std = None
 
+_pronunciation_batcher: Optional[MicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+# Log-probs theo hash PCM: chấm lại cùng bản ghi (transcript khác, expected_text đã sửa)
+# chỉ tốn alignment, không chạy lại Wav2Vec2 + Conformer
+_log_prob_cache: Optional[LRUCache] = None
+_cache_lock = threading.Lock()
+
+
+def _resolve_model_file(path: Optional[str], default_name: str) -> Path:
+    # Đường dẫn tương đối tính từ thư mục backend
+    backend_dir = Path(__file__).parent.parent  # Go up from services/ to backend/
+    if path is None:
+        return backend_dir / "models" / default_name
+    path = Path(path)
+    return path if path.is_absolute() else backend_dir / path
+
+
+def load_phoneme_dictionary(p2id_path: Optional[str] = None) -> Dict[str, int]:
+    """p2id.json (default: models/p2id.json), hoặc từ điển mặc định từ bảng Jamo nếu không có file"""
+    p2id_path = _resolve_model_file(p2id_path, "p2id.json")
+    if not p2id_path.exists():
+        logger.warning(f"Phoneme dictionary not found at {p2id_path}. Using default.")
+        phoneme_to_id = {"<blank>": 0}
+        phonemes = sorted(set(LEADS + VOWELS + "".join(TAILS) + "<sp>"))
+        for i, p in enumerate(phonemes, start=1):
+            phoneme_to_id[p] = i
+        return phoneme_to_id
+    
+    with open(p2id_path, 'r', encoding='utf-8') as f:
+        phoneme_to_id = json.load(f)
+    logger.info(f"✅ Loaded phoneme dictionary: {len(phoneme_to_id)} phonemes")
+    return phoneme_to_id
+
+
+def make_pronunciation_model(
+    model: Any,
+    phoneme_to_id: Dict[str, int],
+    version: str,
+    device: Optional[torch.device] = None,
+    mean: float = 0.0,
+    std: float = 1.0,
+    sources: Optional[Dict[str, str]] = None,
+    load_ms: float = 0.0
+) -> LoadedPronunciationModel:
+    """Đóng gói model + từ điển thành một phiên bản mới (generation mới, chưa active)"""
+    return LoadedPronunciationModel(
+        version=version,
+        generation=next(_model_generations),
+        model=model,
+        phoneme_to_id=phoneme_to_id,
+        id_to_phoneme={v: k for k, v in phoneme_to_id.items()},
+        device=device or torch.device("cpu"),
+        mean=float(mean),
+        std=float(std),
+        sources=sources or {},
+        load_ms=load_ms
+    )
+
+
+def derive_pronunciation_model(base: LoadedPronunciationModel, model: Any, version: str) -> LoadedPronunciationModel:
+    """Phiên bản dùng chung từ điển + stats với base nhưng Conformer khác (int8, TorchScript, ...)"""
+    return make_pronunciation_model(
+        model, base.phoneme_to_id, version,
+        device=base.device, mean=base.mean, std=base.std, sources=base.sources
+    )
+
+
+def build_pronunciation_model(
+    model_path: Optional[str] = None,
+    p2id_path: Optional[str] = None,
+    mean_std_path: Optional[str] = None,
+    quantize_int8: Optional[bool] = None,
+    use_torchscript: Optional[bool] = None,
+    version: Optional[str] = None
+) -> LoadedPronunciationModel:
+    """
+    Load model + từ điển phoneme + stats thành một phiên bản mới, chưa thay model đang chạy
+    
+    Args:
+        model_path, p2id_path, mean_std_path, quantize_int8, use_torchscript: như load_pronunciation_model
+        version: Tên phiên bản (default: tên file model + mtime)
+    
+    Raises:
+        FileNotFoundError: Không có file weights (và không có artifact TorchScript dùng được)
+    """
+    started = time.perf_counter()
+    model_path = _resolve_model_file(model_path, "pronunciation_model.pt")
+    p2id_path = _resolve_model_file(p2id_path, "p2id.json")
+    mean_std_path = _resolve_model_file(mean_std_path, "wav2vec2_stats.npy")
+    
+    logger.info(f"Loading pronunciation model from: {model_path}")
+    logger.info(f"Loading phoneme dictionary from: {p2id_path}")
+    logger.info(f"Loading normalization stats from: {mean_std_path}")
+    
+    phoneme_to_id = load_phoneme_dictionary(str(p2id_path))
+    
+    # Load mean/std if provided
+    if mean_std_path.exists():
+        stats = np.load(mean_std_path)
+        mean, std = stats[0], stats[1]
+        logger.info(f"✅ Loaded normalization stats: mean={mean:.6f}, std={std:.6f}")
+    else:
+        mean, std = 0.0, 1.0
+        logger.warning(f"Normalization stats not found at {mean_std_path}. Using default (mean=0, std=1)")
+    
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    num_phonemes = len(phoneme_to_id)
+    sources = {"model": str(model_path), "p2id": str(p2id_path), "stats": str(mean_std_path)}
+    if version is None:
+        version = model_path.stem
+        if model_path.exists():
+            version += time.strftime("@%Y%m%d-%H%M%S", time.localtime(model_path.stat().st_mtime))
+    
+    if quantize_int8 is None:
+        quantize_int8 = settings.pronunciation_quantize_int8
+    if use_torchscript is None:
+        use_torchscript = settings.pronunciation_use_torchscript
+    
+    # Artifact TorchScript đã freeze: không cần dựng lại model Python + load state_dict
+    if use_torchscript and not quantize_int8:
+        artifact = _load_torchscript_artifact(
+            model_path.with_suffix(".ts"), device,
+            source_path=model_path, num_phonemes=num_phonemes
+        )
+        if artifact is not None:
+            logger.info(f"✅ Pronunciation model {version} loaded successfully on {device} (TorchScript)")
+            logger.info(f"   Phonemes: {num_phonemes}")
+            return make_pronunciation_model(
+                artifact, phoneme_to_id, version, device=device, mean=mean, std=std, sources=sources,
+                load_ms=round((time.perf_counter() - started) * 1000, 1)
+            )
+    
+    # Load model
+    if not model_path.exists():
+        raise FileNotFoundError(f"Model not found at {model_path}")
+    
+    # Create model architecture
+    model = ConformerPronunciationModel(
+        input_dim=768,  # Wav2Vec2 feature dimension
+        num_phonemes=num_phonemes,
+        dim=256,
+        heads=4,
+        depth=3,
+        dropout=0.2
+    )
+    
+    # Load weights
+    logger.info(f"Loading model weights from {model_path}...")
+    state_dict = torch.load(model_path, map_location=device)
+    model.load_state_dict(state_dict)
+    model.to(device)
+    model.eval()
+    num_parameters = sum(p.numel() for p in model.parameters())
+    
+    if quantize_int8:
+        model = quantize_dynamic_int8(model, device, "Conformer")
+    
+    logger.info(f"✅ Pronunciation model {version} loaded successfully on {device}")
+    logger.info(f"   Model parameters: {num_parameters:,}")
+    logger.info(f"   Phonemes: {num_phonemes}")
+    return make_pronunciation_model(
+        model, phoneme_to_id, version, device=device, mean=mean, std=std, sources=sources,
+        load_ms=round((time.perf_counter() - started) * 1000, 1)
+    )
+
+
+def install_pronunciation_model(
+    loaded: Optional[LoadedPronunciationModel]
+) -> Optional[LoadedPronunciationModel]:
+    """
+    Thay model đang active (một phép gán - request mới thấy ngay phiên bản mới)
+    
+    Request đang chạy giữ tham chiếu riêng nên hoàn tất với phiên bản cũ; bộ nhớ của
+    phiên bản cũ được giải phóng khi không còn ai giữ nó.
+    
+    Returns:
+        Phiên bản active trước đó (None nếu chưa có)
+    """
+    global _active_model, _pronunciation_model, _phoneme_to_id, _id_to_phoneme, _model_device, _model_mean, _model_std
+    with _model_swap_lock:
+        previous = _active_model
+        _active_model = loaded
+        if loaded is None:
+            _pronunciation_model = _phoneme_to_id = _id_to_phoneme = None
+            _model_device = _model_mean = _model_std = None
+        else:
+            _pronunciation_model = loaded.model
+            _phoneme_to_id = loaded.phoneme_to_id
+            _id_to_phoneme = loaded.id_to_phoneme
+            _model_device = loaded.device
+            _model_mean, _model_std = loaded.mean, loaded.std
+    return previous
+
+
+def current_model() -> Optional[LoadedPronunciationModel]:
+    """Phiên bản model đang active trong process này (None nếu chưa load)"""
+    return _active_model
+
 
 def load_pronunciation_model(
     model_path: Optional[str] = None,
     p2id_path: Optional[str] = None,
-    mean_std_path: Optional[str] = None
+    mean_std_path: Optional[str] = None,
+    quantize_int8: Optional[bool] = None,
+    use_torchscript: Optional[bool] = None
 ) -> bool:
     """
     Load pronunciation model và phoneme dictionary
@@ -299,103 +961,384 @@ def load_pronunciation_model(
         model_path: Đường dẫn đến file model .pt (default: models/pronunciation_model.pt relative to backend dir)
         p2id_path: Đường dẫn đến file p2id.json (default: models/p2id.json relative to backend dir)
         mean_std_path: Đường dẫn đến file wav2vec2_stats.npy (default: models/wav2vec2_stats.npy)
+        quantize_int8: Quantize Conformer sang int8 sau khi load weights
+            (default: settings.pronunciation_quantize_int8)
+        use_torchscript: Ưu tiên artifact đã export (cùng tên, đuôi .ts) nếu có
+            (default: settings.pronunciation_use_torchscript; bỏ qua khi quantize_int8)
     
     Returns:
         bool: True nếu load thành công
     """
-    global _pronunciation_model, _phoneme_to_id, _id_to_phoneme, _model_device, _model_mean, _model_std
+    # Cache theo generation nên không trả kết quả cũ, xoá để giải phóng bộ nhớ
+    clear_log_prob_cache()
+    clear_compiled_text_cache()
     
     try:
-        # Resolve paths relative to backend directory
-        backend_dir = Path(__file__).parent.parent  # Go up from services/ to backend/
-        
-        if model_path is None:
-            model_path = backend_dir / "models" / "pronunciation_model.pt"
-        else:
-            model_path = Path(model_path)
-            if not model_path.is_absolute():
-                model_path = backend_dir / model_path
-        
-        if p2id_path is None:
-            p2id_path = backend_dir / "models" / "p2id.json"
-        else:
-            p2id_path = Path(p2id_path)
-            if not p2id_path.is_absolute():
-                p2id_path = backend_dir / p2id_path
-        
-        if mean_std_path is None:
-            mean_std_path = backend_dir / "models" / "wav2vec2_stats.npy"
-        else:
-            mean_std_path = Path(mean_std_path)
-            if not mean_std_path.is_absolute():
-                mean_std_path = backend_dir / mean_std_path
-        
-        logger.info(f"Loading pronunciation model from: {model_path}")
-        logger.info(f"Loading phoneme dictionary from: {p2id_path}")
-        logger.info(f"Loading normalization stats from: {mean_std_path}")
-        
-        # Load phoneme dictionary
-        if not p2id_path.exists():
-            logger.warning(f"Phoneme dictionary not found at {p2id_path}. Using default.")
-            # Create default dictionary
-            _phoneme_to_id = {"<blank>": 0}
-            phonemes = sorted(set(LEADS + VOWELS + "".join(TAILS) + "<sp>"))
-            for i, p in enumerate(phonemes, start=1):
-                _phoneme_to_id[p] = i
-        else:
-            with open(p2id_path, 'r', encoding='utf-8') as f:
-                _phoneme_to_id = json.load(f)
-            logger.info(f"✅ Loaded phoneme dictionary: {len(_phoneme_to_id)} phonemes")
-        
-        _id_to_phoneme = {v: k for k, v in _phoneme_to_id.items()}
-        
-        # Load mean/std if provided
-        if mean_std_path.exists():
-            stats = np.load(mean_std_path)
-            _model_mean, _model_std = stats[0], stats[1]
-            logger.info(f"✅ Loaded normalization stats: mean={_model_mean:.6f}, std={_model_std:.6f}")
-        else:
-            _model_mean, _model_std = 0.0, 1.0
-            logger.warning(f"Normalization stats not found at {mean_std_path}. Using default (mean=0, std=1)")
-        
-        # Load model
-        if not model_path.exists():
-            logger.error(f"❌ Model not found at {model_path}. Model will not be available.")
-            return False
-        
-        _model_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        num_phonemes = len(_phoneme_to_id)
-        
-        # Create model architecture
-        _pronunciation_model = ConformerPronunciationModel(
-            input_dim=768,  # Wav2Vec2 feature dimension
-            num_phonemes=num_phonemes,
-            dim=256,
-            heads=4,
-            depth=3,
-            dropout=0.2
+        loaded = build_pronunciation_model(
+            model_path=model_path,
+            p2id_path=p2id_path,
+            mean_std_path=mean_std_path,
+            quantize_int8=quantize_int8,
+            use_torchscript=use_torchscript
         )
-        
-        # Load weights
-        logger.info(f"Loading model weights from {model_path}...")
-        state_dict = torch.load(model_path, map_location=_model_device)
-        _pronunciation_model.load_state_dict(state_dict)
-        _pronunciation_model.to(_model_device)
-        _pronunciation_model.eval()
-        
-        logger.info(f"✅ Pronunciation model loaded successfully on {_model_device}")
-        logger.info(f"   Model parameters: {sum(p.numel() for p in _pronunciation_model.parameters()):,}")
-        logger.info(f"   Phonemes: {num_phonemes}")
-        return True
-        
+    except FileNotFoundError as e:
+        logger.error(f"❌ {e}. Model will not be available.")
+        return False
     except Exception as e:
         logger.error(f"Error loading pronunciation model: {e}")
         return False
+    
+    install_pronunciation_model(loaded)
+    return True
+
+
+def is_local_model_loaded() -> bool:
+    """Model đã được load trong process hiện tại"""
+    return _active_model is not None
 
 
 def is_model_loaded() -> bool:
-    """Check if pronunciation model is loaded"""
-    return _pronunciation_model is not None
+    """
+    Check if pronunciation model is available (local hoặc qua model worker)
+    
+    Không chặn: với model worker dùng trạng thái do thread ping nền cập nhật
+    (gọi được trực tiếp từ async handler).
+    """
+    if _active_model is not None:
+        return True
+    client = get_model_worker_client()
+    if client is None:
+        return False
+    status = client.cached_status()
+    return bool(status and status.get("pronunciation_model"))
+
+
+def predict_log_probs_batch(
+    audios: List[np.ndarray],
+    model: Optional[LoadedPronunciationModel] = None
+) -> List[torch.Tensor]:
+    """
+    Chạy Wav2Vec2 + Conformer cho một batch audio 16kHz mono
+
+    Audio → Wav2Vec2 features → normalize → pad + key_padding_mask → Conformer → log-probs
+
+    Args:
+        audios: Audio 16kHz mono
+        model: Phiên bản model (default: current_model())
+
+    Returns:
+        List log-probabilities (T_i, num_phonemes) trên CPU, cùng thứ tự với audios
+    """
+    model = model or current_model()
+    with _stage("wav2vec2"):
+        features = extract_wav2vec2_features_batch(audios)
+    lengths = [f.shape[0] for f in features]
+    max_len = max(lengths)
+
+    with _stage("normalize"):
+        batch = np.zeros((len(features), max_len, features[0].shape[1]), dtype=np.float32)
+        padding_mask = np.ones((len(features), max_len), dtype=bool)
+        for i, feats in enumerate(features):
+            batch[i, :len(feats)] = (feats - model.mean) / (model.std + 1e-8)
+            padding_mask[i, :len(feats)] = False
+
+        features_tensor = torch.from_numpy(batch).to(model.device)
+        # Batch 1 không có padding → giữ nguyên đường chạy cũ (không mask)
+        mask_tensor = torch.from_numpy(padding_mask).to(model.device) if len(features) > 1 else None
+
+    with _stage("conformer"), torch.no_grad():
+        logits = model.model(features_tensor, key_padding_mask=mask_tensor)  # (batch, time, num_phonemes)
+        log_probs = F.log_softmax(logits, dim=-1).cpu()
+
+    return [log_probs[i, :n] for i, n in enumerate(lengths)]
+
+
+def _predict_batch_items(
+    items: List[Tuple[np.ndarray, LoadedPronunciationModel]]
+) -> List[torch.Tensor]:
+    # Ngay lúc swap model, một batch có thể lẫn request của hai phiên bản → chạy theo từng nhóm
+    groups: Dict[int, List[int]] = {}
+    for i, (_, model) in enumerate(items):
+        groups.setdefault(model.generation, []).append(i)
+    
+    results: List[Optional[torch.Tensor]] = [None] * len(items)
+    for indices in groups.values():
+        outputs = predict_log_probs_batch([items[i][0] for i in indices], items[indices[0]][1])
+        for i, output in zip(indices, outputs):
+            results[i] = output
+    return results
+
+
+def get_pronunciation_batcher() -> MicroBatcher:
+    """Lazy tạo micro-batcher dùng chung cho mọi request pronunciation (item: (audio, model))"""
+    global _pronunciation_batcher
+    if _pronunciation_batcher is None:
+        with _batcher_lock:
+            if _pronunciation_batcher is None:
+                _pronunciation_batcher = MicroBatcher(
+                    _predict_batch_items,
+                    max_batch_size=settings.pronunciation_batch_max_size,
+                    max_wait_ms=settings.pronunciation_batch_window_ms,
+                    name="pronunciation-batcher"
+                )
+    return _pronunciation_batcher
+
+
+def get_log_prob_cache() -> Optional[LRUCache]:
+    """Cache log-probs dùng chung, None nếu pronunciation_cache_enabled tắt"""
+    global _log_prob_cache
+    if not settings.pronunciation_cache_enabled:
+        return None
+    if _log_prob_cache is None:
+        with _cache_lock:
+            if _log_prob_cache is None:
+                _log_prob_cache = LRUCache(
+                    "pronunciation-log-probs",
+                    max_entries=settings.pronunciation_cache_max_entries,
+                    max_bytes=int(settings.pronunciation_cache_max_mb * 1024 * 1024),
+                    spill_dir=settings.pronunciation_cache_spill_dir or None,
+                    spill_max_bytes=int(settings.pronunciation_cache_spill_max_mb * 1024 * 1024)
+                )
+    return _log_prob_cache
+
+
+def clear_log_prob_cache() -> None:
+    if _log_prob_cache is not None:
+        _log_prob_cache.clear()
+
+
+def log_prob_cache_stats() -> Optional[Dict]:
+    """Thống kê hit/miss của cache log-probs (None nếu tắt)"""
+    cache = get_log_prob_cache()
+    return cache.stats() if cache is not None else None
+
+
+def num_wav2vec2_frames(num_samples: int) -> int:
+    """Số frame Wav2Vec2 (20 ms) cho num_samples mẫu 16kHz"""
+    if num_samples < WAV2VEC2_RECEPTIVE_FIELD:
+        return 0
+    return (num_samples - WAV2VEC2_RECEPTIVE_FIELD) // WAV2VEC2_FRAME_STRIDE + 1
+
+
+def plan_chunks(total_frames: int, window_frames: int, context_frames: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Chia total_frames thành các cửa sổ chồng nhau
+
+    Mỗi cửa sổ gồm phần lõi (core) và context_frames ngữ cảnh mỗi bên; chỉ
+    log-probs của phần lõi được giữ lại, nên các lõi nối liền nhau không trùng lặp.
+
+    Returns:
+        List (chunk_start, chunk_end, core_start, core_end) theo frame toàn cục
+    """
+    context_frames = max(0, min(context_frames, (window_frames - 1) // 2))
+    hop = window_frames - 2 * context_frames
+    chunks = []
+    core_start = 0
+    while core_start < total_frames:
+        core_end = min(total_frames, core_start + hop)
+        chunk_start = max(0, core_start - context_frames)
+        chunk_end = min(total_frames, core_end + context_frames)
+        chunks.append((chunk_start, chunk_end, core_start, core_end))
+        core_start = core_end
+    return chunks
+
+
+def _predict_log_probs_many(
+    audios: List[np.ndarray],
+    model: LoadedPronunciationModel
+) -> List[torch.Tensor]:
+    # Qua micro-batcher nếu bật, nếu không chạy theo nhóm tối đa pronunciation_batch_max_size
+    if settings.pronunciation_batching_enabled:
+        batcher = get_pronunciation_batcher()
+        futures = [batcher.submit((audio, model)) for audio in audios]
+        return [future.result() for future in futures]
+
+    group_size = max(1, settings.pronunciation_batch_max_size)
+    results: List[torch.Tensor] = []
+    for i in range(0, len(audios), group_size):
+        results.extend(predict_log_probs_batch(audios[i:i + group_size], model))
+    return results
+
+
+def _window_frames() -> int:
+    return min(settings.pronunciation_chunk_frames, MAX_CONFORMER_FRAMES)
+
+
+def chunk_windows(audio: np.ndarray) -> Tuple[List[Tuple[int, int, int, int]], List[np.ndarray]]:
+    """
+    Cắt audio thành các cửa sổ theo plan_chunks
+
+    Returns:
+        (chunks của plan_chunks, audio của từng cửa sổ)
+    """
+    total_frames = num_wav2vec2_frames(len(audio))
+    chunks = plan_chunks(total_frames, _window_frames(), settings.pronunciation_chunk_context_frames)
+
+    # Cửa sổ bắt đầu tại bội số của stride → frame của cửa sổ trùng khớp frame toàn cục
+    windows = [
+        audio[chunk_start * WAV2VEC2_FRAME_STRIDE:(chunk_end - 1) * WAV2VEC2_FRAME_STRIDE + WAV2VEC2_RECEPTIVE_FIELD]
+        for chunk_start, chunk_end, _, _ in chunks
+    ]
+    return chunks, windows
+
+
+def join_chunks(chunks: List[Tuple[int, int, int, int]], window_log_probs: Sequence[torch.Tensor]) -> torch.Tensor:
+    """Ghép phần lõi log-probs của từng cửa sổ thành chuỗi liên tục (bỏ phần ngữ cảnh chồng nhau)"""
+    pieces = [
+        log_probs[core_start - chunk_start:core_end - chunk_start]
+        for (chunk_start, _, core_start, core_end), log_probs in zip(chunks, window_log_probs)
+    ]
+    return torch.cat(pieces, dim=0)
+
+
+def predict_log_probs_chunked(
+    audio: np.ndarray,
+    model: Optional[LoadedPronunciationModel] = None
+) -> torch.Tensor:
+    """
+    Log-probabilities cho audio dài hơn pos_emb của Conformer (500 frame ≈ 10 s)
+
+    Audio được cắt thành các cửa sổ chồng nhau (pronunciation_chunk_frames, mỗi bên
+    pronunciation_chunk_context_frames ngữ cảnh), các cửa sổ chạy như một batch, rồi
+    ghép phần lõi của từng cửa sổ thành chuỗi log-probs liên tục để CTC decode.
+    Chi phí tuyến tính theo độ dài, bộ nhớ giới hạn bởi kích thước cửa sổ.
+    """
+    chunks, windows = chunk_windows(audio)
+    return join_chunks(chunks, _predict_log_probs_many(windows, model or current_model()))
+
+
+def predict_log_probs(
+    audio: np.ndarray,
+    model: Optional[LoadedPronunciationModel] = None
+) -> torch.Tensor:
+    """
+    Log-probabilities (T, num_phonemes) cho một audio 16kHz mono, với model (default: current_model())
+
+    Kết quả được cache theo (generation của model, hash PCM) nên cùng bản ghi chỉ chạy model một lần.
+    Khi bật pronunciation_batching_enabled, request được gom chung với các
+    request đồng thời khác qua micro-batcher; nếu không thì chạy batch size 1.
+    Audio dài hơn một cửa sổ (pronunciation_chunk_frames) chạy theo từng đoạn chồng nhau.
+    """
+    model = model or current_model()
+    cache = get_log_prob_cache()
+    if cache is None:
+        return _predict_log_probs_uncached(audio, model)
+    
+    key = (model.generation, pcm_hash(audio))
+    cached = cache.get(key)
+    if cached is not None:
+        return torch.from_numpy(cached)
+    
+    log_probs = _predict_log_probs_uncached(audio, model)
+    # Copy: tensor trả về có thể là view của cả batch đã pad
+    cache.put(key, log_probs.detach().cpu().numpy().copy())
+    return log_probs
+
+
+def _predict_log_probs_uncached(audio: np.ndarray, model: LoadedPronunciationModel) -> torch.Tensor:
+    if num_wav2vec2_frames(len(audio)) > _window_frames():
+        return predict_log_probs_chunked(audio, model)
+    if settings.pronunciation_batching_enabled:
+        return get_pronunciation_batcher().submit((audio, model)).result()
+    return predict_log_probs_batch([audio], model)[0]
+
+
+def _cached_log_probs(cache: LRUCache, model: LoadedPronunciationModel, audio: np.ndarray) -> Tuple[tuple, Any]:
+    key = (model.generation, pcm_hash(audio))
+    return key, cache.get(key)
+
+
+def _submit_to_batcher(audios: List[np.ndarray], model: LoadedPronunciationModel) -> list:
+    """Đưa audio vào micro-batcher; hàng đợi quá dài → 503 giống pool "model" đầy"""
+    batcher = get_pronunciation_batcher()
+    if batcher.pending() >= batcher.max_batch_size + settings.inference_max_queue:
+        logger.warning(f"⚠️ {batcher.name} is full ({batcher.pending()} pending), rejecting request")
+        raise InferenceQueueFullError(batcher.name)
+    return [asyncio.wrap_future(batcher.submit((audio, model))) for audio in audios]
+
+
+async def predict_log_probs_async(
+    audio: np.ndarray,
+    model: Optional[LoadedPronunciationModel] = None
+) -> torch.Tensor:
+    """
+    predict_log_probs cho async handler
+
+    Khi bật micro-batching, future của batcher được await ngay trên event loop (giống
+    Whisper): không giữ thread nào của pool "model" trong lúc chờ gom batch, nên một batch
+    gom được tới pronunciation_batch_max_size request thay vì bị giới hạn bởi inference_workers.
+    Khi tắt batching, predict_log_probs chạy trên pool "model".
+
+    Raises:
+        InferenceQueueFullError: Pool "model" hoặc hàng đợi batcher đã đầy (HTTP 503)
+    """
+    model = model or current_model()
+    if not settings.pronunciation_batching_enabled:
+        return await run_inference(predict_log_probs, audio, model)
+
+    cache = get_log_prob_cache()
+    if cache is not None:
+        # Hash PCM + tầng spill của cache (đọc file) → ngoài event loop
+        key, cached = await asyncio.to_thread(_cached_log_probs, cache, model, audio)
+        if cached is not None:
+            return torch.from_numpy(cached)
+
+    if num_wav2vec2_frames(len(audio)) > _window_frames():
+        chunks, windows = chunk_windows(audio)
+        log_probs = join_chunks(chunks, await asyncio.gather(*_submit_to_batcher(windows, model)))
+    else:
+        log_probs = await _submit_to_batcher([audio], model)[0]
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, log_probs.detach().cpu().numpy().copy())
+    return log_probs
+
+
+def force_align_phonemes(
+    log_probs: torch.Tensor,
+    compiled: CompiledText,
+    time_offset: float = 0.0,
+    model: Optional[LoadedPronunciationModel] = None
+) -> List[PhonemeSegment]:
+    """
+    CTC forced alignment log-probs của Conformer với phoneme mong đợi
+    
+    Args:
+        log_probs: (T, num_phonemes) của cả utterance
+        compiled: compile_expected_text(expected_text, model) - ID theo từ điển của cùng model
+        time_offset: Giây đã cắt ở đầu audio (AudioBuffer.trim_offset_seconds)
+        model: Phiên bản model đã tạo log_probs (default: current_model())
+    
+    Returns:
+        PhonemeSegment cho từng phoneme có trong từ điển model (ký tự lạ bị bỏ qua),
+        rỗng nếu audio quá ngắn so với expected text
+    """
+    blank_id = (model or current_model()).phoneme_to_id.get("<blank>", 0)
+    segments = ctc_forced_align(
+        log_probs.detach().float().cpu().numpy(), compiled.target_ids, blank_id=blank_id
+    )
+    if segments is None:
+        return []
+    
+    frame_seconds = WAV2VEC2_FRAME_STRIDE / 16000
+    result = []
+    for segment in segments:
+        idx = int(compiled.target_indices[segment.token_index])
+        syllable_idx = compiled.syllable_ids[idx]
+        result.append(PhonemeSegment(
+            phoneme=compiled.phonemes[idx],
+            expected_index=idx,
+            word_index=compiled.word_ids[idx],
+            syllable_index=syllable_idx,
+            syllable=compiled.syllables[syllable_idx],
+            start_frame=segment.start_frame,
+            end_frame=segment.end_frame,
+            start_s=round(time_offset + segment.start_frame * frame_seconds, 3),
+            end_s=round(time_offset + segment.end_frame * frame_seconds, 3),
+            gop=round(segment.gop, 4),
+            confidence=round(segment.confidence, 4)
+        ))
+    return result
 
 
 def check_pronunciation(
@@ -414,88 +1357,137 @@ def check_pronunciation(
     Returns:
         PronunciationCheckResult hoặc None nếu có lỗi
     """
-    global _pronunciation_model, _phoneme_to_id, _id_to_phoneme, _model_device, _model_mean, _model_std
+    if current_model() is None:
+        logger.error("Pronunciation model not loaded. Call load_pronunciation_model() first.")
+        return None
+    
+    try:
+        # Load và resample audio về 16kHz mono
+        audio, sr = sf.read(audio_path, dtype="float32")
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if sr != 16000:
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
+    except Exception as e:
+        logger.error(f"Error loading audio for pronunciation check: {e}")
+        return None
+    
+    return check_pronunciation_from_array(audio, expected_text)
+
+
+def check_pronunciation_from_array(
+    audio: np.ndarray,
+    expected_text: str,
+    time_offset: float = 0.0,
+    forced_alignment: Optional[bool] = None,
+    model: Optional[LoadedPronunciationModel] = None
+) -> Optional[PronunciationCheckResult]:
+    """
+    Check pronunciation từ audio đã decode (float32 mono 16kHz)
+    
+    Args:
+        audio: Audio samples 16kHz mono
+        expected_text: Văn bản mong đợi bằng Hangul
+        time_offset: Giây đã cắt ở đầu audio (cộng vào timestamp của phoneme_segments)
+        forced_alignment: Chạy CTC forced alignment (None = settings.pronunciation_forced_alignment)
+        model: Phiên bản model (default: current_model(), giữ nguyên suốt request kể cả khi bị swap)
     
-    if _pronunciation_model is None:
+    Returns:
+        PronunciationCheckResult hoặc None nếu có lỗi
+    """
+    model = model or current_model()
+    if model is None:
         logger.error("Pronunciation model not loaded. Call load_pronunciation_model() first.")
         return None
     
     try:
-        # 1. Load và resample audio
-        audio, sr = sf.read(audio_path)
-        if sr != sample_rate:
-            audio = librosa.resample(audio, orig_sr=sr, target_sr=sample_rate)
-        
-        # 2. Extract Wav2Vec2 features
-        features = extract_wav2vec2_features(audio, sample_rate)
-        
-        # 3. Normalize features
-        features = (features - _model_mean) / (_model_std + 1e-8)
-        features_tensor = torch.tensor(features, dtype=torch.float32).unsqueeze(0).to(_model_device)
-        
-        # 4. Predict phonemes từ audio
-        #    Audio → Wav2Vec2 features → Conformer model → logits → phoneme IDs → phoneme strings
-        with torch.no_grad():
-            logits = _pronunciation_model(features_tensor)  # (batch, time, num_phonemes)
-            log_probs = F.log_softmax(logits, dim=-1)
-            pred_ids = ctc_greedy_decode(log_probs.cpu())[0]  # Decode CTC → phoneme IDs
-            predicted_phonemes = [_id_to_phoneme.get(pid, '?') for pid in pred_ids]  # IDs → phoneme strings (ㄱ, ㅏ, ...)
-        
-        # 5. Get expected phonemes từ expected_text (Hangul)
-        #    Hangul text → phân tích Unicode → phoneme strings (ㄱ, ㅏ, ...)
-        #    Ví dụ: "안녕하세요" → ["ㅇ", "ㅏ", "ㄴ", "ㄴ", "ㅕ", "ㅇ", "ㅎ", "ㅏ", "ㅅ", "ㅔ", "ㅇ", "ㅛ"]
-        expected_phonemes = hangul_g2p(expected_text)
-        expected_phonemes = [p for p in expected_phonemes if p != '<sp>']
-        predicted_phonemes = [p for p in predicted_phonemes if p != '<sp>' and p != '<blank>']
-        
-        # 6. Calculate PER and accuracy
-        edit_dist, details = levenshtein_distance(predicted_phonemes, expected_phonemes)
-        per = edit_dist / max(len(expected_phonemes), 1)
-        phoneme_accuracy = max(0.0, min(100.0, (1.0 - per) * 100))
-        
-        # 7. Find wrong phonemes (simplified alignment)
-        wrong_phonemes = []
-        min_len = min(len(predicted_phonemes), len(expected_phonemes))
-        for i in range(min_len):
-            if predicted_phonemes[i] != expected_phonemes[i]:
-                wrong_phonemes.append((expected_phonemes[i], predicted_phonemes[i]))
-        
-        # 8. Find wrong words (simplified - would need proper alignment)
-        wrong_words = []
-        words = expected_text.split()
-        # Simple heuristic: if PER > 0.2 for a word region, mark as wrong
-        phn_per_word = len(expected_phonemes) / len(words) if words else 0
-        for i, word in enumerate(words):
-            start_idx = int(i * phn_per_word)
-            end_idx = int((i + 1) * phn_per_word)
-            word_exp_phns = expected_phonemes[start_idx:end_idx]
-            word_pred_phns = predicted_phonemes[start_idx:end_idx] if start_idx < len(predicted_phonemes) else []
-            
-            if len(word_exp_phns) > 0:
-                word_edit_dist, _ = levenshtein_distance(word_pred_phns, word_exp_phns)
-                word_per = word_edit_dist / len(word_exp_phns)
-                if word_per > 0.2:  # Threshold
-                    wrong_words.append(word)
-        
-        return PronunciationCheckResult(
-            phoneme_accuracy=round(phoneme_accuracy, 1),
-            per=round(per, 4),
-            expected_phonemes=expected_phonemes,
-            predicted_phonemes=predicted_phonemes,
-            wrong_phonemes=wrong_phonemes[:10],  # Limit to 10
-            wrong_words=wrong_words,
-            matches=details["matches"],
-            substitutions=details["substitutions"],
-            insertions=details["insertions"],
-            deletions=details["deletions"],
-            overall_score=phoneme_accuracy  # Use phoneme accuracy as overall score
-        )
+        # 1-4. Predict phonemes từ audio
+        #    Audio → Wav2Vec2 features → normalize → Conformer model → log-probs
+        #    (đi qua micro-batcher nếu được bật)
+        log_probs = predict_log_probs(audio, model)
+        return score_log_probs(log_probs, expected_text, model, time_offset, forced_alignment)
         
     except Exception as e:
         logger.error(f"Error checking pronunciation: {e}")
         return None
 
 
+def score_log_probs(
+    log_probs: torch.Tensor,
+    expected_text: str,
+    model: LoadedPronunciationModel,
+    time_offset: float = 0.0,
+    forced_alignment: Optional[bool] = None
+) -> PronunciationCheckResult:
+    """
+    Chấm điểm log-probs của model với expected text (CTC decode, G2P, alignment, forced alignment)
+    
+    Args:
+        log_probs: (T, num_phonemes) từ predict_log_probs / predict_log_probs_async
+        expected_text: Văn bản mong đợi bằng Hangul
+        model: Phiên bản model đã tạo log_probs
+        time_offset: Giây đã cắt ở đầu audio
+        forced_alignment: Chạy CTC forced alignment (None = settings.pronunciation_forced_alignment)
+    """
+    # Decode CTC → phoneme IDs → phoneme strings (ㄱ, ㅏ, ...), bỏ <sp>/<blank> (tra bảng NumPy)
+    with _stage("ctc_decode"):
+        predicted_phonemes = decode_phonemes_batch([log_probs], model)[0]
+
+    # 5. Get expected phonemes từ expected_text (Hangul), kèm từ chứa mỗi phoneme
+    #    Hangul text → phân tích Unicode → phoneme strings (ㄱ, ㅏ, ...)
+    #    Ví dụ: "안녕하세요" → ["ㅇ", "ㅏ", "ㄴ", "ㄴ", "ㅕ", "ㅇ", "ㅎ", "ㅏ", "ㅅ", "ㅔ", "ㅇ", "ㅛ"]
+    #    (đã biên dịch sẵn và cache theo text)
+    with _stage("g2p"):
+        compiled = compile_expected_text(expected_text, model)
+    expected_phonemes = list(compiled.phonemes)
+
+    with _stage("alignment"):
+        # 6. Align expected ↔ predicted → PER + S/D/I chính xác
+        alignment = align_sequences(expected_phonemes, predicted_phonemes)
+        per = alignment.distance / max(len(expected_phonemes), 1)
+        phoneme_accuracy = max(0.0, min(100.0, (1.0 - per) * 100))
+
+        aligned_pairs = [
+            (
+                expected_phonemes[ref_idx] if ref_idx is not None else "",
+                predicted_phonemes[hyp_idx] if hyp_idx is not None else ""
+            )
+            for ref_idx, hyp_idx in alignment.pairs
+        ]
+
+        # 7. Wrong phonemes = các cặp bị thay thế trong alignment
+        wrong_phonemes = [
+            pair for pair, op in zip(aligned_pairs, alignment.ops) if op == SUBSTITUTION
+        ]
+
+        # 8. Wrong words: từ có tỷ lệ lỗi phoneme > 20% theo alignment
+        wrong_words = find_wrong_words(alignment, compiled.word_ids, compiled.words)
+
+    # 9. Forced alignment trên cùng log-probs: timestamp + GOP từng phoneme (không chạy lại model)
+    if forced_alignment is None:
+        forced_alignment = settings.pronunciation_forced_alignment
+    phoneme_segments = []
+    if forced_alignment:
+        with _stage("forced_alignment"):
+            phoneme_segments = force_align_phonemes(log_probs, compiled, time_offset=time_offset, model=model)
+
+    return PronunciationCheckResult(
+        phoneme_accuracy=round(phoneme_accuracy, 1),
+        per=round(per, 4),
+        expected_phonemes=expected_phonemes,
+        predicted_phonemes=predicted_phonemes,
+        wrong_phonemes=wrong_phonemes[:10],  # Limit to 10
+        wrong_words=wrong_words,
+        matches=alignment.matches,
+        substitutions=alignment.substitutions,
+        insertions=alignment.insertions,
+        deletions=alignment.deletions,
+        overall_score=phoneme_accuracy,  # Use phoneme accuracy as overall score
+        aligned_pairs=aligned_pairs,
+        phoneme_segments=phoneme_segments
+    )
+
+
 def check_pronunciation_from_bytes(
     audio_bytes: bytes,
     expected_text: str,
@@ -505,6 +1497,8 @@ def check_pronunciation_from_bytes(
     """
     Check pronunciation từ audio bytes (từ UploadFile)
     
+    Audio được decode trực tiếp trong bộ nhớ (không ghi file tạm).
+    
     Args:
         audio_bytes: Audio data as bytes
         expected_text: Văn bản mong đợi bằng Hangul
@@ -515,20 +1509,58 @@ def check_pronunciation_from_bytes(
         PronunciationCheckResult hoặc None
     """
     try:
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_format}") as temp_file:
-            temp_file.write(audio_bytes)
-            temp_path = temp_file.name
-        
-        try:
-            result = check_pronunciation(temp_path, expected_text, sample_rate)
-            return result
-        finally:
-            # Cleanup
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-                
-    except Exception as e:
-        logger.error(f"Error checking pronunciation from bytes: {e}")
+        audio = decode_audio_bytes(audio_bytes, audio_format=audio_format)
+    except AudioDecodeError as e:
+        logger.error(f"Error decoding audio for pronunciation check: {e}")
         return None
+    
+    return check_pronunciation_from_array(audio, expected_text)
+
+
+def check_pronunciation_from_buffer(
+    audio: AudioBuffer,
+    expected_text: str
+) -> Optional[PronunciationCheckResult]:
+    """
+    Check pronunciation từ AudioBuffer dùng chung của request
+    
+    Dùng lại samples đã decode + resample (không decode lại), và ghi thời gian
+    vào audio.timings["pronunciation"].
+    """
+    with audio.stage("pronunciation"):
+        client = get_model_worker_client()
+        if client is not None and current_model() is None:
+            # Model nằm ở process model worker - gửi samples qua IPC
+            return client.check_pronunciation(audio.samples, expected_text, time_offset=audio.trim_offset_seconds)
+        return check_pronunciation_from_array(audio.samples, expected_text, time_offset=audio.trim_offset_seconds)
+
 
+async def check_pronunciation_from_buffer_async(
+    audio: AudioBuffer,
+    expected_text: str
+) -> Optional[PronunciationCheckResult]:
+    """
+    check_pronunciation_from_buffer cho async handler
+    
+    Khi bật micro-batching, Wav2Vec2 + Conformer đi qua predict_log_probs_async (chờ batcher
+    trên event loop), chỉ phần chấm điểm chạy trên pool "model". Các trường hợp khác (tắt
+    batching, model worker) chạy cả check_pronunciation_from_buffer trên pool "model".
+    
+    Raises:
+        InferenceQueueFullError: Pool "model" hoặc hàng đợi batcher đã đầy (HTTP 503)
+    """
+    model = current_model()
+    if not settings.pronunciation_batching_enabled or model is None:
+        return await run_inference(check_pronunciation_from_buffer, audio, expected_text)
+    
+    with audio.stage("pronunciation"):
+        try:
+            log_probs = await predict_log_probs_async(audio.samples, model)
+            return await run_inference(
+                score_log_probs, log_probs, expected_text, model, audio.trim_offset_seconds
+            )
+        except InferenceQueueFullError:
+            raise
+        except Exception as e:
+            logger.error(f"Error checking pronunciation: {e}")
+            return None
@@ -0,0 +1,519 @@
+"""
+Streaming STT - Transcript tạm thời (partial) trong lúc người dùng đang nói (live talk)
+
+POST /api/live-talk/turn chỉ bắt đầu STT khi đã upload xong cả lượt nói. Với
+WS /api/live-talk/stream, client gửi audio theo từng chunk; StreamingTranscriber:
+
+1. Decode tăng dần: mỗi lần chỉ đưa bytes mới vào decoder và nối PCM vào buffer đã decode.
+   PCM thô (pcm_s16le / pcm_f32le) đổi thẳng sang float32, resample bằng soxr.ResampleStream
+   (giữ trạng thái filter giữa các chunk); container (webm/ogg/... từ MediaRecorder) chảy qua
+   một process ffmpeg sống suốt lượt nói. Không có ffmpeg (hoặc MP4 cần input seekable) thì
+   mới decode lại toàn bộ bytes mỗi lần. Giới hạn live_talk_stream_max_seconds tính trên
+   thời lượng đã decode (audio nén nhỏ hơn PCM nhiều lần)
+2. Mỗi live_talk_partial_interval_seconds (nếu có audio mới) chạy local Whisper trên phần
+   chưa chốt (rolling buffer) và trả partial transcript
+3. Phần chưa chốt dài quá live_talk_commit_seconds thì được chốt: cắt tại frame im lặng nhất
+   gần ranh giới, decode một lần cuối, giữ text và bỏ audio đó khỏi buffer. Nhờ vậy mỗi
+   lần decode luôn nằm trong cửa sổ 30 s của Whisper và không tăng theo độ dài lượt nói
+4. Khi người dùng thả mic (finalize), chỉ còn phần đuôi chưa chốt cần decode - nếu không có
+   audio mới từ partial gần nhất thì dùng lại luôn kết quả đó
+
+Local Whisper không dùng được (tắt, không load được model, lỗi) → bỏ partial, finalize
+chuyển cả lượt nói qua transcribe_audio_cheap (STT router) như upload thường.
+"""
+import asyncio
+import io
+import logging
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+from services.audio_service import TARGET_SAMPLE_RATE, AudioBuffer, AudioDecodeError, decode_audio_bytes
+from services.audio_transcoder import FFMPEG_DEMUXERS, SEEKABLE_ONLY_CONTAINERS, container_for, probe_ffmpeg
+from services.inference_executor import run_cpu_bound
+
+logger = logging.getLogger(__name__)
+
+PCM_FORMATS = {"pcm_s16le": np.int16, "pcm_f32le": np.float32}
+
+# Phần đuôi ngắn hơn thế này không đưa vào Whisper (dễ sinh câu "ảo" trên audio quá ngắn)
+MIN_DECODE_SECONDS = 0.3
+# Tìm điểm cắt khi chốt trong khoảng này trước ranh giới live_talk_commit_seconds
+COMMIT_SEARCH_SECONDS = 1.0
+VAD_FRAME_SECONDS = 0.02
+
+
+class StreamConfigError(ValueError):
+    """Message cấu hình đầu tiên của stream không hợp lệ"""
+    pass
+
+
+class StreamLimitError(Exception):
+    """Lượt nói vượt live_talk_stream_max_seconds"""
+    pass
+
+
+class StreamBusyError(Exception):
+    """Đã đủ live_talk_max_streams stream đang mở trong process"""
+    pass
+
+
+_stream_slots: Optional[threading.BoundedSemaphore] = None
+_stream_slots_lock = threading.Lock()
+
+
+def _get_stream_slots() -> threading.BoundedSemaphore:
+    global _stream_slots
+    if _stream_slots is None:
+        with _stream_slots_lock:
+            if _stream_slots is None:
+                _stream_slots = threading.BoundedSemaphore(max(1, settings.live_talk_max_streams))
+    return _stream_slots
+
+
+@dataclass
+class StreamConfig:
+    """
+    Cấu hình một stream, lấy từ message JSON đầu tiên của client
+
+    Attributes:
+        audio_format: "pcm_s16le" / "pcm_f32le" (mono, little-endian) hoặc container
+            (webm, ogg, wav, mp4, ...) - các chunk ghép lại thành một file hoàn chỉnh
+        sample_rate: Sample rate của PCM thô (container tự mang sample rate)
+        language: Mã ngôn ngữ cho Whisper
+    """
+    audio_format: str = "webm"
+    sample_rate: int = TARGET_SAMPLE_RATE
+    language: str = "ko"
+
+    @classmethod
+    def from_message(cls, message: Any) -> "StreamConfig":
+        if not isinstance(message, dict):
+            raise StreamConfigError("First message must be a JSON object")
+        audio_format = str(message.get("format", cls.audio_format)).lower().lstrip(".")
+        language = str(message.get("language", cls.language))
+        try:
+            sample_rate = int(message.get("sample_rate", cls.sample_rate))
+        except (TypeError, ValueError):
+            raise StreamConfigError("sample_rate must be an integer")
+        if not 8000 <= sample_rate <= 48000:
+            raise StreamConfigError("sample_rate must be between 8000 and 48000")
+        return cls(audio_format=audio_format, sample_rate=sample_rate, language=language)
+
+
+# ===== DECODER TĂNG DẦN =====
+# feed(bytes mới) → sample 16kHz mới; finish() → phần còn lại khi hết stream.
+# Decoder giữ trạng thái (filter resample, process ffmpeg) nên chạy qua asyncio.to_thread
+# thay vì run_cpu_bound (không chuyển được sang process pool).
+
+class _PcmStreamDecoder:
+    """PCM thô: chỉ đổi bytes mới, resample liên tục bằng soxr.ResampleStream"""
+
+    def __init__(self, dtype: type, sample_rate: int):
+        self._dtype = np.dtype(dtype)
+        self._remainder = b""
+        self._resampler = None
+        if sample_rate != TARGET_SAMPLE_RATE:
+            import soxr  # Dependency của librosa (resampler mặc định)
+            self._resampler = soxr.ResampleStream(sample_rate, TARGET_SAMPLE_RATE, 1, dtype="float32")
+
+    def _convert(self, data: bytes, last: bool) -> np.ndarray:
+        # Chunk có thể cắt giữa một sample - giữ phần lẻ cho lần sau
+        data = self._remainder + data
+        cut = len(data) - len(data) % self._dtype.itemsize
+        self._remainder = data[cut:]
+        samples = np.frombuffer(data[:cut], dtype=self._dtype)
+        if self._dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        samples = samples.astype(np.float32, copy=False)
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples, last=last)
+        return np.ascontiguousarray(samples, dtype=np.float32)
+
+    async def feed(self, data: bytes) -> np.ndarray:
+        return await asyncio.to_thread(self._convert, data, False)
+
+    async def finish(self) -> np.ndarray:
+        return await asyncio.to_thread(self._convert, b"", True)
+
+    def close(self) -> None:
+        pass
+
+
+class _FfmpegStreamDecoder:
+    """Container qua một process ffmpeg: bytes mới ghi vào stdin, PCM float32 đọc dần từ stdout"""
+
+    def __init__(self, container: Optional[str]):
+        capabilities = probe_ffmpeg()
+        # Không chờ dò stream: PCM ra ngay khi có frame đầu tiên
+        cmd = [capabilities.path, "-hide_banner", "-loglevel", "error", "-fflags", "+nobuffer", "-analyzeduration", "0"]
+        demuxer = FFMPEG_DEMUXERS.get(container or "")
+        if demuxer and demuxer in capabilities.demuxers:
+            cmd += ["-f", demuxer]
+        cmd += ["-i", "pipe:0", "-f", "f32le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "pipe:1"]
+
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._stderr)
+        self._output = bytearray()
+        self._output_lock = threading.Lock()
+        self._produced = 0
+        self._reader = threading.Thread(target=self._read, name="stream-ffmpeg-reader", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while True:
+            block = self._process.stdout.read1(65536)
+            if not block:
+                return
+            with self._output_lock:
+                self._output.extend(block)
+
+    def _take(self) -> np.ndarray:
+        with self._output_lock:
+            cut = len(self._output) - len(self._output) % 4
+            data = bytes(self._output[:cut])
+            del self._output[:cut]
+        self._produced += cut // 4
+        return np.frombuffer(data, dtype=np.float32).copy()
+
+    def _error(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", errors="replace").strip()[:200] or "no output"
+
+    def _write(self, data: bytes) -> np.ndarray:
+        try:
+            self._process.stdin.write(data)
+            self._process.stdin.flush()
+        except (OSError, ValueError):
+            raise AudioDecodeError(f"ffmpeg stream decoder exited: {self._error()}")
+        return self._take()
+
+    def _finish(self) -> np.ndarray:
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(timeout=settings.audio_transcoder_timeout_seconds)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+            raise AudioDecodeError(f"ffmpeg decode timeout ({settings.audio_transcoder_timeout_seconds:.0f}s)")
+        self._reader.join()
+        samples = self._take()
+        if self._process.returncode != 0 and not self._produced:
+            raise AudioDecodeError(f"ffmpeg decode failed: {self._error()}")
+        return samples
+
+    async def feed(self, data: bytes) -> np.ndarray:
+        return await asyncio.to_thread(self._write, data)
+
+    async def finish(self) -> np.ndarray:
+        return await asyncio.to_thread(self._finish)
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._stderr.close()
+
+
+class _RedecodeStreamDecoder:
+    """Không stream được (không có ffmpeg, MP4): decode lại toàn bộ bytes, trả phần sample mới"""
+
+    def __init__(self, audio_format: str):
+        self._audio_format = audio_format
+        self._data = bytearray()
+        self._returned = 0
+
+    async def _decode(self) -> np.ndarray:
+        # Decode / resample là CPU-bound → ngoài event loop
+        samples = await run_cpu_bound(decode_audio_bytes, bytes(self._data), self._audio_format)
+        new = samples[self._returned:]
+        self._returned = max(self._returned, len(samples))
+        return new
+
+    async def feed(self, data: bytes) -> np.ndarray:
+        self._data.extend(data)
+        return await self._decode()
+
+    async def finish(self) -> np.ndarray:
+        return await self._decode()
+
+    def close(self) -> None:
+        pass
+
+
+def open_stream_decoder(config: StreamConfig, head: bytes):
+    """Decoder tăng dần cho stream; head là các bytes đầu tiên (nhận diện container)"""
+    dtype = PCM_FORMATS.get(config.audio_format)
+    if dtype is not None:
+        return _PcmStreamDecoder(dtype, config.sample_rate)
+    container = container_for(head, config.audio_format)
+    if probe_ffmpeg().available and container not in SEEKABLE_ONLY_CONTAINERS:
+        try:
+            return _FfmpegStreamDecoder(container)
+        except OSError as e:
+            logger.warning(f"⚠️ Streaming STT: cannot start ffmpeg ({e}), re-decoding the whole stream instead")
+    return _RedecodeStreamDecoder(config.audio_format)
+
+
+def quietest_point(samples: np.ndarray, start: int, end: int) -> int:
+    """Vị trí (sample) giữa frame có năng lượng thấp nhất trong [start, end)"""
+    frame = int(VAD_FRAME_SECONDS * TARGET_SAMPLE_RATE)
+    start = max(0, start)
+    n_frames = (end - start) // frame
+    if n_frames <= 0:
+        return end
+    frames = samples[start:start + n_frames * frame].reshape(n_frames, frame)
+    energy = np.mean(frames * frames, axis=1)
+    return start + int(np.argmin(energy)) * frame + frame // 2
+
+
+def _local_whisper_usable() -> bool:
+    """Local Whisper được bật và circuit breaker của nó (STT router) không đang mở"""
+    from services import stt_service
+    from services.stt_router import OPEN, get_backend_health
+
+    health = get_backend_health("local-whisper")
+    return stt_service.USE_LOCAL_WHISPER and (health is None or health.state != OPEN)
+
+
+class StreamingTranscriber:
+    """
+    Trạng thái STT của một lượt nói đang stream
+
+    Giữ một slot live_talk_max_streams (decoder, process ffmpeg) từ lúc tạo tới close().
+
+    Args:
+        config: StreamConfig của stream
+        endpoint: Tên endpoint (thống kê transcript cache khi finalize qua STT router)
+
+    Raises:
+        StreamBusyError: Không còn slot stream
+    """
+
+    def __init__(self, config: StreamConfig, endpoint: str = "live-talk-stream"):
+        if not _get_stream_slots().acquire(blocking=False):
+            raise StreamBusyError(f"Too many live streams ({settings.live_talk_max_streams}), try again shortly")
+        self._holds_slot = True
+        self.config = config
+        self.endpoint = endpoint
+        # Bytes chưa đưa vào decoder; trần bộ nhớ theo kích thước PCM float32 (audio nén luôn nhỏ hơn)
+        self._pending = bytearray()
+        self._received_bytes = 0
+        self._max_bytes = int(settings.live_talk_stream_max_seconds * config.sample_rate * 4)
+        self._max_samples = int(settings.live_talk_stream_max_seconds * TARGET_SAMPLE_RATE)
+        self._decoder = None
+        # PCM đã decode: _buffer[:_num_samples] (tăng dung lượng gấp đôi khi đầy)
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._num_samples = 0
+        # Audio trước _committed_samples đã chốt thành _committed_texts
+        self._committed_samples = 0
+        self._committed_texts: List[str] = []
+        # Partial gần nhất: (tổng số sample, _committed_samples lúc đó, text phần đuôi)
+        self._last_partial: Optional[tuple] = None
+        self._last_partial_at = 0.0
+        self._local_available = _local_whisper_usable()
+        self.partials = 0
+        self.whisper_seconds = 0.0
+
+    @property
+    def partials_enabled(self) -> bool:
+        """False khi local Whisper không dùng được - chỉ có transcript final (qua STT router)"""
+        return self._local_available
+
+    def add_chunk(self, chunk: bytes) -> None:
+        """
+        Thêm một chunk audio
+
+        Raises:
+            StreamLimitError: Audio đã decode dài quá live_talk_stream_max_seconds (kiểm tra sau
+                mỗi lần decode), hoặc bytes nhận vượt trần bộ nhớ
+        """
+        if self._num_samples > self._max_samples or self._received_bytes + len(chunk) > self._max_bytes:
+            raise StreamLimitError(
+                f"Turn longer than {settings.live_talk_stream_max_seconds:.0f}s of audio"
+            )
+        self._pending.extend(chunk)
+        self._received_bytes += len(chunk)
+
+    def partial_due(self) -> bool:
+        """
+        Có audio mới và đã đủ live_talk_partial_interval_seconds kể từ lần trước
+
+        Vẫn đến hạn khi local Whisper không dùng được: partial() khi đó chỉ decode (để kiểm tra
+        giới hạn thời lượng và finalize không phải decode cả lượt nói).
+        """
+        return (
+            bool(self._pending)
+            and time.monotonic() - self._last_partial_at >= settings.live_talk_partial_interval_seconds
+        )
+
+    def _append(self, samples: np.ndarray) -> None:
+        needed = self._num_samples + len(samples)
+        if needed > len(self._buffer):
+            grown = np.zeros(max(needed, 2 * len(self._buffer)), dtype=np.float32)
+            grown[:self._num_samples] = self._buffer[:self._num_samples]
+            self._buffer = grown
+        self._buffer[self._num_samples:needed] = samples
+        self._num_samples = needed
+
+    async def _decode(self) -> np.ndarray:
+        """Đưa bytes mới vào decoder, trả về toàn bộ PCM đã decode"""
+        if self._pending:
+            data = bytes(self._pending)
+            self._pending.clear()
+            if self._decoder is None:
+                self._decoder = open_stream_decoder(self.config, data)
+            self._append(await self._decoder.feed(data))
+        return self._buffer[:self._num_samples]
+
+    async def _decode_all(self) -> np.ndarray:
+        """_decode rồi lấy nốt phần decoder còn giữ (hết stream)"""
+        await self._decode()
+        if self._decoder is None:
+            if self.config.audio_format not in PCM_FORMATS:
+                raise AudioDecodeError("Audio is empty")
+            return self._buffer[:0]
+        self._append(await self._decoder.finish())
+        return self._buffer[:self._num_samples]
+
+    def close(self) -> None:
+        """Giải phóng decoder (dừng ffmpeg nếu stream kết thúc giữa chừng) và slot stream"""
+        if self._decoder is not None:
+            self._decoder.close()
+        if self._holds_slot:
+            self._holds_slot = False
+            _get_stream_slots().release()
+
+    async def _whisper(self, audio: np.ndarray) -> str:
+        from services import stt_service
+
+        started = time.perf_counter()
+        try:
+            return (await stt_service._local_whisper_transcribe(audio, self.config.language) or "").strip()
+        finally:
+            self.whisper_seconds += time.perf_counter() - started
+
+    async def _commit(self, samples: np.ndarray) -> None:
+        """Chốt phần đầu của buffer chưa chốt cho tới khi phần còn lại ≤ live_talk_commit_seconds"""
+        commit_samples = int(settings.live_talk_commit_seconds * TARGET_SAMPLE_RATE)
+        search = int(COMMIT_SEARCH_SECONDS * TARGET_SAMPLE_RATE)
+        while len(samples) - self._committed_samples > commit_samples:
+            boundary = self._committed_samples + commit_samples
+            split = quietest_point(samples, max(self._committed_samples, boundary - search), boundary)
+            text = await self._whisper(samples[self._committed_samples:split])
+            if text:
+                self._committed_texts.append(text)
+            self._committed_samples = split
+
+    def _text(self, tail_text: str) -> str:
+        return " ".join(text for text in self._committed_texts + [tail_text] if text)
+
+    async def _tail_text(self, samples: np.ndarray) -> str:
+        await self._commit(samples)
+        tail = samples[self._committed_samples:]
+        if len(tail) < MIN_DECODE_SECONDS * TARGET_SAMPLE_RATE:
+            return ""
+        return await self._whisper(tail)
+
+    async def partial(self) -> Optional[Dict[str, Any]]:
+        """
+        Decode audio mới rồi chạy local Whisper trên phần chưa chốt
+
+        Returns:
+            {"text", "committed_text", "audio_seconds"} hoặc None nếu chưa decode được audio
+            hoặc local Whisper không dùng được (finalize sẽ dùng STT router)
+        """
+        self._last_partial_at = time.monotonic()
+        try:
+            samples = await self._decode()
+        except AudioDecodeError as e:
+            # Container mới nhận vài chunk đầu thường chưa decode được
+            logger.debug(f"Stream audio not decodable yet ({self._received_bytes} bytes): {e}")
+            return None
+        if not self._local_available or not len(samples):
+            return None
+        try:
+            tail_text = await self._tail_text(samples)
+        except Exception as e:
+            logger.warning(f"⚠️ Streaming STT: local Whisper unavailable, partials disabled: {e}")
+            self._local_available = False
+            return None
+        self._last_partial = (len(samples), self._committed_samples, tail_text)
+        self.partials += 1
+        return {
+            "text": self._text(tail_text),
+            "committed_text": self._text(""),
+            "audio_seconds": round(len(samples) / TARGET_SAMPLE_RATE, 2),
+        }
+
+    async def finalize(self) -> Dict[str, Any]:
+        """
+        Transcript cuối cùng của lượt nói
+
+        Returns:
+            {"text", "audio_seconds", "backend", "reused_partial", "partials", "finalize_ms"}
+
+        Raises:
+            AudioDecodeError: Không decode được audio đã nhận
+            HTTPException: Từ transcribe_audio_cheap khi mọi backend STT đều lỗi
+        """
+        started = time.perf_counter()
+        try:
+            samples = await self._decode_all()
+        finally:
+            self.close()
+        reused = False
+        text: Optional[str] = None
+        backend = "local-whisper"
+
+        if self._local_available:
+            if self._last_partial is not None and self._last_partial[:2] == (len(samples), self._committed_samples):
+                # Không có audio mới từ partial gần nhất - phần đuôi đã decode xong
+                text, reused = self._text(self._last_partial[2]), True
+            else:
+                try:
+                    text = self._text(await self._tail_text(samples))
+                except Exception as e:
+                    logger.warning(f"⚠️ Streaming STT: local Whisper failed at finalize: {e}")
+                    self._local_available = False
+
+        if text is None:
+            text = await self._transcribe_full(samples)
+            backend = "stt-router"
+
+        logger.info(
+            f"🎙️ Streamed turn finalized: {len(samples) / TARGET_SAMPLE_RATE:.1f}s audio, "
+            f"{self.partials} partial(s), reused_partial={reused}"
+        )
+        return {
+            "text": text,
+            "audio_seconds": round(len(samples) / TARGET_SAMPLE_RATE, 2),
+            "backend": backend,
+            "reused_partial": reused,
+            "partials": self.partials,
+            "whisper_ms": round(self.whisper_seconds * 1000, 1),
+            "finalize_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    async def _transcribe_full(self, samples: np.ndarray) -> str:
+        """Cả lượt nói qua STT router (Google STT / OpenAI Whisper khi local Whisper không dùng được)"""
+        import soundfile as sf
+        from starlette.datastructures import UploadFile
+
+        from services.stt_service import transcribe_audio_cheap
+
+        wav = io.BytesIO()
+        sf.write(wav, samples, TARGET_SAMPLE_RATE, format="WAV", subtype="PCM_16")
+        content = wav.getvalue()
+        audio = AudioBuffer(samples=samples, source_bytes=content, audio_format="wav")
+        upload = UploadFile(file=io.BytesIO(content), filename="stream.wav")
+        return await transcribe_audio_cheap(upload, self.config.language, audio=audio, endpoint=self.endpoint)
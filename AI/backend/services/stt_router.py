@@ -0,0 +1,312 @@
+"""
+STT Router - Registry backend Speech-to-Text, chọn backend theo chi phí + latency, circuit breaker
+
+Trước đây transcribe_audio_cheap thử cố định local Whisper → Google STT → OpenAI: khi local
+Whisper hỏng, mọi request đều chờ hết lỗi/timeout của nó rồi mới fallback. Router:
+
+1. Mỗi backend (SttBackend) đăng ký kèm mức chi phí (free / cheap / paid) và key phiên bản
+   dùng cho transcript cache
+2. Theo dõi latency + tỉ lệ lỗi trên cửa sổ trượt (stt_latency_window request gần nhất)
+3. stt_breaker_failure_threshold lỗi liên tiếp → mở circuit: bỏ qua backend trong
+   stt_breaker_cooldown_seconds, sau đó cho đúng một request thử (half-open); thành công → đóng
+4. Chính sách chi phí: backend có chi phí ≤ stt_primary_max_cost được xếp theo latency
+   (nhanh nhất trước, backend chưa có số liệu được thử theo thứ tự đăng ký); backend đắt hơn,
+   tới stt_max_cost, chỉ dùng làm fallback theo thứ tự chi phí
+
+Backend trả transcript rỗng không tính là lỗi (người dùng có thể im lặng) nhưng router vẫn thử
+backend tiếp theo. Trạng thái health là của từng process (xem /health).
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import UploadFile
+
+from config import settings
+from services.audio_service import AudioBuffer
+
+logger = logging.getLogger(__name__)
+
+# Mức chi phí của backend
+FREE = "free"
+CHEAP = "cheap"
+PAID = "paid"
+COST_LEVELS = {FREE: 0, CHEAP: 1, PAID: 2}
+
+# Trạng thái circuit breaker
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class SttBackendSkipped(Exception):
+    """Backend không áp dụng cho request này (vd audio không decode được) - không tính là lỗi"""
+    pass
+
+
+class SttUnavailableError(Exception):
+    """Không backend nào trả về transcript; errors: tên backend → lỗi (hoặc lý do bỏ qua)"""
+
+    def __init__(self, errors: Dict[str, str]):
+        self.errors = errors
+        super().__init__(
+            "; ".join(f"{name}: {error}" for name, error in errors.items()) or "no STT backend available"
+        )
+
+
+@dataclass
+class SttRequest:
+    """Input chung cho mọi backend của một request transcribe"""
+    file: UploadFile
+    content: bytes
+    language: str
+    audio: Optional[AudioBuffer] = None
+    endpoint: str = "stt"
+
+
+@dataclass
+class SttBackend:
+    """
+    Một backend STT trong registry
+
+    Attributes:
+        name: Tên hiển thị (/health, log)
+        cache_key: Backend + phiên bản model, dùng làm key của transcript cache
+        cost: FREE / CHEAP / PAID
+        transcribe: async (SttRequest) → transcript (None/rỗng nếu không nghe được gì);
+            raise khi lỗi để router ghi nhận
+        is_enabled: Backend có được cấu hình không (kiểm tra mỗi request)
+        timeout_seconds: Timeout riêng (None = stt_backend_timeout_seconds)
+    """
+    name: str
+    cache_key: str
+    cost: str
+    transcribe: Callable[[SttRequest], Awaitable[Optional[str]]]
+    is_enabled: Callable[[], bool] = lambda: True
+    timeout_seconds: Optional[float] = None
+
+
+class BackendHealth:
+    """Latency + lỗi trên cửa sổ trượt và circuit breaker của một backend"""
+
+    def __init__(self, name: str, window: int, failure_threshold: int, cooldown_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_seconds = cooldown_seconds
+        self._samples: Deque[Tuple[float, bool]] = deque(maxlen=max(1, window))  # (latency_s, ok)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+        self._requests = 0
+        self._failures = 0
+        self._rejected = 0
+
+    def allow_request(self) -> bool:
+        """Circuit đóng, hoặc đã hết cooldown và chưa có request thử nào đang chạy"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self, latency_s: float) -> None:
+        with self._lock:
+            self._samples.append((latency_s, True))
+            self._requests += 1
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"✅ STT backend {self.name} recovered, circuit closed")
+            self.state = CLOSED
+            self.opened_at = None
+
+    def record_failure(self, latency_s: float, error: str) -> None:
+        with self._lock:
+            self._samples.append((latency_s, False))
+            self._requests += 1
+            self._failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(
+                        f"🚫 STT backend {self.name} circuit opened after {self.consecutive_failures} "
+                        f"failure(s), retry in {self.cooldown_seconds:.0f}s"
+                    )
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """Request thử bị bỏ qua hoặc huỷ - cho request sau thử lại"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def latency_estimate(self) -> Optional[float]:
+        """Median latency (giây) của các request thành công gần đây, None nếu chưa có"""
+        with self._lock:
+            latencies = [latency for latency, ok in self._samples if ok]
+        return float(np.median(latencies)) if latencies else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = list(self._samples)
+            state = self.state
+            opened_at = self.opened_at
+            report = {
+                "consecutive_failures": self.consecutive_failures,
+                "last_error": self.last_error,
+                "requests": self._requests,
+                "failures": self._failures,
+                "rejected_by_breaker": self._rejected,
+            }
+        latencies_ms = [latency * 1000 for latency, ok in samples if ok]
+        report.update(
+            circuit=state,
+            retry_in_s=(
+                round(max(0.0, self.cooldown_seconds - (time.monotonic() - opened_at)), 1)
+                if state == OPEN and opened_at is not None else None
+            ),
+            window=len(samples),
+            error_rate=round(sum(1 for _, ok in samples if not ok) / len(samples), 4) if samples else 0.0,
+            p50_ms=round(float(np.percentile(latencies_ms, 50)), 1) if latencies_ms else None,
+            p90_ms=round(float(np.percentile(latencies_ms, 90)), 1) if latencies_ms else None,
+        )
+        return report
+
+
+_backends: Dict[str, SttBackend] = {}
+_health: Dict[str, BackendHealth] = {}
+_registry_lock = threading.Lock()
+
+
+def register_stt_backend(backend: SttBackend) -> None:
+    """Thêm (hoặc thay) backend; thứ tự đăng ký là thứ tự ưu tiên khi chưa có số liệu latency"""
+    with _registry_lock:
+        _backends[backend.name] = backend
+        if backend.name not in _health:
+            _health[backend.name] = BackendHealth(
+                backend.name,
+                settings.stt_latency_window,
+                settings.stt_breaker_failure_threshold,
+                settings.stt_breaker_cooldown_seconds
+            )
+
+
+def get_backend_health(name: str) -> Optional[BackendHealth]:
+    return _health.get(name)
+
+
+def plan_backends() -> List[SttBackend]:
+    """
+    Backend đã bật theo thứ tự sẽ thử (chưa xét circuit breaker)
+
+    Backend có chi phí ≤ stt_primary_max_cost: nhanh nhất trước (chưa có số liệu → ưu tiên
+    thử để đo). Sau đó các backend đắt hơn tới stt_max_cost, rẻ trước.
+    """
+    primary_max = COST_LEVELS[settings.stt_primary_max_cost]
+    max_cost = COST_LEVELS[settings.stt_max_cost]
+    with _registry_lock:
+        enabled = [
+            (index, backend) for index, backend in enumerate(_backends.values())
+            if COST_LEVELS[backend.cost] <= max_cost and backend.is_enabled()
+        ]
+
+    def latency_rank(item: Tuple[int, SttBackend]) -> Tuple[float, int]:
+        index, backend = item
+        latency = _health[backend.name].latency_estimate()
+        return (latency if latency is not None else 0.0, index)
+
+    primary = sorted(
+        (item for item in enabled if COST_LEVELS[item[1].cost] <= primary_max), key=latency_rank
+    )
+    fallback = sorted(
+        (item for item in enabled if COST_LEVELS[item[1].cost] > primary_max),
+        key=lambda item: (COST_LEVELS[item[1].cost], item[0])
+    )
+    return [backend for _, backend in primary + fallback]
+
+
+async def route_transcription(request: SttRequest) -> Tuple[str, SttBackend]:
+    """
+    Thử lần lượt các backend theo plan_backends(), bỏ qua backend đang mở circuit
+
+    Returns:
+        (transcript, backend đã trả về transcript)
+
+    Raises:
+        SttUnavailableError: Mọi backend lỗi, bị bỏ qua hoặc trả transcript rỗng
+    """
+    errors: Dict[str, str] = {}
+    for backend in plan_backends():
+        health = _health[backend.name]
+        if not health.allow_request():
+            errors[backend.name] = "circuit open"
+            continue
+
+        timeout = backend.timeout_seconds or settings.stt_backend_timeout_seconds
+        started = time.perf_counter()
+        try:
+            transcript = await asyncio.wait_for(backend.transcribe(request), timeout=timeout)
+        except asyncio.CancelledError:
+            # Client ngắt kết nối - không phải lỗi của backend
+            health.release_trial()
+            raise
+        except SttBackendSkipped as e:
+            health.release_trial()
+            errors[backend.name] = f"skipped: {e}"
+            logger.warning(f"⚠️ STT backend {backend.name} skipped: {e}")
+            continue
+        except asyncio.TimeoutError:
+            health.record_failure(time.perf_counter() - started, f"timeout after {timeout:.0f}s")
+            errors[backend.name] = f"timeout after {timeout:.0f}s"
+            logger.warning(f"⚠️ STT backend {backend.name} timed out after {timeout:.0f}s")
+            continue
+        except Exception as e:
+            health.record_failure(time.perf_counter() - started, str(e)[:200])
+            errors[backend.name] = str(e)
+            logger.warning(f"⚠️ STT backend {backend.name} failed: {e}")
+            continue
+
+        health.record_success(time.perf_counter() - started)
+        if transcript and transcript.strip():
+            logger.info(f"✅ Transcribed with {backend.name} ({backend.cost})")
+            return transcript.strip(), backend
+        errors[backend.name] = "empty transcript"
+        logger.warning(f"⚠️ STT backend {backend.name} returned empty transcript")
+
+    raise SttUnavailableError(errors)
+
+
+def stt_backend_report() -> Dict[str, Any]:
+    """Chính sách + health từng backend (cho /health)"""
+    with _registry_lock:
+        backends = list(_backends.values())
+    order = [backend.name for backend in plan_backends()]
+    return {
+        "primary_max_cost": settings.stt_primary_max_cost,
+        "max_cost": settings.stt_max_cost,
+        "order": order,
+        "backends": {
+            backend.name: {
+                "cost": backend.cost,
+                "version": backend.cache_key,
+                "routable": backend.name in order,
+                **_health[backend.name].snapshot(),
+            }
+            for backend in backends
+        },
+    }
@@ -2,24 +2,55 @@
 STT Service - Speech-to-Text using local Whisper or Google STT
 Giảm chi phí bằng cách không dùng OpenAI Whisper API
 """
+import asyncio
 import logging
 import os
-import tempfile
-import subprocess
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 from fastapi import UploadFile, HTTPException
 
+from config import settings
+from services.audio_service import AudioBuffer, AudioDecodeError, decode_audio_bytes
+from services.batching import MicroBatcher
+from services.inference_executor import InferenceQueueFullError, run_inference, run_remote_call
+from services.model_worker import get_model_worker_client
+from services.openai_service import OPENAI_WHISPER_BACKEND
+from services.stt_router import (
+    CHEAP,
+    FREE,
+    PAID,
+    SttBackend,
+    SttBackendSkipped,
+    SttRequest,
+    SttUnavailableError,
+    plan_backends,
+    register_stt_backend,
+    route_transcription,
+)
+from services.transcript_cache import audio_fingerprint, get_transcript_cache
+
 logger = logging.getLogger(__name__)
 
 # Try to use local Whisper first, fallback to Google STT
 USE_LOCAL_WHISPER = os.getenv("USE_LOCAL_WHISPER", "true").lower() == "true"
 USE_GOOGLE_STT = os.getenv("USE_GOOGLE_STT", "false").lower() == "true"
+WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "openai/whisper-tiny")  # tiny is fastest, base is better
+
+# Backend STT + phiên bản trong key của transcript cache
+LOCAL_WHISPER_BACKEND = f"local-whisper/{WHISPER_MODEL_NAME}"
+GOOGLE_STT_BACKEND = "google-stt/default"
 
 # Global Whisper model (loaded once)
 _whisper_model = None
 _whisper_processor = None
 
+# Micro-batcher cho local Whisper (item: (audio, language)), tạo khi cần
+_whisper_batcher: Optional[MicroBatcher] = None
+_whisper_batcher_lock = threading.Lock()
+
 
 def _load_whisper_local():
     """Load local Whisper model (tiny or base)"""
@@ -32,11 +63,9 @@ def _load_whisper_local():
         from transformers import WhisperProcessor, WhisperForConditionalGeneration
         import torch
         
-        model_name = os.getenv("WHISPER_MODEL", "openai/whisper-tiny")  # tiny is fastest, base is better
-        
-        logger.info(f"Loading local Whisper model: {model_name}")
-        _whisper_processor = WhisperProcessor.from_pretrained(model_name)
-        _whisper_model = WhisperForConditionalGeneration.from_pretrained(model_name)
+        logger.info(f"Loading local Whisper model: {WHISPER_MODEL_NAME}")
+        _whisper_processor = WhisperProcessor.from_pretrained(WHISPER_MODEL_NAME)
+        _whisper_model = WhisperForConditionalGeneration.from_pretrained(WHISPER_MODEL_NAME)
         
         # Use CPU by default (can use GPU if available)
         device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -54,65 +83,173 @@ def _load_whisper_local():
         return False
 
 
-def _convert_audio_to_wav(input_path: str, output_path: Optional[str] = None) -> Optional[str]:
+def _whisper_generate_batch(items: List[Tuple[np.ndarray, str]]) -> List[Optional[str]]:
+    """
+    Chạy Whisper generate một lượt cho nhiều audio
+
+    Processor pad (hoặc cắt) mọi audio về log-mel 30 s nên input ghép batch trực tiếp.
+    language áp dụng cho cả lượt generate → request khác ngôn ngữ chạy theo từng nhóm.
+    Model phải được load trước bằng _load_whisper_local().
+
+    Args:
+        items: List (audio float32 mono 16kHz, language)
+
+    Returns:
+        Transcript đã strip (None nếu rỗng), cùng thứ tự với items
+    """
+    import torch
+
+    groups: Dict[str, List[int]] = {}
+    for i, (_, language) in enumerate(items):
+        groups.setdefault(language, []).append(i)
+
+    device = next(_whisper_model.parameters()).device
+    results: List[Optional[str]] = [None] * len(items)
+    for language, indices in groups.items():
+        inputs = _whisper_processor(
+            [items[i][0] for i in indices],
+            sampling_rate=16000,
+            return_tensors="pt"
+        )
+        with torch.no_grad():
+            generated_ids = _whisper_model.generate(
+                inputs["input_features"].to(device),
+                language=language,
+                task="transcribe"
+            )
+        transcriptions = _whisper_processor.batch_decode(generated_ids, skip_special_tokens=True)
+        for i, transcription in zip(indices, transcriptions):
+            results[i] = transcription.strip() or None
+    return results
+
+
+def get_whisper_batcher() -> MicroBatcher:
+    """Lazy tạo micro-batcher dùng chung cho mọi request local Whisper"""
+    global _whisper_batcher
+    if _whisper_batcher is None:
+        with _whisper_batcher_lock:
+            if _whisper_batcher is None:
+                _whisper_batcher = MicroBatcher(
+                    _whisper_generate_batch,
+                    max_batch_size=settings.whisper_batch_max_size,
+                    max_wait_ms=settings.whisper_batch_max_wait_ms,
+                    name="whisper-batcher"
+                )
+    return _whisper_batcher
+
+
+def _log_transcription(transcription: Optional[str]) -> Optional[str]:
+    if not transcription:
+        logger.warning("Local Whisper returned empty transcription")
+        return None
+    logger.info(f"✅ Local Whisper transcription: '{transcription[:100]}...'")
+    return transcription
+
+
+def _transcribe_array_local(audio, language: str) -> Optional[str]:
+    """
+    Chạy local Whisper trên audio đã decode (float32 mono 16kHz)
+    
+    Model phải được load trước bằng _load_whisper_local(). Khi bật whisper_batching_enabled,
+    request được gom chung với các request đồng thời khác qua micro-batcher.
+    """
+    if audio is None or len(audio) == 0:
+        logger.error("Audio file is empty or invalid")
+        return None
+    
+    logger.info(f"Audio loaded: {len(audio)} samples at 16000Hz")
+    
+    if settings.whisper_batching_enabled:
+        transcription = get_whisper_batcher().submit((audio, language)).result()
+    else:
+        transcription = _whisper_generate_batch([(audio, language)])[0]
+    return _log_transcription(transcription)
+
+
+def _transcribe_array_blocking(audio, language: str) -> Optional[str]:
+    """Load Whisper (nếu chưa load) rồi transcribe - chạy trong worker thread"""
+    if not _load_whisper_local():
+        logger.warning("Local Whisper model not loaded")
+        return None
+    return _transcribe_array_local(audio, language)
+
+
+def _submit_to_whisper_batcher(audio, language: str):
+    """Đưa audio vào batcher Whisper; hàng đợi quá dài → 503 giống pool "model" đầy"""
+    batcher = get_whisper_batcher()
+    if batcher.pending() >= batcher.max_batch_size + settings.inference_max_queue:
+        logger.warning(f"⚠️ {batcher.name} is full ({batcher.pending()} pending), rejecting request")
+        raise InferenceQueueFullError(batcher.name)
+    return asyncio.wrap_future(batcher.submit((audio, language)))
+
+
+async def _local_whisper_transcribe(audio, language: str) -> Optional[str]:
+    """
+    transcribe_array_with_local_whisper nhưng raise khi lỗi (cho STT router)
+
+    Raises:
+        InferenceQueueFullError: Pool "model" hoặc hàng đợi batcher Whisper đã đầy
+    """
+    client = get_model_worker_client()
+    if client is not None:
+        # Whisper nằm ở process model worker
+        return await run_inference(client.transcribe, audio, language)
+    # Load model + generate đều blocking → chạy trên inference pool
+    if _whisper_model is None and not await run_inference(_load_whisper_local):
+        raise RuntimeError("Local Whisper model not loaded")
+    if settings.whisper_batching_enabled and audio is not None and len(audio):
+        # Chờ batcher ngay trên event loop: không giữ slot inference pool trong lúc gom batch
+        # (nếu không, số request gom được bị giới hạn bởi inference_workers)
+        return _log_transcription(await _submit_to_whisper_batcher(audio, language))
+    return await run_inference(_transcribe_array_local, audio, language)
+
+
+async def transcribe_array_with_local_whisper(
+    audio,
+    language: str = "ko"
+) -> Optional[str]:
     """
-    Convert audio file to WAV format using ffmpeg (if available)
+    Transcribe audio đã decode trong bộ nhớ bằng local Whisper (FREE)
     
     Args:
-        input_path: Path to input audio file
-        output_path: Path to output WAV file (auto-generated if None)
+        audio: numpy float32 mono 16kHz (từ audio_service.decode_audio_bytes)
+        language: Language code (ko, vi, en, etc.)
     
     Returns:
-        Path to converted WAV file, or None if conversion failed
+        Transcribed text or None if error
     """
-    if output_path is None:
-        output_path = input_path.rsplit('.', 1)[0] + '_converted.wav'
-    
     try:
-        # Check if ffmpeg is available
-        subprocess.run(['ffmpeg', '-version'], 
-                      capture_output=True, 
-                      check=True,
-                      timeout=5)
-    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-        logger.warning("ffmpeg not found. Cannot convert audio formats.")
+        return await _local_whisper_transcribe(audio, language)
+    except ImportError as e:
+        logger.error(f"Missing dependency for local Whisper: {e}")
+        logger.info("Install with: pip install transformers torch")
         return None
-    
+    except Exception as e:
+        logger.error(f"Error in local Whisper transcription: {e}", exc_info=True)
+        return None
+
+
+def _transcribe_file_blocking(audio_file_path: str, language: str = "ko") -> Optional[str]:
+    """Load Whisper + decode file + generate - chạy trong worker thread"""
     try:
-        # Convert to WAV using ffmpeg
-        # -y: overwrite output file
-        # -ar 16000: set sample rate to 16kHz
-        # -ac 1: convert to mono
-        # -f wav: output format WAV
-        cmd = [
-            'ffmpeg',
-            '-i', input_path,
-            '-ar', '16000',  # Sample rate 16kHz
-            '-ac', '1',      # Mono
-            '-f', 'wav',     # Format WAV
-            '-y',            # Overwrite output
-            output_path
-        ]
+        if not _load_whisper_local():
+            logger.warning("Local Whisper model not loaded")
+            return None
         
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30  # 30 second timeout
-        )
+        # Decoder chọn theo magic bytes (soundfile hoặc ffmpeg qua pipe) - không file trung gian
+        path = Path(audio_file_path)
+        audio = decode_audio_bytes(path.read_bytes(), audio_format=path.suffix)
+        return _transcribe_array_local(audio, language)
         
-        if result.returncode == 0 and os.path.exists(output_path):
-            logger.info(f"✅ Converted audio to WAV: {output_path}")
-            return output_path
-        else:
-            logger.error(f"ffmpeg conversion failed: {result.stderr}")
-            return None
-            
-    except subprocess.TimeoutExpired:
-        logger.error("ffmpeg conversion timeout")
+    except (OSError, AudioDecodeError) as e:
+        logger.error(f"Could not load audio for local Whisper: {e}")
+        return None
+    except ImportError as e:
+        logger.error(f"Missing dependency for local Whisper: {e}")
+        logger.info("Install with: pip install transformers torch soundfile")
         return None
     except Exception as e:
-        logger.error(f"Error converting audio: {e}")
+        logger.error(f"Error in local Whisper transcription: {e}", exc_info=True)
         return None
 
 
@@ -130,107 +267,11 @@ async def transcribe_with_local_whisper(
     Returns:
         Transcribed text or None if error
     """
-    converted_path = None
     try:
-        if not _load_whisper_local():
-            logger.warning("Local Whisper model not loaded")
-            return None
-        
-        import librosa
-        import torch
-        import numpy as np
-        import warnings
-        
-        # Suppress librosa warnings
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=FutureWarning)
-            warnings.filterwarnings("ignore", category=UserWarning)
-            
-            # Load audio - try different methods
-            audio = None
-            sr = None
-            
-            try:
-                # Try loading with librosa (handles most formats)
-                audio, sr = librosa.load(audio_file_path, sr=16000, mono=True)
-            except Exception as load_error:
-                logger.warning(f"librosa failed: {load_error}")
-                # Try with soundfile directly
-                try:
-                    import soundfile as sf
-                    audio, sr = sf.read(audio_file_path)
-                    # Convert to mono if stereo
-                    if len(audio.shape) > 1:
-                        audio = np.mean(audio, axis=1)
-                    # Resample to 16kHz if needed
-                    if sr != 16000:
-                        audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
-                        sr = 16000
-                except Exception as sf_error:
-                    logger.warning(f"soundfile failed: {sf_error}")
-                    # Last resort: try converting to WAV first (for m4a, webm, etc.)
-                    logger.info("🔄 Attempting to convert audio to WAV format...")
-                    converted_path = _convert_audio_to_wav(audio_file_path)
-                    if converted_path and os.path.exists(converted_path):
-                        try:
-                            audio, sr = librosa.load(converted_path, sr=16000, mono=True)
-                            logger.info("✅ Successfully loaded converted WAV file")
-                        except Exception as convert_error:
-                            logger.error(f"Failed to load converted WAV: {convert_error}")
-                            return None
-                    else:
-                        logger.error("Could not convert audio format. Install ffmpeg for better format support.")
-                        return None
-        
-        if audio is None or len(audio) == 0:
-            logger.error("Audio file is empty or invalid")
-            return None
-        
-        logger.info(f"Audio loaded: {len(audio)} samples at {sr}Hz")
-        
-        # Process with Whisper
-        inputs = _whisper_processor(audio, sampling_rate=16000, return_tensors="pt")
-        
-        # Move to same device as model
-        device = next(_whisper_model.parameters()).device
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Generate transcription
-        with torch.no_grad():
-            generated_ids = _whisper_model.generate(
-                inputs["input_features"],
-                language=language,
-                task="transcribe"
-            )
-        
-        # Decode
-        transcription = _whisper_processor.batch_decode(
-            generated_ids, 
-            skip_special_tokens=True
-        )[0]
-        
-        if not transcription or not transcription.strip():
-            logger.warning("Local Whisper returned empty transcription")
-            return None
-        
-        logger.info(f"✅ Local Whisper transcription: '{transcription[:100]}...'")
-        return transcription.strip()
-        
-    except ImportError as e:
-        logger.error(f"Missing dependency for local Whisper: {e}")
-        logger.info("Install with: pip install transformers torch librosa soundfile")
-        return None
+        return await run_inference(_transcribe_file_blocking, audio_file_path, language)
     except Exception as e:
-        logger.error(f"Error in local Whisper transcription: {e}", exc_info=True)
+        logger.error(f"Error in local Whisper transcription: {e}")
         return None
-    finally:
-        # Cleanup converted file if created
-        if converted_path and os.path.exists(converted_path):
-            try:
-                os.unlink(converted_path)
-                logger.debug(f"Cleaned up converted file: {converted_path}")
-            except Exception as e:
-                logger.warning(f"Failed to delete converted file: {e}")
 
 
 async def transcribe_with_google_stt(
@@ -250,47 +291,72 @@ async def transcribe_with_google_stt(
         Transcribed text or None if error
     """
     try:
-        from google.cloud import speech
-        
-        # Initialize client
-        client = speech.SpeechClient()
-        
         # Read audio file
         with open(audio_file_path, "rb") as audio_file:
             content = audio_file.read()
-        
-        # Configure recognition
-        # Map language codes: ko -> ko-KR, vi -> vi-VN
-        lang_code_map = {
-            "ko": "ko-KR",
-            "vi": "vi-VN",
-            "en": "en-US"
-        }
-        google_lang = lang_code_map.get(language, language)
-        
-        # Detect audio format
-        # For now, assume LINEAR16 (WAV). Can be improved to auto-detect
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.ENCODING_UNSPECIFIED,  # Auto-detect
-            sample_rate_hertz=16000,
-            language_code=google_lang,
-            audio_channel_count=1,
-        )
-        
-        audio = speech.RecognitionAudio(content=content)
-        
-        # Perform transcription
-        response = client.recognize(config=config, audio=audio)
-        
-        if not response.results:
-            logger.warning("Google STT returned no results")
-            return None
-        
-        # Get first result
-        transcript = response.results[0].alternatives[0].transcript
-        logger.info(f"Google STT transcription: {transcript[:100]}...")
-        return transcript.strip()
-        
+    except OSError as e:
+        logger.error(f"Error reading audio file for Google STT: {e}")
+        return None
+    
+    return await transcribe_bytes_with_google_stt(content, language)
+
+
+async def _google_stt_recognize(content: bytes, language: str) -> Optional[str]:
+    """Gọi Google Speech-to-Text - raise khi lỗi (cho STT router), None nếu không có kết quả"""
+    from google.cloud import speech
+    
+    # Initialize client
+    client = speech.SpeechClient()
+    
+    # Configure recognition
+    # Map language codes: ko -> ko-KR, vi -> vi-VN
+    lang_code_map = {
+        "ko": "ko-KR",
+        "vi": "vi-VN",
+        "en": "en-US"
+    }
+    google_lang = lang_code_map.get(language, language)
+    
+    # Detect audio format
+    # For now, assume LINEAR16 (WAV). Can be improved to auto-detect
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.ENCODING_UNSPECIFIED,  # Auto-detect
+        sample_rate_hertz=16000,
+        language_code=google_lang,
+        audio_channel_count=1,
+    )
+    
+    audio = speech.RecognitionAudio(content=content)
+    
+    # Perform transcription
+    response = await run_remote_call(client.recognize, config=config, audio=audio)
+    
+    if not response.results:
+        logger.warning("Google STT returned no results")
+        return None
+    
+    # Get first result
+    transcript = response.results[0].alternatives[0].transcript
+    logger.info(f"Google STT transcription: {transcript[:100]}...")
+    return transcript.strip()
+
+
+async def transcribe_bytes_with_google_stt(
+    content: bytes,
+    language: str = "ko"
+) -> Optional[str]:
+    """
+    Transcribe audio bytes bằng Google Speech-to-Text API (không cần file tạm)
+    
+    Args:
+        content: Audio file content
+        language: Language code (ko-KR, vi-VN, en-US, etc.)
+    
+    Returns:
+        Transcribed text or None if error
+    """
+    try:
+        return await _google_stt_recognize(content, language)
     except ImportError:
         logger.warning("google-cloud-speech not installed. Install with: pip install google-cloud-speech")
         return None
@@ -299,105 +365,132 @@ async def transcribe_with_google_stt(
         return None
 
 
+async def _local_whisper_backend(request: SttRequest) -> Optional[str]:
+    # Decode nếu router chưa decode; audio hỏng không phải lỗi của Whisper
+    audio = request.audio
+    if audio is None:
+        try:
+            audio_format = Path(request.file.filename or "").suffix[1:] or "webm"
+            audio = await AudioBuffer.from_bytes_async(request.content, audio_format)
+        except AudioDecodeError as e:
+            raise SttBackendSkipped(f"could not decode audio: {e}")
+    with audio.stage("whisper"):
+        return await _local_whisper_transcribe(audio.samples, request.language)
+
+
+async def _google_stt_backend(request: SttRequest) -> Optional[str]:
+    return await _google_stt_recognize(request.content, request.language)
+
+
+async def _openai_whisper_backend(request: SttRequest) -> Optional[str]:
+    from services.openai_service import transcribe_audio
+
+    await request.file.seek(0)  # Reset file pointer
+    # Transcript cache đã được tra ở transcribe_audio_cheap
+    return await transcribe_audio(
+        request.file, request.language, audio=request.audio, endpoint=request.endpoint, check_cache=False
+    )
+
+
+def _openai_configured() -> bool:
+    return bool(settings.openai_api_key and settings.openai_api_key != "your_openai_api_key_here")
+
+
+# Thứ tự đăng ký = thứ tự ưu tiên khi chưa có số liệu latency (xem services/stt_router.py)
+register_stt_backend(SttBackend(
+    name="local-whisper",
+    cache_key=LOCAL_WHISPER_BACKEND,
+    cost=FREE,
+    transcribe=_local_whisper_backend,
+    is_enabled=lambda: USE_LOCAL_WHISPER
+))
+register_stt_backend(SttBackend(
+    name="google-stt",
+    cache_key=GOOGLE_STT_BACKEND,
+    cost=CHEAP,
+    transcribe=_google_stt_backend,
+    is_enabled=lambda: USE_GOOGLE_STT
+))
+register_stt_backend(SttBackend(
+    name="openai-whisper",
+    cache_key=OPENAI_WHISPER_BACKEND,
+    cost=PAID,
+    transcribe=_openai_whisper_backend,
+    is_enabled=_openai_configured
+))
+
+
+def _is_quota_error(error: str) -> bool:
+    error = error.lower()
+    return "429" in error or "quota" in error or "insufficient_quota" in error
+
+
 async def transcribe_audio_cheap(
     file: UploadFile,
-    language: str = "ko"
+    language: str = "ko",
+    audio: Optional[AudioBuffer] = None,
+    endpoint: str = "stt"
 ) -> str:
     """
     Transcribe audio using cheapest available method
     
-    Priority:
-    1. Local Whisper (FREE, no quota)
-    2. Google STT (cheaper than OpenAI)
-    3. Fallback to OpenAI Whisper (if configured)
+    Backend được chọn bởi STT router (services/stt_router.py): mặc định local Whisper
+    (FREE) trước, rồi Google STT (cheaper), cuối cùng OpenAI Whisper (costs money).
+    Backend lỗi liên tục bị bỏ qua (circuit breaker) thay vì làm chậm mọi request.
     
     Args:
         file: Audio file upload
         language: Language code
+        audio: AudioBuffer đã decode của request (nếu có thì không decode lại)
+        endpoint: Tên endpoint gọi (thống kê hit rate của transcript cache)
     
     Returns:
-        Transcribed text
+        Transcribed text ("" nếu backend chạy được nhưng không nghe thấy gì)
     """
-    temp_file_path = None
-    
     try:
-        # Save uploaded file to temp location
-        file_extension = Path(file.filename).suffix or ".webm"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            temp_file_path = temp_file.name
+        if audio is not None:
+            content = audio.source_bytes
+        else:
+            # Đọc upload vào bộ nhớ - không ghi file tạm
             content = await file.read()
-            temp_file.write(content)
-            temp_file.flush()
-        
-        # Reset file pointer for potential reuse
-        await file.seek(0)
+            
+            # Reset file pointer for potential reuse
+            await file.seek(0)
         
         logger.info(f"Transcribing audio: {file.filename} ({len(content)} bytes)")
         
-        # Try local Whisper first (FREE)
-        if USE_LOCAL_WHISPER:
-            try:
-                logger.info("🔄 Trying local Whisper (FREE)...")
-                transcript = await transcribe_with_local_whisper(temp_file_path, language)
-                if transcript and transcript.strip():
-                    logger.info("✅ Used local Whisper (FREE) - No quota consumed!")
-                    return transcript
-                else:
-                    logger.warning("⚠️ Local Whisper returned empty transcript")
-            except ImportError as e:
-                logger.error(f"❌ Local Whisper dependencies missing: {e}")
-                logger.info("💡 Install with: pip install transformers torch librosa soundfile")
-            except Exception as e:
-                logger.warning(f"⚠️ Local Whisper failed: {e}")
-                logger.debug(f"Error details: {e}", exc_info=True)
+        # Cùng bản ghi đã được transcribe (gửi lại / retry) → trả luôn, kể cả kết quả từ OpenAI
+        cache = get_transcript_cache()
+        fingerprint = audio_fingerprint(audio.samples if audio is not None else None, content)
+        if cache is not None:
+            backends = [backend.cache_key for backend in plan_backends()]
+            transcript = await cache.get_async(fingerprint, language, backends, endpoint)
+            if transcript is not None:
+                return transcript
         
-        # Try Google STT (cheaper than OpenAI)
-        if USE_GOOGLE_STT:
-            try:
-                transcript = await transcribe_with_google_stt(temp_file_path, language)
-                if transcript and transcript.strip():
-                    logger.info("✅ Used Google STT (cheaper)")
-                    return transcript
-                else:
-                    logger.warning("Google STT returned empty transcript")
-            except Exception as e:
-                logger.warning(f"Google STT failed: {e}. Trying next method...")
-        
-        # Fallback: Use OpenAI Whisper (if available, but costs money)
-        # Only if both local methods failed
-        logger.warning("Both local methods failed. Falling back to OpenAI Whisper (costs money)")
+        request = SttRequest(file=file, content=content, language=language, audio=audio, endpoint=endpoint)
         try:
-            from services.openai_service import transcribe_audio
-            await file.seek(0)  # Reset file pointer
-            return await transcribe_audio(file, language)
-        except Exception as openai_error:
-            error_str = str(openai_error)
-            # Check if it's a quota error
-            if "429" in error_str or "quota" in error_str.lower() or "insufficient_quota" in error_str.lower():
-                logger.error(f"OpenAI Whisper failed due to quota: {openai_error}")
+            transcript, backend = await route_transcription(request)
+        except SttUnavailableError as e:
+            if any(_is_quota_error(error) for error in e.errors.values()):
+                logger.error(f"STT failed due to quota: {e}")
                 raise HTTPException(
                     status_code=503,
                     detail="Đã vượt quá hạn mức API. Local Whisper không khả dụng. Vui lòng kiểm tra tài khoản và thêm credits, hoặc cài đặt local Whisper."
                 )
-            else:
-                logger.error(f"OpenAI Whisper also failed: {openai_error}")
-                # If OpenAI also fails (e.g., quota), raise a clear error
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Tất cả phương pháp STT đều thất bại. Local Whisper: {'failed' if USE_LOCAL_WHISPER else 'disabled'}, "
-                           f"Google STT: {'failed' if USE_GOOGLE_STT else 'disabled'}, "
-                           f"OpenAI Whisper: failed ({str(openai_error)[:200]})"
-                )
+            if "empty transcript" in e.errors.values():
+                # Backend chạy được nhưng không nghe thấy gì - caller tự xử lý transcript rỗng
+                return ""
+            logger.error(f"All STT backends failed: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Tất cả phương pháp STT đều thất bại. {str(e)[:300]}"
+            )
+        
+        if cache is not None:
+            await cache.put_async(fingerprint, language, backend.cache_key, transcript)
+        return transcript
         
     except Exception as e:
         logger.error(f"Error in transcribe_audio_cheap: {e}")
         raise
-    
-    finally:
-        # Cleanup temp file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e:
-                logger.warning(f"Failed to delete temp file: {e}")
-
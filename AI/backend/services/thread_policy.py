@@ -0,0 +1,109 @@
+"""
+Thread Policy - Số thread torch (intra-op / inter-op) và CPU affinity cho từng worker
+
+Mặc định mỗi process torch dùng toàn bộ core; với nhiều uvicorn worker trên cùng
+máy các thread giành nhau (oversubscription) làm p99 tăng vọt. Policy đọc từ
+config.Settings và phải được áp dụng trước khi load model:
+
+- torch_num_threads:         intra-op threads (0 = core khả dụng / số worker)
+- torch_num_interop_threads: inter-op threads (0 = giữ mặc định của torch)
+- torch_worker_count:        số process chia nhau CPU (0 = $WEB_CONCURRENCY hoặc 1)
+- cpu_affinity_enabled:      ghim mỗi worker vào một dải core riêng (cần biết worker_index)
+"""
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_applied: Optional[Dict[str, Any]] = None
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def resolve_worker_count() -> int:
+    if settings.torch_worker_count > 0:
+        return settings.torch_worker_count
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+def cpu_slice(cpus: List[int], worker_index: int, worker_count: int) -> List[int]:
+    """Dải core dành cho worker_index khi chia đều cpus cho worker_count worker"""
+    per_worker = max(1, len(cpus) // max(1, worker_count))
+    start = (worker_index * per_worker) % len(cpus)
+    return cpus[start:start + per_worker]
+
+
+def apply_thread_policy(
+    worker_index: Optional[int] = None,
+    worker_count: Optional[int] = None,
+    num_threads: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Áp dụng policy cho process hiện tại
+
+    Args:
+        worker_index: Vị trí worker (0..worker_count-1) - cần cho CPU affinity
+        worker_count: Số worker chia nhau CPU (default: resolve_worker_count())
+        num_threads: Ghi đè torch_num_threads (ví dụ --threads-per-worker)
+
+    Returns:
+        Policy đã áp dụng (như thread_policy_report())
+    """
+    import torch
+
+    global _applied
+    worker_count = worker_count or resolve_worker_count()
+    cpus = _available_cpus()
+
+    affinity = None
+    if settings.cpu_affinity_enabled:
+        if worker_index is None:
+            logger.warning("⚠️ cpu_affinity_enabled but worker index is unknown (use --preload) - affinity not set")
+        elif hasattr(os, "sched_setaffinity"):
+            affinity = cpu_slice(cpus, worker_index, worker_count)
+            os.sched_setaffinity(0, affinity)
+            cpus = affinity
+        else:
+            logger.warning("⚠️ CPU affinity is not supported on this platform")
+
+    threads = num_threads or settings.torch_num_threads
+    if threads <= 0:
+        threads = len(cpus) if affinity else max(1, len(cpus) // worker_count)
+    torch.set_num_threads(threads)
+
+    if settings.torch_num_interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(settings.torch_num_interop_threads)
+        except RuntimeError as e:
+            # Chỉ đặt được một lần, trước khi có inter-op work (process fork từ master đã đặt sẵn)
+            logger.warning(f"⚠️ Cannot set inter-op threads: {e}")
+
+    _applied = {
+        "worker_index": worker_index,
+        "worker_count": worker_count,
+        "intra_op_threads": torch.get_num_threads(),
+        "inter_op_threads": torch.get_num_interop_threads(),
+        "cpu_affinity": affinity,
+        "available_cpus": len(_available_cpus()),
+    }
+    logger.info(
+        f"🧵 Thread policy: {_applied['intra_op_threads']} intra-op / {_applied['inter_op_threads']} inter-op threads"
+        + (f", pinned to CPUs {affinity}" if affinity else "")
+        + f" (worker {worker_index if worker_index is not None else '?'} of {worker_count})"
+    )
+    return _applied
+
+
+def thread_policy_report() -> Optional[Dict[str, Any]]:
+    """Policy đã áp dụng trong process này (None nếu chưa áp dụng)"""
+    return _applied
@@ -0,0 +1,291 @@
+"""
+Transcript Cache - Cache kết quả STT theo nội dung audio, ngôn ngữ và backend
+
+Người dùng thường gửi lại cùng một bản ghi, và client retry khi mạng chập chờn; mỗi lần
+như vậy transcribe_audio_cheap chạy lại Whisper hoặc rơi xuống OpenAI Whisper (tốn tiền).
+Key gồm:
+- fingerprint: hash PCM đã decode (audio_fingerprint), hoặc hash bytes upload khi không decode được
+- language
+- backend STT + phiên bản (vd "local-whisper/openai/whisper-tiny", "openai/whisper-1"):
+  đổi model thì transcript cũ không được dùng lại
+
+Hai tầng:
+1. Bộ nhớ: LRUCache giới hạn transcript_cache_max_entries
+2. SQLite (tuỳ chọn, transcript_cache_sqlite_path): dùng chung giữa các worker, giữ qua restart
+
+Entry quá transcript_cache_ttl_seconds coi như miss. Transcript rỗng không được cache
+(để lần gửi lại có cơ hội thành công). Hit rate thống kê theo endpoint (/health).
+
+Tầng SQLite là I/O đồng bộ (busy timeout 5 s) - code async dùng get_async/put_async.
+"""
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from services.cache_utils import LRUCache, pcm_hash
+
+logger = logging.getLogger(__name__)
+
+# Dọn entry hết hạn / vượt giới hạn của tầng SQLite sau mỗi ngần này lần ghi
+SQLITE_PRUNE_EVERY = 100
+
+
+def audio_fingerprint(samples: Optional[np.ndarray] = None, content: bytes = b"") -> str:
+    """
+    Fingerprint nội dung audio cho key cache
+
+    Ưu tiên hash PCM đã decode (cùng bản ghi encode lại vẫn trùng key); không có PCM thì
+    hash bytes upload (client retry gửi đúng các bytes đó).
+    """
+    if samples is not None:
+        return f"pcm:{pcm_hash(samples)}"
+    return f"raw:{hashlib.blake2b(content, digest_size=16).hexdigest()}"
+
+
+class _SQLiteTier:
+    """Bảng transcripts(key, transcript, created_at) - lỗi SQLite chỉ log, coi như miss"""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "key TEXT PRIMARY KEY, transcript TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS transcripts_created_at ON transcripts (created_at)")
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT transcript, created_at FROM transcripts WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Transcript cache: SQLite read failed: {e}")
+            return None
+        return (row[0], row[1]) if row is not None else None
+
+    def put(self, key: str, transcript: str, created_at: float) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO transcripts (key, transcript, created_at) VALUES (?, ?, ?)",
+                    (key, transcript, created_at)
+                )
+                self._writes += 1
+                if self._writes % SQLITE_PRUNE_EVERY == 0:
+                    self._prune()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Transcript cache: SQLite write failed: {e}")
+
+    def _prune(self) -> None:
+        # Gọi khi đang giữ lock + transaction
+        if self.ttl_seconds:
+            self._conn.execute(
+                "DELETE FROM transcripts WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM transcripts WHERE key IN ("
+                "SELECT key FROM transcripts ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def count(self) -> int:
+        try:
+            with self._lock:
+                return self._conn.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+        except sqlite3.Error:
+            return -1
+
+    def clear(self) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM transcripts")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Transcript cache: SQLite clear failed: {e}")
+
+
+class TranscriptCache:
+    """
+    Cache transcript hai tầng (bộ nhớ + SQLite tuỳ chọn) với TTL và thống kê theo endpoint
+
+    Args:
+        max_entries: Số transcript tối đa trong bộ nhớ
+        ttl_seconds: Tuổi tối đa của một transcript (0 = không hết hạn)
+        sqlite_path: File SQLite cho tầng disk, None = tắt
+        sqlite_max_entries: Số transcript tối đa trong SQLite
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        sqlite_path: Optional[str] = None,
+        sqlite_max_entries: int = 0
+    ):
+        self.ttl_seconds = ttl_seconds
+        # Giá trị: (transcript, created_at)
+        self._memory: LRUCache[Tuple[str, float]] = LRUCache(
+            "transcripts",
+            max_entries=max_entries,
+            sizeof=lambda value: len(value[0].encode("utf-8"))
+        )
+        self._sqlite: Optional[_SQLiteTier] = None
+        if sqlite_path:
+            try:
+                self._sqlite = _SQLiteTier(sqlite_path, sqlite_max_entries, ttl_seconds)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"⚠️ Transcript cache: SQLite tier disabled ({sqlite_path}): {e}")
+        self._stats_lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+        self._stores = 0
+
+    @staticmethod
+    def _key(fingerprint: str, language: str, backend: str) -> str:
+        return f"{backend}|{language}|{fingerprint}"
+
+    def _fresh(self, created_at: float) -> bool:
+        return not self.ttl_seconds or time.time() - created_at <= self.ttl_seconds
+
+    def _lookup_one(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if self._fresh(entry[1]):
+                return entry[0], "memory"
+            self._memory.discard(key)
+        if self._sqlite is not None:
+            entry = self._sqlite.get(key)
+            if entry is not None and self._fresh(entry[1]):
+                self._memory.put(key, entry)
+                return entry[0], "disk"
+        return None, None
+
+    def _count(self, endpoint: str, outcome: str) -> None:
+        with self._stats_lock:
+            counters = self._endpoints.setdefault(endpoint, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def get(self, fingerprint: str, language: str, backends: List[str], endpoint: str) -> Optional[str]:
+        """
+        Transcript đã cache của bản ghi theo thứ tự backend ưu tiên
+
+        Args:
+            fingerprint: audio_fingerprint() của bản ghi
+            language: Mã ngôn ngữ
+            backends: Các backend (kèm phiên bản) chấp nhận được, theo thứ tự ưu tiên
+            endpoint: Tên endpoint gọi (để thống kê hit rate)
+
+        Returns:
+            Transcript, hoặc None nếu không backend nào có entry còn hạn
+        """
+        for backend in backends:
+            transcript, tier = self._lookup_one(self._key(fingerprint, language, backend))
+            if transcript is not None:
+                self._count(endpoint, f"{tier}_hits")
+                logger.info(f"💾 Transcript cache hit ({endpoint}, {backend}, {tier})")
+                return transcript
+        self._count(endpoint, "misses")
+        return None
+
+    async def get_async(self, fingerprint: str, language: str, backends: List[str], endpoint: str) -> Optional[str]:
+        """get() cho event loop: khi có tầng SQLite, lookup chạy trên thread (asyncio.to_thread)"""
+        if self._sqlite is None:
+            return self.get(fingerprint, language, backends, endpoint)
+        return await asyncio.to_thread(self.get, fingerprint, language, backends, endpoint)
+
+    async def put_async(self, fingerprint: str, language: str, backend: str, transcript: Optional[str]) -> None:
+        """put() cho event loop: khi có tầng SQLite, ghi chạy trên thread (asyncio.to_thread)"""
+        if self._sqlite is None:
+            self.put(fingerprint, language, backend, transcript)
+            return
+        await asyncio.to_thread(self.put, fingerprint, language, backend, transcript)
+
+    def put(self, fingerprint: str, language: str, backend: str, transcript: Optional[str]) -> None:
+        """Lưu transcript (bỏ qua transcript rỗng)"""
+        if not transcript or not transcript.strip():
+            return
+        key = self._key(fingerprint, language, backend)
+        created_at = time.time()
+        self._memory.put(key, (transcript, created_at))
+        if self._sqlite is not None:
+            self._sqlite.put(key, transcript, created_at)
+        with self._stats_lock:
+            self._stores += 1
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._sqlite is not None:
+            self._sqlite.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate theo endpoint + tổng, số entry mỗi tầng"""
+        with self._stats_lock:
+            endpoints = {name: dict(counters) for name, counters in self._endpoints.items()}
+            stores = self._stores
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        for counters in endpoints.values():
+            for name in totals:
+                totals[name] += counters[name]
+            counters.update(_hit_rate(counters))
+        totals.update(_hit_rate(totals))
+
+        memory = self._memory.stats()
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "memory_entries": memory["entries"],
+            "max_entries": memory["max_entries"],
+            "evictions": memory["evictions"],
+            "sqlite_entries": self._sqlite.count() if self._sqlite is not None else None,
+            "stores": stores,
+            "total": totals,
+            "endpoints": endpoints,
+        }
+
+
+def _hit_rate(counters: Dict[str, int]) -> Dict[str, Any]:
+    hits = counters["memory_hits"] + counters["disk_hits"]
+    lookups = hits + counters["misses"]
+    return {"lookups": lookups, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+
+
+_transcript_cache: Optional[TranscriptCache] = None
+_transcript_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> Optional[TranscriptCache]:
+    """Cache transcript dùng chung, None nếu transcript_cache_enabled tắt"""
+    global _transcript_cache
+    if not settings.transcript_cache_enabled:
+        return None
+    if _transcript_cache is None:
+        with _transcript_cache_lock:
+            if _transcript_cache is None:
+                _transcript_cache = TranscriptCache(
+                    max_entries=settings.transcript_cache_max_entries,
+                    ttl_seconds=settings.transcript_cache_ttl_seconds,
+                    sqlite_path=settings.transcript_cache_sqlite_path or None,
+                    sqlite_max_entries=settings.transcript_cache_sqlite_max_entries
+                )
+    return _transcript_cache
+
+
+def transcript_cache_stats() -> Optional[Dict[str, Any]]:
+    """Thống kê cache transcript (None nếu tắt)"""
+    cache = get_transcript_cache()
+    return cache.stats() if cache is not None else None
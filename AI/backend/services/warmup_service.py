@@ -0,0 +1,140 @@
+"""
+Warm-up Service - Load + chạy thử Wav2Vec2, Conformer và Whisper trước khi nhận traffic
+
+Model được load lazy ở request đầu tiên (10-30s, mobile thường timeout). Warm-up
+load từng model rồi chạy một lượt forward với audio giả để khởi tạo kernel/allocator,
+ghi lại trạng thái + thời gian từng bước. /ready dựa vào đây để load balancer
+chỉ gửi request tới worker đã warm.
+
+Trạng thái mỗi model:
+- pending:     chưa tới lượt
+- loading / warming
+- ready:       đã load và chạy thử xong
+- unavailable: không có model (ví dụ thiếu file weights) - app dùng fallback
+- disabled:    không dùng trong cấu hình hiện tại
+- failed:      lỗi khi load / chạy thử (xem "error")
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAMES = ("wav2vec2", "conformer", "whisper")
+# Trạng thái kết thúc: warm-up không còn việc gì với model này
+FINAL_STATES = {"ready", "unavailable", "disabled", "failed"}
+
+_states: Dict[str, Dict[str, Any]] = {name: {"state": "pending"} for name in MODEL_NAMES}
+_states_lock = threading.Lock()
+_warmup_started: Optional[float] = None
+_warmup_finished: Optional[float] = None
+
+
+def _set_state(name: str, **values: Any) -> None:
+    with _states_lock:
+        _states[name].update(values)
+
+
+def _dummy_audio(seconds: float = 1.0) -> np.ndarray:
+    # Nhiễu nhỏ thay vì im lặng tuyệt đối (một số kernel có nhánh riêng cho input toàn 0)
+    rng = np.random.default_rng(0)
+    return (0.01 * rng.standard_normal(int(16000 * seconds))).astype(np.float32)
+
+
+def _warm(name: str, load: Callable[[], Any], forward: Callable[[], Any]) -> None:
+    """load() trả về False/None = không có model; forward() chạy một lượt với input giả"""
+    try:
+        _set_state(name, state="loading", error=None)
+        started = time.perf_counter()
+        loaded = load()
+        load_ms = round((time.perf_counter() - started) * 1000, 1)
+        if loaded is False or loaded is None:
+            _set_state(name, state="unavailable", load_ms=load_ms)
+            logger.warning(f"⚠️ Warm-up: {name} not available")
+            return
+
+        _set_state(name, state="warming", load_ms=load_ms)
+        started = time.perf_counter()
+        forward()
+        warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+        _set_state(name, state="ready", warmup_ms=warmup_ms)
+        logger.info(f"✅ Warm-up: {name} ready (load {load_ms:.0f} ms, first forward {warmup_ms:.0f} ms)")
+    except Exception as e:
+        _set_state(name, state="failed", error=str(e))
+        logger.error(f"❌ Warm-up: {name} failed: {e}")
+
+
+def warm_up_models(include_whisper: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Load + chạy thử tất cả model trong process hiện tại (blocking)
+
+    Conformer được load nếu chưa có (load_pronunciation_model). Lỗi của một model
+    không chặn các model còn lại.
+
+    Returns:
+        Trạng thái từng model (như model_states())
+    """
+    import torch
+    from services import pronunciation_model_service as pms
+    from services import stt_service
+
+    global _warmup_started, _warmup_finished
+    _warmup_started, _warmup_finished = time.time(), None
+    audio = _dummy_audio()
+
+    _warm(
+        "wav2vec2",
+        load=pms.get_wav2vec2_model,
+        forward=lambda: pms.extract_wav2vec2_features_batch([audio])
+    )
+
+    def _conformer_forward():
+        model = pms.current_model()
+        features = torch.zeros(1, pms.num_wav2vec2_frames(len(audio)), 768, device=model.device)
+        with torch.no_grad():
+            model.model(features)
+
+    _warm(
+        "conformer",
+        load=lambda: pms.is_local_model_loaded() or pms.load_pronunciation_model(),
+        forward=_conformer_forward
+    )
+
+    if include_whisper and stt_service.USE_LOCAL_WHISPER:
+        _warm(
+            "whisper",
+            load=stt_service._load_whisper_local,
+            forward=lambda: stt_service._transcribe_array_local(audio, "ko")
+        )
+    else:
+        _set_state("whisper", state="disabled")
+
+    _warmup_finished = time.time()
+    logger.info(f"🔥 Model warm-up finished in {_warmup_finished - _warmup_started:.1f}s")
+    return model_states()
+
+
+def model_states() -> Dict[str, Dict[str, Any]]:
+    with _states_lock:
+        return {name: dict(state) for name, state in _states.items()}
+
+
+def is_warm() -> bool:
+    """Warm-up đã chạy xong (mọi model ở trạng thái kết thúc)"""
+    with _states_lock:
+        return _warmup_finished is not None and all(s["state"] in FINAL_STATES for s in _states.values())
+
+
+def warmup_report() -> Dict[str, Any]:
+    """Trạng thái warm-up cho /ready (và ping của model worker)"""
+    return {
+        "ready": is_warm(),
+        "started_at": _warmup_started,
+        "finished_at": _warmup_finished,
+        "duration_s": round(_warmup_finished - _warmup_started, 2)
+        if _warmup_started and _warmup_finished else None,
+        "models": model_states(),
+    }
@@ -0,0 +1,13 @@
+"""
+Cấu hình chung cho test (chạy từ thư mục backend: python -m pytest tests)
+"""
+import os
+import sys
+from pathlib import Path
+
+# Settings bắt buộc có OPENAI_API_KEY; test không gọi OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
@@ -0,0 +1,85 @@
+"""
+Test căn chỉnh reference ↔ hypothesis (align_sequences)
+
+Số S/D/I phải khớp các trường hợp biết trước, distance phải bằng DP Levenshtein viết tay,
+và với mọi cặp chuỗi: M+S+D == len(reference), M+S+I == len(hypothesis).
+"""
+import random
+
+import pytest
+
+from services import alignment_service
+from services.alignment_service import DELETION, INSERTION, MATCH, SUBSTITUTION, align_sequences
+
+
+def _naive_distance(reference, hypothesis):
+    # Levenshtein O(n·m) thuần Python để đối chiếu với bảng NumPy
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_token in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_token in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j - 1] + (ref_token != hyp_token),
+                previous[j] + 1,
+                current[j - 1] + 1,
+            ))
+        previous = current
+    return previous[-1]
+
+
+def _check_invariants(reference, hypothesis, result):
+    assert result.matches + result.substitutions + result.deletions == len(reference)
+    assert result.matches + result.substitutions + result.insertions == len(hypothesis)
+    assert result.distance == result.substitutions + result.deletions + result.insertions
+    assert len(result.pairs) == len(result.ops)
+
+    # pairs đi qua mỗi chỉ số đúng một lần, theo thứ tự tăng dần
+    ref_indices = [i for i, _ in result.pairs if i is not None]
+    hyp_indices = [j for _, j in result.pairs if j is not None]
+    assert ref_indices == list(range(len(reference)))
+    assert hyp_indices == list(range(len(hypothesis)))
+
+    for (i, j), op in zip(result.pairs, result.ops):
+        if op == MATCH:
+            assert reference[i] == hypothesis[j]
+        elif op == SUBSTITUTION:
+            assert reference[i] != hypothesis[j]
+        elif op == DELETION:
+            assert i is not None and j is None
+        else:
+            assert op == INSERTION and i is None and j is not None
+
+
+@pytest.mark.parametrize("reference, hypothesis, expected", [
+    ("abc", "abc", (3, 0, 0, 0)),
+    ("abc", "abd", (2, 1, 0, 0)),
+    ("abc", "ac", (2, 0, 1, 0)),
+    ("ac", "abc", (2, 0, 0, 1)),
+    ("abc", "", (0, 0, 3, 0)),
+    ("", "ab", (0, 0, 0, 2)),
+    ("", "", (0, 0, 0, 0)),
+    ("kitten", "sitting", (4, 2, 0, 1)),
+])
+def test_known_counts(reference, hypothesis, expected):
+    result = align_sequences(list(reference), list(hypothesis))
+    assert (result.matches, result.substitutions, result.deletions, result.insertions) == expected
+    _check_invariants(reference, hypothesis, result)
+
+
+def test_phoneme_tokens():
+    reference = ["th", "ih", "ng", "k"]
+    hypothesis = ["s", "ih", "ng"]
+    result = align_sequences(reference, hypothesis)
+    assert result.details() == {"matches": 2, "substitutions": 1, "insertions": 0, "deletions": 1}
+    assert result.ops == [SUBSTITUTION, MATCH, MATCH, DELETION]
+
+
+def test_random_against_naive_dp():
+    rng = random.Random(0)
+    for _ in range(300):
+        reference = [rng.choice("abcd") for _ in range(rng.randint(0, 12))]
+        hypothesis = [rng.choice("abcd") for _ in range(rng.randint(0, 12))]
+        result = align_sequences(reference, hypothesis)
+        assert result.distance == _naive_distance(reference, hypothesis)
+        assert result.distance == alignment_service.edit_distance_table(reference, hypothesis)[-1, -1]
+        _check_invariants(reference, hypothesis, result)
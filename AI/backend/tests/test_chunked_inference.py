@@ -0,0 +1,118 @@
+"""
+Test chia cửa sổ cho audio dài (plan_chunks / predict_log_probs_chunked)
+
+Model được thay bằng stub: "log-probs" của mỗi frame là chỉ số frame toàn cục đọc từ
+audio (mẫu thứ s có giá trị s // stride). Nhờ vậy kết quả ghép của đường chạy theo cửa sổ
+phải trùng từng frame với một lượt chạy nguyên audio.
+"""
+import numpy as np
+import pytest
+import torch
+
+from config import settings
+from services import pronunciation_model_service as pms
+
+SAMPLE_RATE = 16000
+
+
+def _frame_index_audio(seconds: float) -> np.ndarray:
+    samples = np.arange(int(seconds * SAMPLE_RATE))
+    return (samples // pms.WAV2VEC2_FRAME_STRIDE).astype(np.float32)
+
+
+def _stub_predict_log_probs_batch(audios, model=None):
+    # Frame i của mỗi cửa sổ mang chỉ số frame toàn cục tại mẫu đầu của frame đó
+    outputs = []
+    for audio in audios:
+        num_frames = pms.num_wav2vec2_frames(len(audio))
+        frame_ids = torch.from_numpy(audio[:num_frames * pms.WAV2VEC2_FRAME_STRIDE:pms.WAV2VEC2_FRAME_STRIDE].copy())
+        outputs.append(torch.stack([frame_ids, -frame_ids], dim=1))
+    return outputs
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    calls = []
+
+    def predict(audios, model=None):
+        calls.append([len(audio) for audio in audios])
+        return _stub_predict_log_probs_batch(audios, model)
+
+    monkeypatch.setattr(pms, "predict_log_probs_batch", predict)
+    monkeypatch.setattr(settings, "pronunciation_batching_enabled", False)
+    monkeypatch.setattr(settings, "pronunciation_batch_max_size", 8)
+    monkeypatch.setattr(settings, "pronunciation_chunk_frames", 400)
+    monkeypatch.setattr(settings, "pronunciation_chunk_context_frames", 50)
+    return calls
+
+
+@pytest.mark.parametrize("total_frames", [1499, 2999])
+def test_plan_chunks_cores_tile_without_gaps(total_frames):
+    chunks = pms.plan_chunks(total_frames, window_frames=400, context_frames=50)
+
+    assert chunks[0][2] == 0
+    assert chunks[-1][3] == total_frames
+    for (_, _, _, prev_core_end), (_, _, core_start, _) in zip(chunks, chunks[1:]):
+        assert core_start == prev_core_end
+    for chunk_start, chunk_end, core_start, core_end in chunks:
+        assert chunk_end - chunk_start <= 400
+        assert core_end - core_start <= 300
+        assert chunk_start == max(0, core_start - 50)
+        assert chunk_end == min(total_frames, core_end + 50)
+
+
+def test_plan_chunks_clamps_context_to_window():
+    chunks = pms.plan_chunks(100, window_frames=10, context_frames=50)
+
+    assert all(chunk_end - chunk_start <= 10 for chunk_start, chunk_end, _, _ in chunks)
+    assert chunks[-1][3] == 100
+
+
+@pytest.mark.parametrize("seconds", [30.0, 60.0])
+def test_chunk_windows_align_with_global_frames(stub_model, seconds):
+    audio = _frame_index_audio(seconds)
+    chunks, windows = pms.chunk_windows(audio)
+
+    total_frames = pms.num_wav2vec2_frames(len(audio))
+    assert chunks[-1][3] == total_frames
+    for (chunk_start, chunk_end, _, _), window in zip(chunks, windows):
+        assert pms.num_wav2vec2_frames(len(window)) == chunk_end - chunk_start
+        assert window[0] == chunk_start
+
+
+@pytest.mark.parametrize("seconds", [30.0, 60.0])
+def test_chunked_matches_unchunked_pass(stub_model, seconds):
+    audio = _frame_index_audio(seconds)
+    full = _stub_predict_log_probs_batch([audio])[0]
+
+    chunked = pms.predict_log_probs_chunked(audio, model=object())
+
+    assert chunked.shape == full.shape
+    assert chunked.shape[0] == pms.num_wav2vec2_frames(len(audio))
+    # Phần ngữ cảnh chồng nhau bị cắt đúng: mỗi frame xuất hiện đúng một lần, đúng thứ tự
+    assert torch.equal(chunked, full)
+
+
+@pytest.mark.parametrize("seconds", [30.0, 60.0])
+def test_chunked_runs_windows_in_bounded_batches(stub_model, seconds):
+    audio = _frame_index_audio(seconds)
+    chunks, _ = pms.chunk_windows(audio)
+
+    pms.predict_log_probs_chunked(audio, model=object())
+
+    assert sum(len(batch) for batch in stub_model) == len(chunks)
+    assert all(len(batch) <= settings.pronunciation_batch_max_size for batch in stub_model)
+    assert all(
+        pms.num_wav2vec2_frames(length) <= pms.MAX_CONFORMER_FRAMES
+        for batch in stub_model for length in batch
+    )
+
+
+def test_short_audio_is_not_chunked(stub_model, monkeypatch):
+    monkeypatch.setattr(settings, "pronunciation_cache_enabled", False)
+    audio = _frame_index_audio(5.0)
+
+    log_probs = pms.predict_log_probs(audio, model=object())
+
+    assert stub_model == [[len(audio)]]
+    assert log_probs.shape[0] == pms.num_wav2vec2_frames(len(audio))
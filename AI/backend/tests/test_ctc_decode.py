@@ -0,0 +1,87 @@
+"""
+Test CTC greedy decode theo batch (collapse_ctc_ids / ctc_greedy_decode / decode_phonemes_batch)
+
+Kết quả collapse cả batch đã pad phải trùng với vòng lặp cũ chạy từng chuỗi trên phần
+frame thật (seq[:length]).
+"""
+import numpy as np
+import torch
+
+from services import pronunciation_model_service as pms
+
+BLANK = 0
+
+
+def _collapse_loop(seq, blank_id=BLANK):
+    # Cách decode cũ: bỏ blank và frame lặp lại frame trước
+    decoded = []
+    prev = None
+    for token_id in seq.tolist():
+        if token_id != blank_id and token_id != prev:
+            decoded.append(token_id)
+        prev = token_id
+    return decoded
+
+
+def _split(ids, counts):
+    return [row.tolist() for row in np.split(ids, np.cumsum(counts)[:-1])]
+
+
+def test_collapse_padded_batch_matches_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        batch = int(rng.integers(1, 8))
+        lengths = rng.integers(0, 30, size=batch)
+        # Phần pad mang ID ngẫu nhiên khác blank để chắc chắn lengths được tôn trọng
+        preds = rng.integers(0, 5, size=(batch, max(int(lengths.max()), 1)))
+        ids, counts = pms.collapse_ctc_ids(preds, blank_id=BLANK, lengths=lengths.tolist())
+        expected = [_collapse_loop(seq[:length]) for seq, length in zip(preds, lengths)]
+        assert counts.tolist() == [len(row) for row in expected]
+        assert _split(ids, counts) == expected
+
+
+def test_collapse_without_lengths_uses_full_rows():
+    preds = np.array([[0, 1, 1, 0, 1, 2, 2], [3, 3, 3, 0, 0, 4, 0]])
+    ids, counts = pms.collapse_ctc_ids(preds, blank_id=BLANK)
+    assert _split(ids, counts) == [[1, 1, 2], [3, 4]]
+
+
+def test_collapse_non_zero_blank():
+    preds = np.array([[4, 1, 4, 1, 1, 4]])
+    ids, counts = pms.collapse_ctc_ids(preds, blank_id=4)
+    assert _split(ids, counts) == [_collapse_loop(preds[0], blank_id=4)] == [[1, 1]]
+
+
+def test_greedy_decode_matches_loop():
+    rng = np.random.default_rng(1)
+    log_probs = torch.from_numpy(rng.normal(size=(4, 25, 6)).astype(np.float32)).log_softmax(dim=-1)
+    lengths = [25, 10, 0, 17]
+    preds = log_probs.argmax(dim=-1).numpy()
+    expected = [_collapse_loop(seq[:length]) for seq, length in zip(preds, lengths)]
+    assert pms.ctc_greedy_decode(log_probs, blank_id=BLANK, lengths=lengths) == expected
+
+
+def test_decode_phonemes_batch_drops_special_tokens():
+    id_to_phoneme = {0: "<blank>", 1: "<sp>", 2: "ah", 3: "b"}
+    model = pms.LoadedPronunciationModel(
+        version="test",
+        generation=0,
+        model=None,
+        phoneme_to_id={p: i for i, p in id_to_phoneme.items()},
+        id_to_phoneme=id_to_phoneme,
+        device=torch.device("cpu"),
+        mean=0.0,
+        std=1.0,
+    )
+
+    def one_hot(frame_ids, num_classes=6):
+        log_probs = torch.full((len(frame_ids), num_classes), -10.0)
+        log_probs[torch.arange(len(frame_ids)), torch.tensor(frame_ids, dtype=torch.long)] = 0.0
+        return log_probs
+
+    # ID 5 nằm ngoài từ điển → "?"
+    outputs = pms.decode_phonemes_batch(
+        [one_hot([2, 2, 0, 1, 3, 3]), one_hot([]), one_hot([5, 0, 2])],
+        model=model,
+    )
+    assert outputs == [["ah", "b"], [], ["?", "ah"]]
@@ -0,0 +1,70 @@
+"""
+Test Viterbi CTC (ctc_forced_align)
+
+Đoạn của các token phải nối liền nhau (end của token k = start của token k+1), tăng dần
+và nằm trong [0, T]; audio quá ngắn để chứa chuỗi targets thì trả về None.
+"""
+import numpy as np
+import pytest
+
+from services.alignment_service import ctc_forced_align
+
+BLANK = 0
+NUM_CLASSES = 6
+
+
+def _log_softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+
+
+def _peaked_log_probs(frame_labels) -> np.ndarray:
+    # Mỗi frame gần như chắc chắn là nhãn cho trước
+    logits = np.full((len(frame_labels), NUM_CLASSES), -10.0)
+    logits[np.arange(len(frame_labels)), frame_labels] = 10.0
+    return _log_softmax(logits).astype(np.float32)
+
+
+def _check_segments(segments, num_tokens, num_frames):
+    assert [s.token_index for s in segments] == list(range(num_tokens))
+    for segment in segments:
+        assert 0 <= segment.start_frame < segment.end_frame <= num_frames
+        assert segment.gop <= 0.0
+        assert 0.0 < segment.confidence <= 1.0
+    for current, following in zip(segments, segments[1:]):
+        assert current.end_frame == following.start_frame
+
+
+def test_peaked_path_boundaries():
+    # blank, 1, 1, blank, 2, blank, blank, 3
+    log_probs = _peaked_log_probs([0, 1, 1, 0, 2, 0, 0, 3])
+    segments = ctc_forced_align(log_probs, [1, 2, 3], blank_id=BLANK)
+    _check_segments(segments, 3, len(log_probs))
+    assert [(s.start_frame, s.end_frame) for s in segments] == [(1, 4), (4, 7), (7, 8)]
+    assert all(s.confidence > 0.99 for s in segments)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_segments_contiguous_and_monotone(seed):
+    rng = np.random.default_rng(seed)
+    num_tokens = int(rng.integers(1, 6))
+    targets = rng.integers(1, NUM_CLASSES, size=num_tokens).tolist()
+    num_frames = int(rng.integers(2 * num_tokens + 1, 40))
+    log_probs = _log_softmax(rng.normal(size=(num_frames, NUM_CLASSES))).astype(np.float32)
+
+    segments = ctc_forced_align(log_probs, targets, blank_id=BLANK)
+    assert segments is not None
+    _check_segments(segments, num_tokens, num_frames)
+
+
+def test_returns_none_when_too_short():
+    log_probs = _peaked_log_probs([1, 2])
+    assert ctc_forced_align(log_probs, [1, 2, 3], blank_id=BLANK) is None
+    # Hai token giống nhau liền kề cần một blank ở giữa: tối thiểu 3 frame
+    assert ctc_forced_align(log_probs, [1, 1], blank_id=BLANK) is None
+    assert ctc_forced_align(_peaked_log_probs([1, 0, 1]), [1, 1], blank_id=BLANK) is not None
+
+
+def test_returns_none_for_empty_input():
+    assert ctc_forced_align(_peaked_log_probs([1, 2]), [], blank_id=BLANK) is None
+    assert ctc_forced_align(np.zeros((0, NUM_CLASSES), dtype=np.float32), [1], blank_id=BLANK) is None